@@ -21,11 +21,13 @@ class MLService {
         // Add Security Interceptor: Every request to the ML service must be signed
         this.api.interceptors.request.use((config) => {
             const timestamp = Math.floor(Date.now() / 1000).toString();
+            // Single-use value: lets identical requests in the same second through the replay check
+            const nonce = crypto.randomBytes(16).toString('hex');
             const body = config.data ? JSON.stringify(config.data) : '';
             const path = config.url;
 
-            // Signature Logic: HMAC_SHA256(Secret, Timestamp + Path + Body)
-            const payload = `${timestamp}${path}${body}`;
+            // Signature Logic: HMAC_SHA256(Secret, Timestamp + Nonce + Path + Body)
+            const payload = `${timestamp}${nonce}${path}${body}`;
             const signature = crypto
                 .createHmac('sha256', ML_SERVICE_SECRET)
                 .update(payload)
@@ -33,6 +35,7 @@ class MLService {
 
             config.headers['X-ML-API-Key'] = ML_SERVICE_API_KEY;
             config.headers['X-ML-Timestamp'] = timestamp;
+            config.headers['X-ML-Nonce'] = nonce;
             config.headers['X-ML-Signature'] = signature;
 
             return config;
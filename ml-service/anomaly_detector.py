@@ -1,7 +1,12 @@
 import numpy as np
+import pandas as pd
 from typing import List, Dict, Any
 from datetime import datetime
 
+from price_statistics import PriceStatisticsStore
+from velocity_counters import VelocityCounters
+from trade_graph import TradeGraphIndex
+
 class AgricultureAnomalyDetector:
     """
     AI-Based Fraud and Anomaly Detection for Agriculture Marketplace.
@@ -10,9 +15,24 @@ class AgricultureAnomalyDetector:
     2. Statistical Anomaly Detection (User behavior outliers)
     """
 
-    def __init__(self, price_deviation_threshold: float = 0.4, max_cancellation_rate: float = 0.3):
+    def __init__(self, price_deviation_threshold: float = 0.4, max_cancellation_rate: float = 0.3,
+                 price_stats: PriceStatisticsStore = None, min_observations: int = 5,
+                 price_mode: str = "mean", robust_z_threshold: float = 3.5,
+                 velocity: VelocityCounters = None, max_burst_deals: int = 10,
+                 trade_graph: TradeGraphIndex = None):
         self.price_deviation_threshold = price_deviation_threshold
         self.max_cancellation_rate = max_cancellation_rate
+        # Server-side running statistics per (market, commodity, variety)
+        self.price_stats = price_stats or PriceStatisticsStore()
+        self.min_observations = min_observations
+        # "mean" (Welford/EWMA z-scores) or "robust" (sliding median/MAD)
+        self.price_mode = price_mode
+        self.robust_z_threshold = robust_z_threshold
+        # Server-side per-user deal/cancellation counters fed by ledger events
+        self.velocity = velocity
+        self.max_burst_deals = max_burst_deals
+        # Farmer -> buyer graph of sealed trades (cycles, dense pairs, reversals)
+        self.trade_graph = trade_graph
 
     def detect_pricing_anomaly(self, current_price: float, historical_prices: List[float]) -> Dict[str, Any]:
         """
@@ -42,16 +62,96 @@ class AgricultureAnomalyDetector:
             "reason": "Price deviation beyond threshold" if is_anomaly else "Price within normal range"
         }
 
+    def detect_series_anomaly(self, current_price: float, market: str, commodity: str, variety: str = None) -> Dict[str, Any]:
+        """
+        Same checks as detect_pricing_anomaly, but against the running
+        statistics of the series (O(1), no price history in the request).
+        The z-score uses the full-history Welford std; the EWMA z-score and
+        deviation track the recent price level.
+        """
+        stats = self.price_stats.get(market, commodity, variety)
+        if stats is None or stats.count < self.min_observations:
+            return {"is_anomaly": False, "score": 0.0, "reason": "Insufficient price history for series"}
+
+        z_score = abs(current_price - stats.mean) / stats.std if stats.std > 0 else 0.0
+        ewma_z_score = abs(current_price - stats.ewma_mean) / stats.ewma_std if stats.ewma_std > 0 else 0.0
+        deviation = abs(current_price - stats.ewma_mean) / stats.ewma_mean if stats.ewma_mean else 0.0
+
+        is_anomaly = deviation > self.price_deviation_threshold or z_score > 3 or ewma_z_score > 3
+        return {
+            "is_anomaly": bool(is_anomaly),
+            "score": min(max(z_score, ewma_z_score) / 5.0, 1.0) if is_anomaly else 0.1,
+            "deviation": float(deviation),
+            "z_score": float(z_score),
+            "ewma_z_score": float(ewma_z_score),
+            "observations": stats.count,
+            "reason": "Price deviation beyond threshold" if is_anomaly else "Price within normal range"
+        }
+
+    def detect_robust_anomaly(self, current_price: float, market: str, commodity: str, variety: str = None) -> Dict[str, Any]:
+        """
+        Outlier-resistant variant for heavy-tailed mandi prices: compares
+        against the sliding-window median and scores with the modified
+        z-score 0.6745 * |x - median| / MAD (Iglewicz & Hoaglin).
+        """
+        window = self.price_stats.get_window(market, commodity, variety)
+        if window is None or len(window) < self.min_observations:
+            return {"is_anomaly": False, "score": 0.0, "reason": "Insufficient price history for series"}
+
+        median = window.median()
+        mad = window.mad()
+        # Flat windows (MAD = 0) are common for modal prices; fall back to the deviation rule
+        robust_z = 0.6745 * abs(current_price - median) / mad if mad > 0 else 0.0
+        deviation = abs(current_price - median) / median if median else 0.0
+
+        is_anomaly = deviation > self.price_deviation_threshold or robust_z > self.robust_z_threshold
+        return {
+            "is_anomaly": bool(is_anomaly),
+            "score": min(max(robust_z / 7.0, deviation), 1.0) if is_anomaly else 0.1,
+            "deviation": float(deviation),
+            "z_score": float(robust_z),
+            "median": float(median),
+            "mad": float(mad),
+            "observations": len(window),
+            "reason": "Price deviation beyond threshold" if is_anomaly else "Price within normal range"
+        }
+
+    def _with_observed_behavior(self, user_history: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Overlays the server-side velocity counters on the reported history.
+        Reported figures can add risk but never hide it: frequencies and
+        failed payments take the larger value, and the cancellation check
+        uses whichever deal/cancellation pair shows the higher rate.
+        """
+        observed = self.velocity.behavior(user_history.get('id')) if self.velocity is not None else None
+        if observed is None:
+            return user_history
+        merged = dict(user_history)
+        for field in ('failed_payments', 'recent_deal_frequency', 'burst_deals'):
+            merged[field] = max(user_history.get(field) or 0, observed[field])
+
+        reported_total = user_history.get('total_deals', 0)
+        reported_rate = user_history['cancelled_deals'] / reported_total if reported_total > 5 else None
+        if observed['total_deals'] > 5:
+            observed_rate = observed['cancelled_deals'] / observed['total_deals']
+            if reported_rate is None or observed_rate > reported_rate:
+                merged['total_deals'] = observed['total_deals']
+                merged['cancelled_deals'] = observed['cancelled_deals']
+        return merged
+
     def analyze_user_behavior(self, user_history: Dict[str, Any]) -> Dict[str, Any]:
         """
         Analyzes buyer/farmer behavior for suspicious patterns.
         Expected user_history keys:
+        - id: str (matched against the server-side velocity counters)
         - total_deals: int
         - cancelled_deals: int
         - failed_payments: int
         - average_deal_value: float
         - recent_deal_frequency: float (deals per day in last week)
+        - burst_deals: int (deals in the last few minutes)
         """
+        user_history = self._with_observed_behavior(user_history)
         risk_score = 0.0
         reasons = []
 
@@ -68,7 +168,8 @@ class AgricultureAnomalyDetector:
             reasons.append(f"Multiple failed payment attempts: {user_history['failed_payments']}")
 
         # 3. High Frequency Burst (Bot-like behavior)
-        if user_history.get('recent_deal_frequency', 0) > 10: # >10 deals/day
+        if (user_history.get('recent_deal_frequency', 0) > 10 # >10 deals/day
+                or user_history.get('burst_deals', 0) > self.max_burst_deals):
             risk_score += 0.3
             reasons.append("Unusually high transaction frequency (potential automation/spam)")
 
@@ -78,6 +179,15 @@ class AgricultureAnomalyDetector:
             risk_score += 0.1
             reasons.append("High value deal frequency requires additional vetting")
 
+        # 5. Wash Trading / Collusion (patterns found in the ledger trade graph)
+        patterns = self.trade_graph.suspicion(user_history.get('id')) if self.trade_graph is not None else None
+        if patterns and (patterns['SHORT_CYCLE'] or patterns['RAPID_REVERSAL']):
+            risk_score += 0.4
+            reasons.append("Circular or back-and-forth trades with the same counterparties (potential wash trading)")
+        if patterns and patterns['DENSE_PAIR']:
+            risk_score += 0.1
+            reasons.append("Trading concentrated on a single counterparty")
+
         # Classify Risk level
         risk_level = "Low Risk"
         if risk_score > 0.7:
@@ -97,10 +207,20 @@ class AgricultureAnomalyDetector:
         """
         Combined audit of a specific transaction and the user involved.
         """
-        price_check = self.detect_pricing_anomaly(
-            transaction_data['price'], 
-            transaction_data['historical_prices']
-        )
+        if transaction_data.get('historical_prices'):
+            price_check = self.detect_pricing_anomaly(
+                transaction_data['price'], 
+                transaction_data['historical_prices']
+            )
+        else:
+            market = transaction_data.get('market')
+            commodity = transaction_data.get('commodity') or transaction_data.get('crop')
+            variety = transaction_data.get('variety')
+            detect = self.detect_robust_anomaly if self.price_mode == "robust" else self.detect_series_anomaly
+            price_check = detect(transaction_data['price'], market, commodity, variety)
+            # Only clean prices feed the series, so flagged trades cannot drag the baseline
+            if market and commodity and not price_check['is_anomaly']:
+                self.price_stats.update(market, commodity, variety, transaction_data['price'])
         
         behavior_check = self.analyze_user_behavior(user_data)
         
@@ -124,6 +244,197 @@ class AgricultureAnomalyDetector:
             "audit_code": f"AGRO-RE-{'H' if final_level == 'High Risk' else 'M' if final_level=='Medium Risk' else 'L'}-{datetime.now().strftime('%m%d%y')}"
         }
 
+    # --- BATCH AUDIT ---
+
+    def _series_baselines(self, market, commodity, variety):
+        """
+        Looks up each distinct series once and returns per-row baseline
+        arrays (NaN where the series has too little history).
+        """
+        # Factorize each key column, then fold the codes into one integer per series
+        parts = [pd.factorize(col) for col in (market, commodity, variety)]
+        combined = np.zeros(len(market), dtype=np.int64)
+        for col_codes, col_uniques in parts:
+            combined = combined * len(col_uniques) + col_codes
+        distinct, codes = np.unique(combined, return_inverse=True)
+        uniques = []
+        for value in distinct.tolist():
+            key = []
+            for col_codes, col_uniques in reversed(parts):
+                value, code = divmod(value, len(col_uniques))
+                key.append(col_uniques[code])
+            uniques.append(key[::-1])
+
+        robust = self.price_mode == "robust"
+        baselines = np.full((len(uniques), 4), np.nan)
+        for i, (m, c, v) in enumerate(uniques):
+            if robust:
+                window = self.price_stats.get_window(m, c, v)
+                if window is not None and len(window) >= self.min_observations:
+                    baselines[i] = (window.median(), window.mad(), np.nan, np.nan)
+            else:
+                stats = self.price_stats.get(m, c, v)
+                if stats is not None and stats.count >= self.min_observations:
+                    baselines[i] = (stats.mean, stats.std, stats.ewma_mean, stats.ewma_std)
+        return baselines[codes] if len(codes) else baselines
+
+    def _batch_price_checks(self, price, baselines):
+        center, spread, ewma_mean, ewma_std = baselines.T
+        known = ~np.isnan(center)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.price_mode == "robust":
+                z_score = np.where(spread > 0, 0.6745 * np.abs(price - center) / spread, 0.0)
+                deviation = np.where(center != 0, np.abs(price - center) / center, 0.0)
+                is_anomaly = known & ((deviation > self.price_deviation_threshold) | (z_score > self.robust_z_threshold))
+                raw_score = np.maximum(z_score / 7.0, deviation)
+            else:
+                z_score = np.where(spread > 0, np.abs(price - center) / spread, 0.0)
+                ewma_z = np.where(ewma_std > 0, np.abs(price - ewma_mean) / ewma_std, 0.0)
+                deviation = np.where(ewma_mean != 0, np.abs(price - ewma_mean) / ewma_mean, 0.0)
+                is_anomaly = known & ((deviation > self.price_deviation_threshold) | (z_score > 3) | (ewma_z > 3))
+                raw_score = np.maximum(z_score, ewma_z) / 5.0
+        score = np.where(is_anomaly, np.minimum(raw_score, 1.0), np.where(known, 0.1, 0.0))
+        return is_anomaly, np.nan_to_num(score), np.nan_to_num(deviation), np.nan_to_num(z_score)
+
+    def _batch_behavior_risk(self, users):
+        """Column-wise analyze_user_behavior; returns (risk, rule masks)."""
+        def column(name):
+            values = users[name] if name in users else 0
+            return pd.to_numeric(pd.Series(values, index=users.index), errors='coerce').fillna(0).to_numpy(float)
+
+        total, cancelled = column('total_deals'), column('cancelled_deals')
+        failed_payments = column('failed_payments')
+        frequency, burst = column('recent_deal_frequency'), column('burst_deals')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cancellation_rate = np.where(total > 0, cancelled / total, 0.0)
+
+        if self.velocity is not None and len(users):
+            # Same overlay as _with_observed_behavior, for every user at once
+            known, observed = self.velocity.behavior_columns(users['id'].astype(str).to_numpy())
+            failed_payments = np.maximum(failed_payments, observed['failed_payments'])
+            frequency = np.maximum(frequency, observed['recent_deal_frequency'])
+            burst = np.maximum(burst, observed['burst_deals'])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                observed_rate = np.where(
+                    observed['total_deals'] > 0, observed['cancelled_deals'] / observed['total_deals'], 0.0
+                )
+            use_observed = known & (observed['total_deals'] > 5) & ((total <= 5) | (observed_rate > cancellation_rate))
+            total = np.where(use_observed, observed['total_deals'], total)
+            cancellation_rate = np.where(use_observed, observed_rate, cancellation_rate)
+
+        rules = {
+            'cancellation': (total > 5) & (cancellation_rate > self.max_cancellation_rate),
+            'failed_payments': failed_payments > 2,
+            'frequency': (frequency > 10) | (burst > self.max_burst_deals),
+            'deal_value': column('average_deal_value') > 500000,
+            'wash_trading': np.zeros(len(users), dtype=bool),
+            'dense_pair': np.zeros(len(users), dtype=bool),
+        }
+        if self.trade_graph is not None and len(users):
+            patterns = self.trade_graph.suspicion_columns(users['id'].astype(str).to_numpy())
+            rules['wash_trading'] = (patterns['SHORT_CYCLE'] > 0) | (patterns['RAPID_REVERSAL'] > 0)
+            rules['dense_pair'] = patterns['DENSE_PAIR'] > 0
+        risk = (np.where(rules['cancellation'], cancellation_rate * 0.4, 0.0)
+                + np.where(rules['failed_payments'], 0.3, 0.0)
+                + np.where(rules['frequency'], 0.3, 0.0)
+                + np.where(rules['deal_value'], 0.1, 0.0)
+                + np.where(rules['wash_trading'], 0.4, 0.0)
+                + np.where(rules['dense_pair'], 0.1, 0.0))
+        return risk, cancellation_rate, failed_payments, rules
+
+    def audit_batch(self, transactions, users=None) -> Dict[str, Any]:
+        """
+        Vectorized perform_full_audit over a whole day of transactions.
+
+        `transactions` and `users` are lists of records or dicts of columns.
+        Transactions carry id, user_id, price, market, commodity (or crop)
+        and variety; users carry id plus the analyze_user_behavior fields.
+        Scores match the single-transaction audit; only flagged rows are
+        returned, with aggregate counts. Read-only: the sweep does not feed
+        the running price statistics.
+        """
+        tx = pd.DataFrame(transactions)
+        n = len(tx)
+        users = pd.DataFrame(users if users is not None else {'id': []})
+        if 'id' not in users:
+            users['id'] = pd.Series(dtype=object)
+
+        def column(name, default=''):
+            return tx[name].fillna(default) if name in tx else pd.Series(default, index=tx.index)
+
+        # Series keys are normalized per distinct series inside the lookup, not per row
+        price = pd.to_numeric(tx['price'], errors='coerce').to_numpy(float) if n else np.empty(0)
+        baselines = self._series_baselines(
+            column('market'), column('commodity') if 'commodity' in tx else column('crop'), column('variety')
+        )
+        price_anomaly, price_score, deviation, z_score = self._batch_price_checks(price, baselines)
+
+        # Score each user once, then gather per transaction (unknown users score 0)
+        risk, cancellation_rate, failed_payments, rules = self._batch_behavior_risk(users)
+        user_codes, tx_user_ids = column('user_id', 'N/A').factorize()
+        user_index = pd.Index(users['id'].astype(str).to_numpy())
+        if not user_index.is_unique:
+            duplicates = user_index[user_index.duplicated()].unique().tolist()
+            raise ValueError(f"Duplicate user ids: {duplicates[:10]}")
+        position = user_index.get_indexer(tx_user_ids.astype(str))[user_codes] if n else np.empty(0, dtype=int)
+        known_user = position >= 0
+        # Unknown users (position -1) read the trailing zero, which also covers an empty user list
+        behavior_risk = np.append(risk, 0.0)[position]
+
+        combined = np.maximum(price_score, np.minimum(behavior_risk, 1.0))
+        high = (combined > 0.7) | (behavior_risk > 0.7)
+        medium = ~high & ((combined > 0.3) | (behavior_risk > 0.3))
+        flagged = np.flatnonzero(high | medium)
+
+        audit_date = datetime.now().strftime('%m%d%y')
+        ids = column('id', 'N/A').to_numpy()
+        tx_users = column('user_id', 'N/A').to_numpy()
+        rows = []
+        for i in flagged.tolist():
+            level = "High Risk" if high[i] else "Medium Risk"
+            flags = []
+            if known_user[i]:
+                u = position[i]
+                if rules['cancellation'][u]:
+                    flags.append(f"High cancellation rate: {cancellation_rate[u]:.2%}")
+                if rules['failed_payments'][u]:
+                    flags.append(f"Multiple failed payment attempts: {int(failed_payments[u])}")
+                if rules['frequency'][u]:
+                    flags.append("Unusually high transaction frequency (potential automation/spam)")
+                if rules['deal_value'][u]:
+                    flags.append("High value deal frequency requires additional vetting")
+                if rules['wash_trading'][u]:
+                    flags.append("Circular or back-and-forth trades with the same counterparties (potential wash trading)")
+                if rules['dense_pair'][u]:
+                    flags.append("Trading concentrated on a single counterparty")
+            if price_anomaly[i]:
+                flags.append("Price deviation beyond threshold")
+            rows.append({
+                "transaction_id": str(ids[i]),
+                "user_id": str(tx_users[i]),
+                "risk_score": float(combined[i]),
+                "risk_level": level,
+                "price_score": float(price_score[i]),
+                "price_deviation": float(deviation[i]),
+                "price_z_score": float(z_score[i]),
+                "behavior_score": float(min(behavior_risk[i], 1.0)),
+                "flags": flags,
+                "audit_code": f"AGRO-RE-{'H' if high[i] else 'M'}-{audit_date}"
+            })
+
+        return {
+            "total": n,
+            "flagged_count": len(rows),
+            "risk_counts": {
+                "High Risk": int(high.sum()),
+                "Medium Risk": int(medium.sum()),
+                "Low Risk": int(n - high.sum() - medium.sum())
+            },
+            "price_anomalies": int(price_anomaly.sum()),
+            "suspicious_users": int((risk > 0.5).sum()),
+            "flagged": rows
+        }
+
 if __name__ == "__main__":
     # Test cases
     detector = AgricultureAnomalyDetector()
@@ -131,6 +442,10 @@ if __name__ == "__main__":
     # Test 1: High Price Anomaly
     print("Testing Pricing Anomaly:")
     print(detector.detect_pricing_anomaly(500, [100, 110, 105, 98, 112]))
+    for price in [100, 110, 105, 98, 112]:
+        detector.price_stats.update("Ahmedabad APMC", "Onion", "Nasik", price)
+    print(detector.detect_series_anomaly(500, "Ahmedabad APMC", "Onion", "Nasik"))
+    print(detector.detect_robust_anomaly(500, "Ahmedabad APMC", "Onion", "Nasik"))
     
     # Test 2: Suspicious User Behavior
     print("\nTesting User Behavior:")
@@ -0,0 +1,199 @@
+import json
+import logging
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+class _CompactJSONFormatter(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.audit, separators=(',', ':'))
+
+
+class SQLiteViolationStore(logging.Handler):
+    """
+    Shares recent violations between uvicorn workers through a local SQLite
+    file, so the query API answers for the whole host and not just the worker
+    that happened to receive the request. Attached to the audit QueueListener:
+    inserts run on the listener thread, never on the request path.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS security_violations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts REAL NOT NULL,
+            event TEXT NOT NULL,
+            ip TEXT,
+            path TEXT,
+            record TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_security_violations_ts ON security_violations (ts);
+    """
+
+    def __init__(self, db_path, max_rows=5000, prune_every=500):
+        """
+        Args:
+            db_path (str): SQLite file shared by the workers
+            max_rows (int): Newest violations kept
+            prune_every (int): Inserts between trims of older rows
+        """
+        super().__init__(level=logging.WARNING)
+        self.db_path = db_path
+        self.max_rows = max_rows
+        self.prune_every = prune_every
+        self._inserts = 0
+        self._local = threading.local()
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def emit(self, record):
+        audit = record.audit
+        try:
+            conn = self._connection()
+            conn.execute(
+                'INSERT INTO security_violations (ts, event, ip, path, record) VALUES (?, ?, ?, ?, ?)',
+                (audit['ts'], audit['event'], audit['ip'], audit['path'], json.dumps(audit, separators=(',', ':')))
+            )
+            self._inserts += 1
+            if self._inserts % self.prune_every == 0:
+                conn.execute('DELETE FROM security_violations WHERE id <= (SELECT MAX(id) FROM security_violations) - ?',
+                             (self.max_rows,))
+        except sqlite3.Error:
+            self.handleError(record)
+
+    def query(self, ip=None, path=None, event=None, since=None, limit=100):
+        """Newest-first violations matching every given filter."""
+        clauses, params = [], []
+        if since is not None:
+            clauses.append('ts >= ?')
+            params.append(since)
+        if ip is not None:
+            clauses.append('ip = ?')
+            params.append(ip)
+        if path is not None:
+            clauses.append('substr(path, 1, ?) = ?')
+            params.extend([len(path), path])
+        if event is not None:
+            clauses.append('event = ?')
+            params.append(event)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._connection().execute(
+            f'SELECT record FROM security_violations {where} ORDER BY id DESC LIMIT ?', (*params, limit)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+def worker_log_path(log_path, pid=None):
+    """`security_audit.jsonl` -> `security_audit.<pid>.jsonl`"""
+    root, ext = os.path.splitext(log_path)
+    return f"{root}.{os.getpid() if pid is None else pid}{ext}"
+
+
+class SecurityAuditLog:
+    """
+    Non-blocking security audit trail.
+
+    The request path only builds a small dict and enqueues it; a background
+    QueueListener thread serializes records as compact JSON lines into
+    size-rotated files. Each worker process writes its own file, since
+    RotatingFileHandler cannot rotate a file another process is appending to.
+    Successful accesses are sampled, violations are always written and also
+    kept for querying: in a bounded in-memory ring, or in a SQLite table
+    shared by all workers when `violations_db` is given.
+    """
+
+    def __init__(self, log_path, max_bytes=10 * 1024 * 1024, backup_count=5,
+                 success_sample_rate=0.01, recent_violations=5000, violations_db=None):
+        """
+        Args:
+            log_path (str): Audit file name; the worker's pid is inserted before the extension
+            max_bytes (int): Rotation size per file
+            backup_count (int): Rotated files kept
+            success_sample_rate (float): Fraction of accepted requests logged (0-1)
+            recent_violations (int): Violations kept for the query API
+            violations_db (str): Optional SQLite file sharing violations across workers
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+        self.log_path = worker_log_path(log_path)
+        self.success_sample_rate = success_sample_rate
+        self._violations = deque(maxlen=recent_violations)
+        self._lock = threading.Lock()
+
+        file_handler = RotatingFileHandler(self.log_path, maxBytes=max_bytes, backupCount=backup_count)
+        file_handler.setFormatter(_CompactJSONFormatter())
+        handlers = [file_handler]
+        self.violation_store = None
+        if violations_db is not None:
+            self.violation_store = SQLiteViolationStore(violations_db, max_rows=recent_violations)
+            handlers.append(self.violation_store)
+        log_queue = queue.SimpleQueue()
+        # Each handler applies its own level: the SQLite store only takes violations
+        self.listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+
+        self.logger = logging.getLogger("ML_SECURITY_AUDIT")
+        self.logger.setLevel(logging.INFO)
+        self.logger.handlers = [QueueHandler(log_queue)]
+        # Keep audit records off the synchronous root stream handler
+        self.logger.propagate = False
+
+    def _emit(self, level, record):
+        self.logger.log(level, record['event'], extra={'audit': record})
+
+    def success(self, event, ip=None, path=None, **fields):
+        """Logs an accepted request, subject to sampling."""
+        if self.success_sample_rate < 1 and random.random() >= self.success_sample_rate:
+            return
+        record = {'ts': round(time.time(), 3), 'event': event, 'ip': ip, 'path': path, **fields}
+        self._emit(logging.INFO, record)
+
+    def violation(self, event, ip=None, path=None, severity='warning', **fields):
+        """Logs a security violation (never sampled)."""
+        record = {'ts': round(time.time(), 3), 'event': event, 'severity': severity,
+                  'ip': ip, 'path': path, **fields}
+        if self.violation_store is None:
+            with self._lock:
+                self._violations.append(record)
+        self._emit(logging.CRITICAL if severity == 'critical' else logging.WARNING, record)
+
+    def recent_violations(self, ip=None, path=None, event=None, since=None, limit=100):
+        """
+        Newest-first violations filtered by IP, path prefix, event or time.
+        With the shared SQLite store, a violation becomes visible once the
+        background listener has written it.
+        """
+        if self.violation_store is not None:
+            return self.violation_store.query(ip=ip, path=path, event=event, since=since, limit=limit)
+        with self._lock:
+            records = list(self._violations)
+        matches = []
+        for record in reversed(records):
+            if since is not None and record['ts'] < since:
+                break
+            if ip is not None and record['ip'] != ip:
+                continue
+            if path is not None and not (record['path'] or '').startswith(path):
+                continue
+            if event is not None and record['event'] != event:
+                continue
+            matches.append(record)
+            if len(matches) >= limit:
+                break
+        return matches
+
+    def close(self):
+        """Flushes queued records to disk."""
+        self.listener.stop()
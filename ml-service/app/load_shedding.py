@@ -0,0 +1,144 @@
+import asyncio
+import math
+import re
+import time
+
+from starlette.responses import JSONResponse
+
+
+class Bulkhead:
+    """
+    Concurrency limit for one group of routes, with a bounded wait queue.
+
+    Requests beyond `max_concurrent` wait in line; they are shed with 503
+    when the line is full, when they have waited `max_wait` seconds, or
+    (adaptively) as soon as the smoothed latency of the group exceeds
+    `target_latency` while it is already saturated.
+    """
+
+    def __init__(self, name, pattern, max_concurrent=8, max_queue=32, max_wait=2.0,
+                 target_latency=None, smoothing=0.2, methods=None):
+        """
+        Args:
+            name (str): Label used in metrics
+            pattern (str): Regex matched against the request path
+            methods (tuple): HTTP methods of the group (None matches any)
+            max_concurrent (int): Requests of this group running at once
+            max_queue (int): Requests allowed to wait for a slot
+            max_wait (float): Longest queue wait in seconds before shedding
+            target_latency (float): Smoothed latency (s) above which queueing is refused
+            smoothing (float): EWMA weight of the newest latency sample
+        """
+        self.name = name
+        self.pattern = re.compile(pattern)
+        self.methods = frozenset(methods) if methods else None
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.target_latency = target_latency
+        self.smoothing = smoothing
+        self._slots = asyncio.Semaphore(max_concurrent)
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.admitted = 0
+        self.shed = {'queue_full': 0, 'wait_timeout': 0, 'latency': 0}
+        self.ewma_latency = 0.0
+        self.ewma_wait = 0.0
+
+    def matches(self, method, path):
+        return (self.methods is None or method in self.methods) and self.pattern.match(path) is not None
+
+    def _ewma(self, current, sample):
+        return sample if current == 0.0 else current + self.smoothing * (sample - current)
+
+    def retry_after(self):
+        # Time for the queue ahead to drain at the observed latency
+        per_slot = self.ewma_latency or self.max_wait
+        return max(1, math.ceil(per_slot * (self.waiting + 1) / self.max_concurrent))
+
+    async def acquire(self):
+        """Returns None when admitted, otherwise the shed reason."""
+        # Count requests still handing over a slot too, not just the semaphore state
+        if self.in_flight + self.waiting >= self.max_concurrent:
+            if self.in_flight + self.waiting >= self.max_concurrent + self.max_queue:
+                self.shed['queue_full'] += 1
+                return 'queue_full'
+            if self.target_latency and self.ewma_latency > self.target_latency:
+                self.shed['latency'] += 1
+                return 'latency'
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            self.shed['wait_timeout'] += 1
+            return 'wait_timeout'
+        finally:
+            self.waiting -= 1
+
+        self.ewma_wait = self._ewma(self.ewma_wait, time.perf_counter() - queued_at)
+        self.in_flight += 1
+        self.admitted += 1
+        return None
+
+    def release(self, latency):
+        self.in_flight -= 1
+        self.ewma_latency = self._ewma(self.ewma_latency, latency)
+        self._slots.release()
+
+    def stats(self):
+        return {
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'in_flight': self.in_flight,
+            'queue_depth': self.waiting,
+            'peak_queue_depth': self.peak_waiting,
+            'admitted': self.admitted,
+            'shed': dict(self.shed),
+            'ewma_latency_ms': round(self.ewma_latency * 1000, 2),
+            'ewma_queue_wait_ms': round(self.ewma_wait * 1000, 2),
+        }
+
+
+class LoadSheddingMiddleware:
+    """
+    ASGI middleware routing each request to the first matching bulkhead.
+    Unmatched routes (health checks, cheap lookups) bypass limiting, so a
+    burst on an expensive route can no longer starve them of threadpool slots.
+    """
+
+    def __init__(self, app, bulkheads):
+        self.app = app
+        self.bulkheads = bulkheads
+
+    def _match(self, method, path):
+        for bulkhead in self.bulkheads:
+            if bulkhead.matches(method, path):
+                return bulkhead
+        return None
+
+    async def __call__(self, scope, receive, send):
+        bulkhead = self._match(scope['method'], scope['path']) if scope['type'] == 'http' else None
+        if bulkhead is None:
+            await self.app(scope, receive, send)
+            return
+
+        reason = await bulkhead.acquire()
+        if reason is not None:
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": f"Service Overloaded: {bulkhead.name} capacity exhausted ({reason}). Retry later."},
+                headers={"Retry-After": str(bulkhead.retry_after())}
+            )
+            await response(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            bulkhead.release(time.perf_counter() - started)
@@ -1,38 +1,84 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Query, Request, Header
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import joblib
 import pandas as pd
 import numpy as np
 import os
-from datetime import datetime
+import json
+import logging
+import time
+from datetime import datetime, timedelta
 from typing import List, Optional
 
 # Import Security
-from .security import validate_api_key, verify_signature, rate_limit
+from .load_shedding import Bulkhead, LoadSheddingMiddleware
+from .security import validate_api_key, verify_signature, streamed_signature, rate_limit, audit_log, ML_SECRET_KEY
 
 # Import Schemas
 from .schemas import (
     PricePredictionRequest, PricePredictionResponse,
     GapAnalysisRequest, GapAnalysisResponse,
-    BuyerHistory, TrustScoreResponse,
-    Transaction, ProfitDashboardResponse,
+    BuyerHistory, TrustScoreResponse, BuyerTrustRankingResponse, TrustIncidentRequest,
+    Transaction, ReportedTransaction, ProfitDashboardResponse,
     MSPAnalysisResponse, XAIExplanation,
     TradeRecordRequest, TradeRecordResponse, BlockchainVerifyResponse,
+    InclusionProofResponse, InclusionVerifyRequest, InclusionVerifyResponse,
     IntegritySealRequest, IntegrityVerifyRequest, IntegrityVerifyResponse,
-    ContractInitiateRequest, ContractResponse,
-    AuditRequest, AuditResponse
+    BulkIntegrityVerifyResponse,
+    ContractInitiateRequest, ContractResponse, ContractListResponse,
+    AuditRequest, AuditResponse, BatchAuditResponse,
+    SecurityViolationsResponse, LoadSheddingMetricsResponse,
+    ArrivalIngestRequest, ArrivalIngestResponse, SupplyShockEvent,
+    TradeGraphFindingsResponse
 )
 
 # Import Logic Modules
 from xai_predictor import XAIPRicePredictor
 from gap_analyzer import DemandSupplyGapAnalyzer
 from trust_engine import BuyerTrustEngine
+from trust_store import BuyerTrustStore
 from profit_analyzer import FarmerProfitAnalyzer
+from profit_aggregates import FarmerProfitAggregates, ProfitAggregateStore
 from msp_awareness import MSPAwarenessModule
-from blockchain_engine import AgricultureBlockchain
+from blockchain_engine import AgricultureBlockchain, IdempotencyConflictError
+from ledger_writer import LedgerWriter, LedgerBusyError, LedgerPersistError
+from ledger_shards import ShardedLedger
+from escrow_scheduler import EscrowTimeoutScheduler
 from anomaly_detector import AgricultureAnomalyDetector
+from price_statistics import PriceStatisticsStore
+from velocity_counters import VelocityCounters
+from arrival_monitor import ArrivalChangePointDetector
+from trade_graph import TradeGraphIndex
+from reputation import ReputationPropagator
 
 app = FastAPI(title="AgroLink Intelligence API", version="2.0.0")
+logger = logging.getLogger(__name__)
+
+# Bulkheads: expensive route groups get their own concurrency cap and bounded queue
+# so a burst cannot exhaust the shared threadpool; other routes are never limited.
+# BULKHEAD_LIMITS='{"ledger-seal": {"max_concurrent": 16}}' overrides per group.
+def _build_bulkheads():
+    # Patterns are anchored to the expensive routes themselves and, where a path also
+    # serves a cheap read (GET /api/buyer-trust/{id}), restricted to the heavy method
+    groups = [
+        ("ledger-seal", r"^/api/blockchain/seal-(trade|integrity)$",
+         dict(max_concurrent=8, max_queue=64, target_latency=1.0, methods=("POST",))),
+        ("ledger-bulk", r"^/api/blockchain/(verify-ledger|verify-integrity/bulk|export)$",
+         dict(max_concurrent=2, max_queue=4, max_wait=5.0)),
+        ("profit-dashboard", r"^/api/profit-dashboard$",
+         dict(max_concurrent=4, max_queue=16, target_latency=2.0, methods=("POST",))),
+        ("batch-audit", r"^/api/audit-transaction/batch$", dict(max_concurrent=2, max_queue=4, max_wait=5.0)),
+        ("trust-ranking", r"^/api/buyer-trust/bulk$", dict(max_concurrent=2, max_queue=4, max_wait=5.0)),
+        ("inference", r"^/api/(predict-price|analyze-gap|audit-transaction|buyer-trust/[^/]+)$",
+         dict(max_concurrent=8, max_queue=32, target_latency=1.0, methods=("POST",))),
+    ]
+    overrides = json.loads(os.getenv("BULKHEAD_LIMITS", "{}"))
+    return [Bulkhead(name, pattern, **{**limits, **overrides.get(name, {})}) for name, pattern, limits in groups]
+
+bulkheads = _build_bulkheads()
+app.add_middleware(LoadSheddingMiddleware, bulkheads=bulkheads)
 
 # Enable CORS for Frontend (React/Next.js)
 app.add_middleware(
@@ -47,10 +93,124 @@ app.add_middleware(
 MODELS_DIR = os.path.join(os.path.dirname(__file__), "..", "models")
 xai_engine = XAIPRicePredictor(model_dir=MODELS_DIR)
 gap_engine = DemandSupplyGapAnalyzer(model_dir=MODELS_DIR)
-trust_engine = BuyerTrustEngine()
+# Per-buyer trust aggregates are materialized from ledger/escrow events (subscribed below)
+# and persisted, so a trust lookup needs no history payload from the backend
+trust_engine = BuyerTrustEngine(
+    store=BuyerTrustStore(os.path.join(MODELS_DIR, "buyer_trust.db")),
+    on_time_window=float(os.getenv("TRUST_ON_TIME_HOURS", "48")) * 3600
+)
 policy_engine = MSPAwarenessModule(model_dir=MODELS_DIR)
-blockchain_engine = AgricultureBlockchain(storage_path=os.path.join(MODELS_DIR, "trade_ledger.json"))
-anomaly_engine = AgricultureAnomalyDetector()
+# Permissioned ledger: blocks are sealed by signing with the service key (Proof-of-Authority).
+# Set LEDGER_CONSENSUS=pow to fall back to hash-puzzle mining; old PoW blocks stay verifiable.
+# The seal key is its own secret: the request-signing secret has a default and is shared
+# with the backend, so anyone holding it could forge blocks.
+LEDGER_CONSENSUS = os.getenv("LEDGER_CONSENSUS", "poa")
+LEDGER_SEAL_KEY = os.getenv("LEDGER_SEAL_KEY")
+if LEDGER_CONSENSUS == "poa" and (not LEDGER_SEAL_KEY or LEDGER_SEAL_KEY == ML_SECRET_KEY):
+    raise RuntimeError(
+        "LEDGER_SEAL_KEY must be set to a dedicated secret for Proof-of-Authority sealing "
+        "(or set LEDGER_CONSENSUS=pow)."
+    )
+LEDGER_OPTIONS = {
+    "consensus": LEDGER_CONSENSUS,
+    "seal_key": LEDGER_SEAL_KEY,
+    "trusted_seal_keys": [k for k in os.getenv("LEDGER_TRUSTED_SEAL_KEYS", "").split(",") if k],
+}
+blockchain_engine = AgricultureBlockchain(
+    storage_path=os.path.join(MODELS_DIR, "trade_ledger.json"), **LEDGER_OPTIONS
+)
+# All ledger/escrow mutations go through this single writer thread
+ledger_writer = LedgerWriter(blockchain_engine)
+# Trade seals can be partitioned by commodity or region (LEDGER_SHARD_BY); the primary
+# ledger above is the "main" shard and keeps the escrow contracts. LEDGER_SHARD_KEYS lists
+# the commodities/regions with a shard of their own, the rest share LEDGER_SHARD_BUCKETS.
+ledger_shards = ShardedLedger(
+    base_dir=os.path.join(MODELS_DIR, "ledger_shards"),
+    shard_by=os.getenv("LEDGER_SHARD_BY", "none"),
+    shard_keys=[k for k in os.getenv("LEDGER_SHARD_KEYS", "").split(",") if k.strip()],
+    shard_buckets=int(os.getenv("LEDGER_SHARD_BUCKETS", "8")),
+    primary=blockchain_engine,
+    primary_writer=ledger_writer,
+    **LEDGER_OPTIONS
+)
+# Per-user deal/cancellation velocity, counted from sealed trades and escrow events on
+# every shard, so burst checks no longer rely on caller-reported frequencies. Failed
+# payments never reach the ledger: the buyer incidents route records them.
+velocity_counters = VelocityCounters(snapshot_path=os.path.join(MODELS_DIR, "velocity_counters.npz"))
+velocity_counters.subscribe_to(ledger_shards)
+# Farmer -> buyer trade graph for wash-trading checks: restored from its snapshot and
+# caught up on blocks sealed since, then kept current from trade events without rescanning
+trade_graph = TradeGraphIndex(snapshot_path=os.path.join(MODELS_DIR, "trade_graph.npz"))
+trade_graph.catch_up({name: shard_ledger for name, (shard_ledger, _) in ledger_shards.shards.items()})
+trade_graph.write_snapshot()
+trade_graph.subscribe_to(ledger_shards)
+trust_engine.subscribe_to(ledger_shards)
+# Running per-farmer profit totals (crop x month of year) from sealed trades and released
+# escrow payments, so stored farmers' dashboards need no history upload
+profit_aggregates = FarmerProfitAggregates(store=ProfitAggregateStore(os.path.join(MODELS_DIR, "profit_aggregates.db")))
+# Blocks sealed above the stored heights (e.g. before a crash) are replayed at startup
+profit_aggregates.catch_up({name: shard_ledger for name, (shard_ledger, _) in ledger_shards.shards.items()})
+profit_aggregates.subscribe_to(ledger_shards)
+# Network reputation propagated over the trade graph from buyer trust scores; re-solved
+# (warm-started) on a background thread once the graph has changed, at most every
+# REPUTATION_REFRESH_SECONDS, so trust lookups only read the last solution
+reputation = ReputationPropagator(
+    trade_graph, trust_engine, min_interval=float(os.getenv("REPUTATION_REFRESH_SECONDS", "30"))
+)
+reputation.start()
+# Escrow deadlines: LOCKED contracts expire if not dispatched in time, DISPATCHED
+# ones auto-release if the buyer never confirms (0 disables either timeout)
+escrow_scheduler = EscrowTimeoutScheduler(
+    blockchain_engine, ledger_writer,
+    dispatch_timeout=float(os.getenv("ESCROW_DISPATCH_TIMEOUT_HOURS", "72")) * 3600,
+    release_timeout=float(os.getenv("ESCROW_RELEASE_TIMEOUT_HOURS", "168")) * 3600,
+)
+escrow_scheduler.start()
+# Running price statistics per (market, commodity, variety) back the pricing anomaly
+# check; restored from the snapshot, or seeded once from the mandi price report
+price_stats = PriceStatisticsStore(snapshot_path=os.path.join(MODELS_DIR, "price_stats.json"))
+PRICE_HISTORY_CSV = os.getenv(
+    "PRICE_HISTORY_CSV",
+    os.path.join(os.path.dirname(__file__), "..", "..", "Vegetables  price 01-01-26 to 25-01-26.csv")
+)
+if not price_stats.series and os.path.exists(PRICE_HISTORY_CSV):
+    price_stats.ingest_csv(PRICE_HISTORY_CSV)
+    price_stats.write_snapshot()
+# Supply shocks in daily arrivals (Page-Hinkley per market/commodity) feed the gap
+# analyzer; the report is replayed at startup so each series resumes mid-regime, and
+# only change points still inside the analyzer's horizon are delivered
+arrival_monitor = ArrivalChangePointDetector()
+for supply_event in ArrivalChangePointDetector.EVENTS:
+    arrival_monitor.subscribe(supply_event, gap_engine.on_supply_shock)
+if os.path.exists(PRICE_HISTORY_CSV):
+    arrival_monitor.ingest_csv(
+        PRICE_HISTORY_CSV, emit=True,
+        emit_since=datetime.now() - timedelta(days=DemandSupplyGapAnalyzer.SHOCK_HORIZON_DAYS)
+    )
+anomaly_engine = AgricultureAnomalyDetector(
+    price_stats=price_stats, price_mode=os.getenv("PRICE_ANOMALY_MODE", "robust"),
+    velocity=velocity_counters, trade_graph=trade_graph
+)
+
+@app.on_event("shutdown")
+def stop_background_services():
+    # Flush queued mutations, statistics and audit records before the process exits
+    escrow_scheduler.close()
+    reputation.close()
+    ledger_shards.close()
+    # Writers are closed, so every sealed trade has reached the graph
+    shard_heights = {name: shard_ledger.height for name, (shard_ledger, _) in ledger_shards.shards.items()}
+    trade_graph.write_snapshot(shard_heights)
+    profit_aggregates.save_heights(shard_heights)
+    price_stats.write_snapshot()
+    velocity_counters.write_snapshot()
+    audit_log.close()
+
+def _get_shard(shard: str):
+    found = ledger_shards.get(shard)
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ledger shard: {shard}")
+    return found[0]
 
 @app.get("/health")
 def health_check():
@@ -98,12 +258,64 @@ def analyze_gap(request: GapAnalysisRequest):
             risk_level=result['metrics']['risk_index'],
             insight=result['human_readable_insight'],
             estimated_supply=result['metrics']['estimated_supply'],
-            estimated_demand=result['metrics']['estimated_demand']
+            estimated_demand=result['metrics']['estimated_demand'],
+            supply_shock=result['metrics']['supply_shock']
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # --- Route 3: Buyer Trust Engine ---
+# Registered before /api/buyer-trust/{buyer_id}, which would otherwise capture "bulk"
+@app.post("/api/buyer-trust/bulk",
+          response_model=BuyerTrustRankingResponse,
+          dependencies=[Depends(validate_api_key), Depends(verify_signature)])
+async def rank_buyers_bulk(request: Request):
+    """
+    Trust ranking over the whole buyer base for bid ordering:
+    {"buyers": ..., "top_k": 100, "order": "top" | "bottom"}, where buyers is
+    a list of BuyerHistory records with buyer_id or a dict of columns.
+    Without top_k every buyer is returned in input order.
+    """
+    body = await request.body()
+    try:
+        # Whole-buyer-base payloads are large: decode them off the event loop
+        payload = await run_in_threadpool(json.loads, body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed payload: {str(e)}")
+    if not isinstance(payload, dict) or "buyers" not in payload:
+        raise HTTPException(status_code=400, detail="Expected an object with 'buyers' (and optional 'top_k', 'order').")
+    order = payload.get("order", "top")
+    if order not in ("top", "bottom"):
+        raise HTTPException(status_code=400, detail=f"Unknown order: {order}")
+    top_k = payload.get("top_k")
+    if top_k is not None and (isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1):
+        raise HTTPException(status_code=400, detail=f"top_k must be a positive integer, got {top_k!r}")
+
+    started = time.perf_counter()
+    try:
+        result = await run_in_threadpool(
+            trust_engine.score_buyers_bulk, payload["buyers"], top_k, order == "bottom"
+        )
+    except (KeyError, ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid buyers: {str(e)}")
+    elapsed = time.perf_counter() - started
+    return BuyerTrustRankingResponse(
+        total=result["total"],
+        rank_counts=result["rank_counts"],
+        order=order,
+        buyers=[
+            TrustScoreResponse(
+                buyer_id=entry["buyer_id"],
+                score=entry["score"],
+                rank=entry["rank"],
+                risk_level=entry["risk_level"],
+                verdict=entry["interpretation"]
+            )
+            for entry in result["buyers"]
+        ],
+        buyers_per_second=round(result["total"] / elapsed, 1) if elapsed > 0 else 0.0
+    )
+
 @app.post("/api/buyer-trust/{buyer_id}", 
           response_model=TrustScoreResponse, 
           dependencies=[Depends(validate_api_key), Depends(verify_signature)])
@@ -130,23 +342,56 @@ def evaluate_buyer(buyer_id: str, history: BuyerHistory):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/buyer-trust/{buyer_id}",
+         response_model=TrustScoreResponse,
+         dependencies=[Depends(validate_api_key), Depends(verify_signature)])
+def get_buyer_trust(buyer_id: str):
+    """
+    Trust score from the aggregates maintained from ledger and escrow events,
+    with the buyer's network reputation (1.0 = average account).
+    """
+    result = trust_engine.score_buyer(buyer_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="No trade history for this buyer")
+    network_reputation = reputation.reputation(buyer_id)
+    return TrustScoreResponse(
+        buyer_id=buyer_id,
+        score=result['trust_metrics']['score'],
+        rank=result['trust_metrics']['rank'],
+        risk_level=result['trust_metrics']['risk_level'],
+        verdict=result['interpretation'],
+        network_reputation=round(network_reputation, 3) if network_reputation is not None else None
+    )
+
+@app.post("/api/buyer-trust/{buyer_id}/incidents",
+          response_model=TrustScoreResponse,
+          dependencies=[Depends(validate_api_key), Depends(verify_signature)])
+def record_buyer_incident(buyer_id: str, incident: TrustIncidentRequest):
+    """Reports a failed payment or a farmer dispute, which never reach the ledger."""
+    try:
+        trust_engine.record_incident(buyer_id, incident.kind)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if incident.kind == 'failed_payment':
+        velocity_counters.record(buyer_id, 'failed_payment')
+    return get_buyer_trust(buyer_id)
+
 # --- Route 4: Farmer Profit Dashboard ---
 @app.post("/api/profit-dashboard", 
           response_model=ProfitDashboardResponse, 
           dependencies=[Depends(validate_api_key), Depends(verify_signature)])
 def generate_profit_dashboard(transactions: List[Transaction]):
     try:
-        # Convert List of Transaction objects to DataFrame
-        data = []
-        for t in transactions:
-            data.append({
-                'Date': t.date,
-                'Crop': t.crop,
-                'Quantity_Quintals': t.quantity,
-                'Price_Per_Quintal': t.price,
-                'Total_Revenue': t.quantity * t.price
-            })
-        df = pd.DataFrame(data)
+        # Build the DataFrame column-wise; revenue is one vectorized product
+        quantity = np.array([t.quantity for t in transactions], dtype=float)
+        price = np.array([t.price for t in transactions], dtype=float)
+        df = pd.DataFrame({
+            'Date': [t.date for t in transactions],
+            'Crop': [t.crop for t in transactions],
+            'Quantity_Quintals': quantity,
+            'Price_Per_Quintal': price,
+            'Total_Revenue': quantity * price
+        })
         analyzer = FarmerProfitAnalyzer(df)
         dashboard = analyzer.generate_dashboard()
         
@@ -160,6 +405,38 @@ def generate_profit_dashboard(transactions: List[Transaction]):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/profit-dashboard/{farmer_id}",
+         response_model=ProfitDashboardResponse,
+         dependencies=[Depends(validate_api_key), Depends(verify_signature)])
+def get_farmer_profit_dashboard(farmer_id: str):
+    """Dashboard served from the farmer's running profit aggregates."""
+    dashboard = profit_aggregates.generate_dashboard(farmer_id)
+    if dashboard is None:
+        raise HTTPException(status_code=404, detail="No transactions recorded for this farmer")
+    return ProfitDashboardResponse(
+        total_net_profit=dashboard['overall']['total_net_profit'],
+        avg_profit_margin=dashboard['overall']['avg_profit_margin'],
+        most_profitable_crop=dashboard['overall']['most_profitable_crop'],
+        best_selling_windows=dashboard['optimal_selling_windows'],
+        monthly_profit_trend=dashboard['monthly_distribution']
+    )
+
+@app.post("/api/profit-dashboard/{farmer_id}/transactions",
+          response_model=ProfitDashboardResponse,
+          dependencies=[Depends(validate_api_key), Depends(verify_signature)])
+def add_farmer_transactions(farmer_id: str, transactions: List[ReportedTransaction]):
+    """
+    Adds sales made outside the ledger (e.g. mandi sales) to the farmer's
+    aggregates. Idempotent: an order id already added is skipped, so retries are safe.
+    """
+    try:
+        profit_aggregates.add_transactions(
+            farmer_id, ((t.date, t.crop, t.quantity, t.price, t.order_id) for t in transactions)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid transaction: {str(e)}")
+    return get_farmer_profit_dashboard(farmer_id)
+
 # --- Route 5: Policy & MSP Awareness ---
 @app.get("/api/policy-awareness", 
          response_model=MSPAnalysisResponse,
@@ -192,60 +469,161 @@ def trigger_alerts_scan(background_tasks: BackgroundTasks):
     return {"message": "Background alert processing task queued."}
 
 # --- Route 6: Blockchain Trade Ledger ---
+
+def _ledger_result(future):
+    """
+    Waits for a ledger writer mutation. A mutation applied in a batch whose
+    ledger write failed still returns its result: contract state is already
+    committed and the record is written with the next batch, so reporting a
+    failure would make the client apply it a second time.
+    """
+    try:
+        return future.result()
+    except LedgerPersistError as e:
+        logger.warning("%s", e)
+        return e.result
+
+def _sealed_block(receipt):
+    if receipt['block'] is None:
+        # Sealing itself failed; a retry with the same order/idempotency key rejoins the pending record
+        raise HTTPException(status_code=503, detail="Trade recorded but not sealed yet. Retry with the same order_id.")
+    return receipt['block']
+
 @app.post("/api/blockchain/seal-trade", 
           response_model=TradeRecordResponse,
           dependencies=[Depends(validate_api_key), Depends(verify_signature)])
-def seal_trade_on_blockchain(trade: TradeRecordRequest):
+def seal_trade_on_blockchain(trade: TradeRecordRequest,
+                             idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     try:
-        # 1. Add trade to the pending transactions
-        blockchain_engine.add_transaction(
+        # Add the trade to its shard and seal it (batched with concurrent seals by the shard's writer)
+        shard = ledger_shards.shard_for(crop=trade.crop_type, region=trade.region)
+        receipt = _ledger_result(ledger_shards.submit(
+            shard,
+            "seal_trade",
             trade.farmer_id, 
             trade.buyer_id, 
             trade.crop_type, 
             trade.quantity, 
-            trade.agreed_price
-        )
-        
-        # 2. Mine the block (Simulation of decentralized confirmation)
-        last_block = blockchain_engine.last_block
-        proof = blockchain_engine.proof_of_work(last_block['proof'])
-        prev_hash = blockchain_engine.hash(last_block)
-        block = blockchain_engine.create_block(proof, prev_hash)
+            trade.agreed_price,
+            trade.order_id,
+            trade.idempotency_key or idempotency_key
+        ))
+        block = _sealed_block(receipt)
         
         return TradeRecordResponse(
             transaction_hash=blockchain_engine.hash(block),
             block_index=block['index'],
+            shard=shard,
+            duplicate=receipt['duplicate'],
             timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         )
+    except LedgerBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Blockchain Error: {str(e)}")
 
 @app.get("/api/blockchain/verify-ledger", response_model=BlockchainVerifyResponse)
 def verify_blockchain_integrity():
-    is_valid = blockchain_engine.verify_chain()
+    # Shards verify in parallel; anchored tip hashes tie them together
+    report = ledger_shards.verify_all()
     return BlockchainVerifyResponse(
-        is_valid=is_valid,
-        total_blocks=len(blockchain_engine.chain),
-        latest_block_hash=blockchain_engine.hash(blockchain_engine.last_block)
+        is_valid=report['is_valid'],
+        total_blocks=sum(s['height'] for s in report['shards'].values()),
+        latest_block_hash=blockchain_engine.hash(blockchain_engine.last_block),
+        anchors_valid=report['anchors_valid'],
+        shards=report['shards']
+    )
+
+@app.post("/api/blockchain/anchor",
+          dependencies=[Depends(validate_api_key), Depends(verify_signature)])
+def anchor_shards():
+    receipt = ledger_shards.anchor().result()
+    return {
+        "anchor_block": receipt['block']['index'],
+        "shards": len(ledger_shards.shards),
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+@app.get("/api/blockchain/blocks/{block_index}/proof/{tx_index}",
+         response_model=InclusionProofResponse,
+         dependencies=[Depends(validate_api_key), Depends(verify_signature)])
+def get_inclusion_proof(block_index: int, tx_index: int, shard: str = ShardedLedger.PRIMARY):
+    proof, error = _get_shard(shard).get_inclusion_proof(block_index, tx_index)
+    if error:
+        raise HTTPException(status_code=404, detail=error)
+    return InclusionProofResponse(**proof)
+
+@app.post("/api/blockchain/verify-proof", response_model=InclusionVerifyResponse)
+def verify_inclusion_proof(request: InclusionVerifyRequest):
+    is_included = AgricultureBlockchain.verify_inclusion_proof(
+        request.tx_hash,
+        [{"hash": step.hash, "position": step.position} for step in request.proof],
+        request.merkle_root,
+        request.merkle_version
+    )
+    return InclusionVerifyResponse(
+        is_included=is_included,
+        tx_hash=request.tx_hash,
+        merkle_root=request.merkle_root
     )
 
+@app.get("/api/blockchain/export",
+         dependencies=[Depends(validate_api_key), Depends(verify_signature)])
+def export_ledger(start_block: int = Query(1, ge=1),
+                  end_block: Optional[int] = Query(None, ge=1),
+                  since: Optional[float] = None,
+                  until: Optional[float] = None,
+                  party: Optional[str] = None,
+                  compress: bool = False,
+                  shard: str = ShardedLedger.PRIMARY):
+    """
+    Streams ledger blocks as NDJSON for auditors (optionally gzip-compressed).
+    `since`/`until` are UNIX timestamps; `party` matches farmer or buyer IDs.
+    """
+    stream = _get_shard(shard).export_ndjson(
+        compress=compress,
+        start_block=start_block, end_block=end_block,
+        since=since, until=until, party=party
+    )
+    if compress:
+        return StreamingResponse(
+            stream,
+            media_type="application/gzip",
+            headers={"Content-Disposition": 'attachment; filename="trade_ledger_export.ndjson.gz"'}
+        )
+    return StreamingResponse(stream, media_type="application/x-ndjson")
+
 @app.post("/api/blockchain/seal-integrity", 
           dependencies=[Depends(validate_api_key), Depends(verify_signature)])
-def seal_integrity(request: IntegritySealRequest):
+def seal_integrity(request: IntegritySealRequest,
+                   idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     try:
-        integrity_hash = blockchain_engine.seal_transaction_integrity(
+        integrity_hash = _ledger_result(ledger_shards.submit(
+            ledger_shards.shard_for(crop=request.crop_type, region=request.region),
+            "seal_transaction_integrity",
             request.farmer_id, 
             request.buyer_id, 
             request.crop_type, 
             request.quantity, 
             request.agreed_price, 
-            request.order_id
-        )
+            request.order_id,
+            request.idempotency_key or idempotency_key
+        ))
         return {
             "integrity_hash": integrity_hash,
             "status": "Immutable Record Created",
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
+    except LedgerBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -266,6 +644,76 @@ def verify_integrity(request: IntegrityVerifyRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# NDJSON lines parsed and verified per thread-pool hop while the upload streams in
+BULK_VERIFY_LINES = 16384
+
+def _verify_ndjson_lines(lines, offset):
+    try:
+        orders = [json.loads(line) for line in lines]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed payload: {str(e)}")
+    return blockchain_engine.verify_integrity_bulk(orders, offset=offset)
+
+def _verify_json_array(body):
+    try:
+        orders = json.loads(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed payload: {str(e)}")
+    if not isinstance(orders, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array or NDJSON stream of orders.")
+    return blockchain_engine.verify_integrity_bulk(orders)
+
+@app.post("/api/blockchain/verify-integrity/bulk",
+          response_model=BulkIntegrityVerifyResponse,
+          dependencies=[Depends(validate_api_key)])
+async def verify_integrity_bulk(request: Request, signature=Depends(streamed_signature)):
+    """
+    Nightly tamper sweep: accepts a JSON array or an NDJSON stream
+    (Content-Type: application/x-ndjson) of IntegrityVerifyRequest payloads
+    and returns only the mismatches plus summary counts.
+
+    NDJSON is consumed as it arrives: complete lines are parsed and verified
+    in the thread pool in slices of BULK_VERIFY_LINES, so neither the upload
+    nor its parsing sits on the event loop. The signature covers the whole
+    body and is checked before anything is returned.
+    """
+    started = time.perf_counter()
+    result = {'total': 0, 'authentic': 0, 'tampered': 0, 'invalid': 0, 'mismatches': []}
+
+    def merge(part):
+        for field in ('total', 'authentic', 'tampered', 'invalid'):
+            result[field] += part[field]
+        result['mismatches'].extend(part['mismatches'])
+
+    if "ndjson" in request.headers.get("content-type", ""):
+        partial, lines = b"", []
+        async for chunk in request.stream():
+            signature.update(chunk)
+            *complete, partial = (partial + chunk).split(b"\n")
+            lines.extend(line for line in complete if line.strip())
+            if len(lines) >= BULK_VERIFY_LINES:
+                merge(await run_in_threadpool(_verify_ndjson_lines, lines, result['total']))
+                lines = []
+        if partial.strip():
+            lines.append(partial)
+        if lines:
+            merge(await run_in_threadpool(_verify_ndjson_lines, lines, result['total']))
+        await signature.verify()
+    else:
+        # A JSON array has to be complete before it can be parsed
+        body = bytearray()
+        async for chunk in request.stream():
+            signature.update(chunk)
+            body += chunk
+        await signature.verify()
+        merge(await run_in_threadpool(_verify_json_array, bytes(body)))
+
+    elapsed = time.perf_counter() - started
+    return BulkIntegrityVerifyResponse(
+        **result,
+        orders_per_second=round(result['total'] / elapsed, 1) if elapsed > 0 else 0.0
+    )
+
 # --- Route 7: Smart Contract Escrow ---
 
 @app.post("/api/contracts/initiate", 
@@ -273,27 +721,55 @@ def verify_integrity(request: IntegrityVerifyRequest):
           dependencies=[Depends(validate_api_key), Depends(verify_signature)])
 def initiate_escrow(request: ContractInitiateRequest):
     try:
-        contract = blockchain_engine.initiate_smart_contract(
+        contract = _ledger_result(ledger_writer.submit(
+            blockchain_engine.initiate_smart_contract,
             request.farmer_id, request.buyer_id, request.crop, request.quantity, request.price
-        )
+        ))
+        escrow_scheduler.track(contract)
         return ContractResponse(**contract)
+    except LedgerBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/contracts/dispatch/{contract_id}", response_model=ContractResponse)
 def dispatch_order(contract_id: str):
-    contract, error = blockchain_engine.mark_as_dispatched(contract_id)
+    try:
+        contract, error = _ledger_result(ledger_writer.submit(blockchain_engine.mark_as_dispatched, contract_id))
+    except LedgerBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     if error:
         raise HTTPException(status_code=400, detail=error)
+    escrow_scheduler.track(contract)
     return ContractResponse(**contract)
 
 @app.post("/api/contracts/confirm/{contract_id}", response_model=ContractResponse)
 def confirm_delivery_and_release(contract_id: str):
-    contract, error = blockchain_engine.confirm_delivery(contract_id)
+    try:
+        contract, error = _ledger_result(ledger_writer.submit(blockchain_engine.confirm_delivery, contract_id))
+    except LedgerBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     if error:
         raise HTTPException(status_code=400, detail=error)
+    escrow_scheduler.track(contract)
     return ContractResponse(**contract)
 
+@app.get("/api/contracts",
+         response_model=ContractListResponse,
+         dependencies=[Depends(validate_api_key), Depends(verify_signature)])
+def list_contracts(farmer_id: Optional[str] = None,
+                   buyer_id: Optional[str] = None,
+                   status: Optional[str] = None,
+                   limit: int = Query(50, ge=1, le=500),
+                   offset: int = Query(0, ge=0)):
+    contracts, total = blockchain_engine.list_contracts(farmer_id, buyer_id, status, limit, offset)
+    return ContractListResponse(
+        contracts=[ContractResponse(**c) for c in contracts],
+        total=total,
+        limit=limit,
+        offset=offset
+    )
+
 @app.get("/api/contracts/{contract_id}", response_model=ContractResponse)
 def get_contract_status(contract_id: str):
     contract = blockchain_engine.get_contract(contract_id)
@@ -323,6 +799,97 @@ def audit_transaction(request: AuditRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/audit-transaction/batch",
+          response_model=BatchAuditResponse,
+          dependencies=[Depends(validate_api_key), Depends(verify_signature)])
+async def audit_transactions_batch(request: Request):
+    """
+    Nightly marketplace sweep: {"transactions": [...], "users": [...]}, each
+    either a list of records or a dict of equal-length columns. Returns only
+    flagged transactions plus aggregate counts.
+    """
+    body = await request.body()
+    try:
+        # A nightly sweep body is large: decode it off the event loop
+        payload = await run_in_threadpool(json.loads, body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Malformed payload: {str(e)}")
+    if not isinstance(payload, dict) or "transactions" not in payload:
+        raise HTTPException(status_code=400, detail="Expected an object with 'transactions' (and optional 'users').")
+
+    started = time.perf_counter()
+    try:
+        result = await run_in_threadpool(anomaly_engine.audit_batch, payload["transactions"], payload.get("users"))
+    except (KeyError, ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch: {str(e)}")
+    elapsed = time.perf_counter() - started
+    return BatchAuditResponse(
+        **result,
+        transactions_per_second=round(result["total"] / elapsed, 1) if elapsed > 0 else 0.0
+    )
+
+@app.get("/api/audit/trade-graph",
+         response_model=TradeGraphFindingsResponse,
+         dependencies=[Depends(validate_api_key), Depends(verify_signature)])
+def trade_graph_findings(user_id: Optional[str] = None,
+                         pattern: Optional[str] = None,
+                         limit: int = Query(100, ge=1, le=1000)):
+    """Recent wash-trading findings (SHORT_CYCLE, DENSE_PAIR, RAPID_REVERSAL), newest first."""
+    if pattern is not None and pattern not in TradeGraphIndex.PATTERNS:
+        raise HTTPException(status_code=400, detail=f"Unknown pattern: {pattern}")
+    return TradeGraphFindingsResponse(
+        users_indexed=len(trade_graph),
+        trade_pairs_indexed=trade_graph.edge_count,
+        findings=trade_graph.recent_findings(user_id, pattern, limit)
+    )
+
+# --- Route 9: Security Audit ---
+@app.get("/api/security/violations",
+         response_model=SecurityViolationsResponse,
+         dependencies=[Depends(validate_api_key), Depends(verify_signature)])
+def recent_security_violations(ip: Optional[str] = None,
+                               path: Optional[str] = None,
+                               event: Optional[str] = None,
+                               since: Optional[float] = None,
+                               limit: int = Query(100, ge=1, le=1000)):
+    violations = audit_log.recent_violations(ip=ip, path=path, event=event, since=since, limit=limit)
+    return SecurityViolationsResponse(violations=violations, count=len(violations))
+
+# --- Route 10: Operations ---
+@app.get("/api/ops/load",
+         response_model=LoadSheddingMetricsResponse,
+         dependencies=[Depends(validate_api_key)])
+def load_shedding_metrics():
+    return LoadSheddingMetricsResponse(bulkheads={b.name: b.stats() for b in bulkheads})
+
+# --- Route 11: Supply Change Points ---
+@app.post("/api/market/arrivals",
+          response_model=ArrivalIngestResponse,
+          dependencies=[Depends(validate_api_key), Depends(verify_signature)])
+def ingest_arrivals(request: ArrivalIngestRequest):
+    """
+    Streams daily arrival report rows into the change-point detectors;
+    varieties of one market/commodity/day are summed. Detected supply shocks
+    are pushed to subscribers (gap analyzer) and returned.
+    """
+    df = pd.DataFrame([{
+        'Market': a.market, 'Commodity': a.commodity,
+        'Arrival Quantity': a.arrival_quantity, 'Arrival Date': a.arrival_date
+    } for a in request.arrivals], columns=['Market', 'Commodity', 'Arrival Quantity', 'Arrival Date'])
+    try:
+        df['Arrival Date'] = pd.to_datetime(df['Arrival Date'], format='%Y-%m-%d')
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid arrival_date: {str(e)}")
+    try:
+        events = arrival_monitor.replay(df, emit=True)
+        return ArrivalIngestResponse(
+            ingested=len(df),
+            series_tracked=len(arrival_monitor.series),
+            change_points=[SupplyShockEvent(**e) for e in events]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
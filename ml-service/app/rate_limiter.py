@@ -0,0 +1,216 @@
+import math
+import sqlite3
+import threading
+import time
+
+
+def _slide(state, window_index):
+    """
+    Rolls a (window, current, previous) counter forward to `window_index`.
+    """
+    window, current, previous = state
+    if window == window_index:
+        return state
+    if window == window_index - 1:
+        return window_index, 0, current
+    return window_index, 0, 0
+
+
+def _decide_all(states, now, window_seconds, limits):
+    """
+    Applies _decide to several counters at once. The request is counted on
+    every counter only if all of them allow it.
+
+    Returns (new_states, allowed, retry_after_seconds).
+    """
+    decisions = [_decide(state, now, window_seconds, limit) for state, limit in zip(states, limits)]
+    denied = [retry_after for _, allowed, retry_after in decisions if not allowed]
+    if denied:
+        return states, False, max(denied)
+    return [state for state, _, _ in decisions], True, 0
+
+
+def _decide(state, now, window_seconds, limit):
+    """
+    Sliding-window counter: the previous window's count is weighted by how
+    much of it still overlaps the trailing `window_seconds`. Two integers per
+    key replace the old per-IP timestamp list.
+
+    Returns (new_state, allowed, retry_after_seconds).
+    """
+    window_index = int(now // window_seconds)
+    window, current, previous = _slide(state, window_index)
+    elapsed = (now % window_seconds) / window_seconds
+    estimated = previous * (1 - elapsed) + current
+    if estimated < limit:
+        return (window, current + 1, previous), True, 0
+
+    if current >= limit or previous == 0:
+        retry_after = window_seconds * (1 - elapsed)
+    else:
+        # Wait until the decaying previous window brings the estimate under the limit
+        retry_after = window_seconds * (1 - (limit - current) / previous - elapsed)
+    return (window, current, previous), False, max(1, math.ceil(retry_after))
+
+
+class InMemoryRateLimitBackend:
+    """Per-process counters (single uvicorn worker)."""
+
+    def __init__(self):
+        self._counters = {}  # key -> (window, current, previous)
+        self._lock = threading.Lock()
+
+    def hit(self, checks, now, window_seconds):
+        """
+        Args:
+            checks (list): [(key, limit)] counters this request is charged to
+        """
+        with self._lock:
+            states = [self._counters.get(key, (0, 0, 0)) for key, _ in checks]
+            states, allowed, retry_after = _decide_all(states, now, window_seconds, [limit for _, limit in checks])
+            if allowed:
+                for (key, _), state in zip(checks, states):
+                    self._counters[key] = state
+        return allowed, retry_after
+
+    def evict(self, before_window):
+        """Drops keys idle for two full windows (their counters are all zero)."""
+        with self._lock:
+            idle = [key for key, state in self._counters.items() if state[0] < before_window]
+            for key in idle:
+                del self._counters[key]
+        return len(idle)
+
+    def __len__(self):
+        return len(self._counters)
+
+
+class SQLiteRateLimitBackend:
+    """
+    Counters in a local SQLite file, shared by every uvicorn worker on the
+    host. Each hit is one short IMMEDIATE transaction on a WAL database.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS rate_limits (
+            key TEXT PRIMARY KEY,
+            window INTEGER NOT NULL,
+            current INTEGER NOT NULL,
+            previous INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_rate_limits_window ON rate_limits (window);
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript(self.SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Autocommit mode: transactions are opened explicitly below
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn = conn
+        return conn
+
+    def hit(self, checks, now, window_seconds):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = [
+                conn.execute('SELECT window, current, previous FROM rate_limits WHERE key = ?', (key,)).fetchone()
+                for key, _ in checks
+            ]
+            states, allowed, retry_after = _decide_all(
+                [row or (0, 0, 0) for row in rows], now, window_seconds, [limit for _, limit in checks]
+            )
+            if allowed:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO rate_limits (key, window, current, previous) VALUES (?, ?, ?, ?)',
+                    [(key, *state) for (key, _), state in zip(checks, states)]
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, retry_after
+
+    def evict(self, before_window):
+        conn = self._connection()
+        return conn.execute('DELETE FROM rate_limits WHERE window < ?', (before_window,)).rowcount
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM rate_limits').fetchone()[0]
+
+
+class RateLimiter:
+    """
+    Sliding-window rate limiter with per-route and per-API-key limits.
+
+    Every request is charged to two counters and must fit both:
+
+    - per caller across all routes, limited by `caller_limit` (the old
+      per-IP limit) or the caller's API key override;
+    - per (caller, route), limited by the API key override, the route
+      override, or `requests_per_minute`.
+
+    The caller is the API key when one is configured with its own limit,
+    otherwise the client IP.
+    """
+
+    def __init__(self, backend=None, requests_per_minute=60, window_seconds=60,
+                 route_limits=None, api_key_limits=None, eviction_interval=60, caller_limit=None):
+        """
+        Args:
+            backend: InMemoryRateLimitBackend or SQLiteRateLimitBackend
+            requests_per_minute (int): Default limit per route per window
+            window_seconds (int): Sliding window length
+            route_limits (dict): {route path: limit}
+            api_key_limits (dict): {api key: limit}
+            eviction_interval (float): Seconds between idle-key sweeps (0 disables)
+            caller_limit (int): Limit per caller over all routes (defaults to requests_per_minute)
+        """
+        self.backend = backend if backend is not None else InMemoryRateLimitBackend()
+        self.default_limit = requests_per_minute
+        self.caller_limit = caller_limit if caller_limit is not None else requests_per_minute
+        self.window_seconds = window_seconds
+        self.route_limits = route_limits or {}
+        self.api_key_limits = api_key_limits or {}
+        self._stop = threading.Event()
+        if eviction_interval:
+            threading.Thread(
+                target=self._evict_loop, args=(eviction_interval,), name="rate-limit-eviction", daemon=True
+            ).start()
+
+    def limit_for(self, route, api_key=None):
+        if api_key in self.api_key_limits:
+            return self.api_key_limits[api_key]
+        return self.route_limits.get(route, self.default_limit)
+
+    def check(self, client_ip, route, api_key=None):
+        """Counts one request. Returns (allowed, retry_after_seconds)."""
+        if api_key in self.api_key_limits:
+            caller, caller_limit = f"key:{api_key}", self.api_key_limits[api_key]
+        else:
+            caller, caller_limit = f"ip:{client_ip}", self.caller_limit
+        checks = [(caller, caller_limit), (f"{caller}|{route}", self.limit_for(route, api_key))]
+        return self.backend.hit(checks, time.time(), self.window_seconds)
+
+    def evict_idle(self, now=None):
+        # A key whose last window is two windows old estimates to zero
+        current_window = int((now or time.time()) // self.window_seconds)
+        return self.backend.evict(current_window - 1)
+
+    def _evict_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.evict_idle()
+            except sqlite3.Error:
+                pass  # Another worker holds the lock; sweep again next interval
+
+    def close(self):
+        self._stop.set()
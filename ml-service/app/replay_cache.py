@@ -0,0 +1,108 @@
+import sqlite3
+import threading
+import time
+
+
+class ReplayCache:
+    """
+    Remembers the client nonces of verified requests for the timestamp
+    window so a captured signed request cannot be replayed. Keying on the
+    nonce rather than the signature lets a client send the same request
+    twice within a second; each carries a fresh nonce.
+
+    The signature covers the nonce and its own X-ML-Timestamp, so a replay
+    always lands in the same time bucket as the original: lookups touch one
+    set (O(1)) and whole buckets are dropped once their timestamps fall out
+    of the window, which bounds memory to roughly peak RPS x window.
+    """
+
+    # check_and_add only takes an in-process lock, so it can run on the event loop
+    blocking = False
+
+    def __init__(self, window_seconds=300, bucket_seconds=30):
+        """
+        Args:
+            window_seconds (int): Accepted timestamp skew (matches verify_signature)
+            bucket_seconds (int): Width of one time bucket
+        """
+        self.window_seconds = window_seconds
+        self.bucket_seconds = bucket_seconds
+        self._buckets = {}  # bucket index -> set of nonces
+        self._lock = threading.Lock()
+        self._oldest_kept = 0
+
+    def _evict(self, now):
+        oldest = int((now - self.window_seconds) // self.bucket_seconds)
+        if oldest <= self._oldest_kept:
+            return
+        for bucket in [b for b in self._buckets if b < oldest]:
+            del self._buckets[bucket]
+        self._oldest_kept = oldest
+
+    def check_and_add(self, nonce, timestamp, now=None):
+        """Returns True the first time a nonce is seen, False for a replay."""
+        bucket = int(timestamp) // self.bucket_seconds
+        with self._lock:
+            self._evict(time.time() if now is None else now)
+            seen = self._buckets.setdefault(bucket, set())
+            if nonce in seen:
+                return False
+            seen.add(nonce)
+            return True
+
+    def __len__(self):
+        return sum(len(s) for s in self._buckets.values())
+
+
+class SQLiteReplayCache(ReplayCache):
+    """
+    Same contract as ReplayCache, backed by a local SQLite file so every
+    uvicorn worker on the host sees the same nonces. The primary key
+    makes check-and-add a single atomic INSERT OR IGNORE.
+    """
+
+    # Waits on SQLite's write lock: callers on the event loop use the threadpool
+    blocking = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS client_nonces (
+            nonce TEXT PRIMARY KEY,
+            bucket INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_client_nonces_bucket ON client_nonces (bucket);
+    """
+
+    def __init__(self, db_path, window_seconds=300, bucket_seconds=30):
+        super().__init__(window_seconds, bucket_seconds)
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn = conn
+        return conn
+
+    def _evict(self, now):
+        oldest = int((now - self.window_seconds) // self.bucket_seconds)
+        if oldest <= self._oldest_kept:
+            return
+        # At most one DELETE per bucket rotation, per worker
+        self._oldest_kept = oldest
+        self._connection().execute('DELETE FROM client_nonces WHERE bucket < ?', (oldest,))
+
+    def check_and_add(self, nonce, timestamp, now=None):
+        bucket = int(timestamp) // self.bucket_seconds
+        with self._lock:
+            self._evict(time.time() if now is None else now)
+        cursor = self._connection().execute(
+            'INSERT OR IGNORE INTO client_nonces (nonce, bucket) VALUES (?, ?)', (nonce, bucket)
+        )
+        return cursor.rowcount == 1
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM client_nonces').fetchone()[0]
@@ -40,6 +40,7 @@ class GapAnalysisResponse(BaseModel):
     insight: str
     estimated_supply: str
     estimated_demand: str
+    supply_shock: Optional[str] = None
 
 # --- 3. Buyer Trust Engine ---
 class BuyerHistory(BaseModel):
@@ -57,6 +58,18 @@ class TrustScoreResponse(BaseModel):
     rank: str
     risk_level: str
     verdict: str
+    # Reputation propagated over the trade graph, relative to the average account (1.0)
+    network_reputation: Optional[float] = None
+
+class TrustIncidentRequest(BaseModel):
+    kind: str = Field(..., description="failed_payment or dispute")
+
+class BuyerTrustRankingResponse(BaseModel):
+    total: int
+    rank_counts: Dict[str, int]
+    order: str
+    buyers: List[TrustScoreResponse]
+    buyers_per_second: float
 
 # --- 4. Farmer Profit Dashboard ---
 class Transaction(BaseModel):
@@ -65,6 +78,10 @@ class Transaction(BaseModel):
     quantity: float
     price: float
 
+class ReportedTransaction(Transaction):
+    # A retried report of the same sale is added once
+    order_id: str = Field(..., min_length=1, description="Unique id of the sale, e.g. the mandi receipt number")
+
 class ProfitDashboardResponse(BaseModel):
     total_net_profit: float
     avg_profit_margin: str
@@ -90,6 +107,8 @@ class TradeRecordRequest(BaseModel):
     quantity: float
     agreed_price: float
     order_id: Optional[str] = None
+    region: Optional[str] = None  # State/district, used when the ledger is sharded by region
+    idempotency_key: Optional[str] = None  # Defaults to order_id for retry deduplication
 
 class IntegritySealRequest(BaseModel):
     farmer_id: str
@@ -98,6 +117,8 @@ class IntegritySealRequest(BaseModel):
     quantity: float
     agreed_price: float
     order_id: str
+    region: Optional[str] = None
+    idempotency_key: Optional[str] = None
 
 class IntegrityVerifyRequest(BaseModel):
     farmer_id: str
@@ -114,9 +135,26 @@ class IntegrityVerifyResponse(BaseModel):
     stored_hash: str
     tampered_detected: bool
 
+class IntegrityMismatch(BaseModel):
+    position: int
+    order_id: Optional[str] = None
+    stored_hash: Optional[str] = None
+    recomputed_hash: Optional[str] = None
+    error: Optional[str] = None
+
+class BulkIntegrityVerifyResponse(BaseModel):
+    total: int
+    authentic: int
+    tampered: int
+    invalid: int
+    mismatches: List[IntegrityMismatch]
+    orders_per_second: float
+
 class TradeRecordResponse(BaseModel):
     transaction_hash: str
     block_index: int
+    shard: str = "main"
+    duplicate: bool = False  # True when a retry returned the original seal
     status: str = "Blockchain Verified"
     timestamp: str
 
@@ -124,6 +162,33 @@ class BlockchainVerifyResponse(BaseModel):
     is_valid: bool
     total_blocks: int
     latest_block_hash: str
+    anchors_valid: Optional[bool] = None
+    shards: Optional[Dict[str, Dict]] = None
+
+class MerkleProofStep(BaseModel):
+    hash: str
+    position: str  # Side of the sibling hash: "left" or "right"
+
+class InclusionProofResponse(BaseModel):
+    block_index: int
+    block_hash: str
+    merkle_root: str
+    merkle_version: int
+    tx_index: int
+    tx_hash: str
+    transaction: Dict
+    proof: List[MerkleProofStep]
+
+class InclusionVerifyRequest(BaseModel):
+    tx_hash: str
+    merkle_root: str
+    merkle_version: int = 2  # As returned with the proof; 1 for blocks sealed before versioning
+    proof: List[MerkleProofStep]
+
+class InclusionVerifyResponse(BaseModel):
+    is_included: bool
+    tx_hash: str
+    merkle_root: str
 
 # --- 7. Smart Contract (Escrow) ---
 class ContractInitiateRequest(BaseModel):
@@ -139,9 +204,17 @@ class ContractResponse(BaseModel):
     price: float
     created_at: float
     released_at: Optional[float] = None
+    dispatched_at: Optional[float] = None
+    expired_at: Optional[float] = None
     farmer_id: str
     buyer_id: str
 
+class ContractListResponse(BaseModel):
+    contracts: List[ContractResponse]
+    total: int
+    limit: int
+    offset: int
+
 # --- 8. AI Anomaly & Fraud Detection ---
 class AuditRequest(BaseModel):
     transaction_data: Dict
@@ -155,3 +228,93 @@ class AuditResponse(BaseModel):
     verdict: str
     audit_code: str
     flags: List[str]
+
+class BatchAuditFlag(BaseModel):
+    transaction_id: str
+    user_id: str
+    risk_score: float
+    risk_level: str
+    price_score: float
+    price_deviation: float
+    price_z_score: float
+    behavior_score: float
+    flags: List[str]
+    audit_code: str
+
+class BatchAuditResponse(BaseModel):
+    total: int
+    flagged_count: int
+    risk_counts: Dict[str, int]
+    price_anomalies: int
+    suspicious_users: int
+    flagged: List[BatchAuditFlag]
+    transactions_per_second: float
+
+class TradeGraphFinding(BaseModel):
+    pattern: str
+    users: List[str]
+    timestamp: float
+    repetitions: Optional[int] = None
+    trades: Optional[int] = None
+    share: Optional[float] = None
+    value: Optional[float] = None
+    seconds_apart: Optional[float] = None
+
+class TradeGraphFindingsResponse(BaseModel):
+    users_indexed: int
+    trade_pairs_indexed: int
+    findings: List[TradeGraphFinding]
+
+# --- 9. Security Audit ---
+class SecurityViolation(BaseModel):
+    ts: float
+    event: str
+    severity: str
+    ip: Optional[str] = None
+    path: Optional[str] = None
+
+class SecurityViolationsResponse(BaseModel):
+    violations: List[SecurityViolation]
+    count: int
+
+# --- 10. Operations ---
+class BulkheadStats(BaseModel):
+    max_concurrent: int
+    max_queue: int
+    in_flight: int
+    queue_depth: int
+    peak_queue_depth: int
+    admitted: int
+    shed: Dict[str, int]
+    ewma_latency_ms: float
+    ewma_queue_wait_ms: float
+
+class LoadSheddingMetricsResponse(BaseModel):
+    bulkheads: Dict[str, BulkheadStats]
+
+# --- 11. Supply Change Points ---
+class ArrivalRecord(BaseModel):
+    market: str
+    commodity: str
+    arrival_quantity: float
+    arrival_date: str  # YYYY-MM-DD
+
+class ArrivalIngestRequest(BaseModel):
+    arrivals: List[ArrivalRecord]
+
+class SupplyShockEvent(BaseModel):
+    event: str
+    market: str
+    commodity: str
+    date: Optional[str] = None
+    arrival_quantity: float
+    baseline_quantity: float
+    change_ratio: Optional[float] = None
+    statistic: float
+    trigger_reason: str
+    recommended_action: str
+
+class ArrivalIngestResponse(BaseModel):
+    ingested: int
+    series_tracked: int
+    change_points: List[SupplyShockEvent]
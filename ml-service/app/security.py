@@ -1,15 +1,36 @@
 import os
+import re
+import json
 import hmac
 import hashlib
 import time
 import logging
 from fastapi import Request, HTTPException, Security, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security.api_key import API_KEY_HEADER, API_KeyHeader
 from starlette.status import HTTP_403_FORBIDDEN
 
+from .rate_limiter import RateLimiter, InMemoryRateLimitBackend, SQLiteRateLimitBackend
+from .audit_log import SecurityAuditLog
+from .replay_cache import ReplayCache, SQLiteReplayCache
+
 # Setup AI Audit Logger
+# Audit records are queued to a background writer (compact JSON lines, size-rotated);
+# accepted requests are sampled, violations are always kept. Each worker writes its own
+# file; AUDIT_VIOLATIONS_BACKEND=sqlite shares the queryable violations across workers
 logging.basicConfig(level=logging.INFO)
-audit_logger = logging.getLogger("ML_SECURITY_AUDIT")
+audit_log = SecurityAuditLog(
+    log_path=os.getenv(
+        "AUDIT_LOG_PATH", os.path.join(os.path.dirname(__file__), "..", "models", "security_audit.jsonl")
+    ),
+    max_bytes=int(os.getenv("AUDIT_LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+    backup_count=int(os.getenv("AUDIT_LOG_BACKUPS", "5")),
+    success_sample_rate=float(os.getenv("AUDIT_SUCCESS_SAMPLE_RATE", "0.01")),
+    violations_db=(
+        os.getenv("AUDIT_VIOLATIONS_DB", "/tmp/agrolink_security_violations.db")
+        if os.getenv("AUDIT_VIOLATIONS_BACKEND", "memory") == "sqlite" else None
+    ),
+)
 
 # 1. API Key Configuration
 # In production, these would be in .env
@@ -17,95 +38,145 @@ ML_API_KEY = os.getenv("ML_SERVICE_API_KEY", "agrolink_secure_ml_key_2026")
 ML_SECRET_KEY = os.getenv("ML_SERVICE_SECRET", "super_secret_ml_protection_code")
 
 API_KEY_NAME = "X-ML-API-Key"
+SIGNATURE_WINDOW_SECONDS = 300
+# Client-chosen, single-use value covered by the signature (e.g. 32 random hex chars)
+NONCE_PATTERN = re.compile(r"[A-Za-z0-9_-]{16,128}")
+
+# Nonces of verified requests are remembered for the timestamp window so signed requests
+# cannot be replayed; REPLAY_CACHE_BACKEND=sqlite shares them across uvicorn workers
+if os.getenv("REPLAY_CACHE_BACKEND", "memory") == "sqlite":
+    replay_cache = SQLiteReplayCache(
+        os.getenv("REPLAY_CACHE_DB", "/tmp/agrolink_replay_cache.db"), window_seconds=SIGNATURE_WINDOW_SECONDS
+    )
+else:
+    replay_cache = ReplayCache(window_seconds=SIGNATURE_WINDOW_SECONDS)
 api_key_header = API_KeyHeader(name=API_KEY_NAME, auto_error=False)
 
-async def validate_api_key(api_key: str = Security(api_key_header)):
+async def validate_api_key(request: Request, api_key: str = Security(api_key_header)):
     """
     Ensures the request comes from an authorized caller (Node.js Backend).
     """
     if api_key == ML_API_KEY:
         return api_key
     
-    audit_logger.warning(f"API KEY VIOLATION: Invalid key from unknown source.")
+    audit_log.violation("API_KEY_VIOLATION", request.client.host, request.url.path)
     raise HTTPException(
         status_code=HTTP_403_FORBIDDEN, 
         detail="Unauthorized: ML Model Access Denied. Invalid API Key."
     )
 
-async def verify_signature(request: Request):
-    """
-    HMAC Signature Verification Policy.
-    Protects against Request Tampering and Replay Attacks.
-    
-    Formula: HMAC_SHA256(Secret, Timestamp + RequestPath + Body)
-    """
+def _signature_headers(request: Request):
     signature = request.headers.get("X-ML-Signature")
     timestamp = request.headers.get("X-ML-Timestamp")
+    nonce = request.headers.get("X-ML-Nonce")
     
-    if not signature or not timestamp:
-        raise HTTPException(status_code=403, detail="Security Violation: Missing Signature or Timestamp.")
+    if not signature or not timestamp or not nonce:
+        audit_log.violation("MISSING_SIGNATURE", request.client.host, request.url.path)
+        raise HTTPException(status_code=403, detail="Security Violation: Missing Signature, Timestamp or Nonce.")
+    if not NONCE_PATTERN.fullmatch(nonce):
+        audit_log.violation("INVALID_NONCE", request.client.host, request.url.path)
+        raise HTTPException(status_code=403, detail="Security Violation: Malformed Nonce.")
 
     # 1. Expiration Check (Prevent Replay Attacks - 5 minute window)
     current_time = int(time.time())
-    if abs(current_time - int(timestamp)) > 300:
+    if abs(current_time - int(timestamp)) > SIGNATURE_WINDOW_SECONDS:
+        audit_log.violation("REQUEST_EXPIRED", request.client.host, request.url.path, timestamp=timestamp)
         raise HTTPException(status_code=403, detail="Security Violation: Request Expired (Timestamp Mismatch).")
+    return signature, timestamp, nonce
 
-    # 2. Get Raw Body for Hashing
-    body = await request.body()
-    body_str = body.decode() if body else ""
-    
-    # 3. Reconstruct Payload String
-    # Note: Path is included to ensure signature is unique per endpoint
-    payload = f"{timestamp}{request.url.path}{body_str}"
+class SignatureVerifier:
+    """
+    Incremental HMAC check for one request: the body is fed in as it is
+    read, so routes that stream their upload never need it in memory.
+    """
+
+    def __init__(self, request: Request, signature: str, timestamp: str, nonce: str):
+        self.request = request
+        self.signature = signature
+        self.timestamp = timestamp
+        self.nonce = nonce
+        # Note: Path is included to ensure signature is unique per endpoint
+        self._mac = hmac.new(
+            ML_SECRET_KEY.encode(), f"{timestamp}{nonce}{request.url.path}".encode(), hashlib.sha256
+        )
+
+    def update(self, chunk: bytes):
+        self._mac.update(chunk)
+
+    async def verify(self):
+        """Signature and replay checks; call once the whole body has been fed in."""
+        request = self.request
+        # Constant-time comparison to prevent timing attacks
+        if not hmac.compare_digest(self.signature, self._mac.hexdigest()):
+            # We log this for audit purposes
+            audit_log.violation("SIGNATURE_MISMATCH", request.client.host, request.url.path, severity="critical")
+            raise HTTPException(status_code=403, detail="Security Violation: Request Signature Mismatch. Data may be tampered.")
+
+        # Replay Check (only verified nonces are cached, so forgeries cannot fill it)
+        if replay_cache.blocking:
+            fresh = await run_in_threadpool(replay_cache.check_and_add, self.nonce, self.timestamp)
+        else:
+            fresh = replay_cache.check_and_add(self.nonce, self.timestamp)
+        if not fresh:
+            audit_log.violation("REPLAY_DETECTED", request.client.host, request.url.path, severity="critical")
+            raise HTTPException(status_code=403, detail="Security Violation: Replayed Request. Nonces are single-use.")
+
+        audit_log.success("SIGNATURE_VERIFIED", request.client.host, request.url.path)
+
+async def verify_signature(request: Request):
+    """
+    HMAC Signature Verification Policy.
+    Protects against Request Tampering and Replay Attacks.
     
-    # 4. Compute HMAC
-    expected_signature = hmac.new(
-        ML_SECRET_KEY.encode(),
-        payload.encode(),
-        hashlib.sha256
-    ).hexdigest()
-
-    # 5. Constant-time comparison to prevent timing attacks
-    if not hmac.compare_digest(signature, expected_signature):
-        # We log this for audit purposes
-        audit_logger.critical(f"TAMPERING DETECTED: Signature mismatch from IP {request.client.host} on path {request.url.path}")
-        raise HTTPException(status_code=403, detail="Security Violation: Request Signature Mismatch. Data may be tampered.")
-
-    audit_logger.info(f"Model Access Verified: Valid signature received for {request.url.path}")
+    Formula: HMAC_SHA256(Secret, Timestamp + Nonce + RequestPath + Body)
+    """
+    verifier = SignatureVerifier(request, *_signature_headers(request))
+    verifier.update(await request.body())
+    await verifier.verify()
     return True
 
-# Simple In-Memory Rate Limiter for Project Demonstration
-# In a production environment, use Redis with slowapi
-class SimpleRateLimiter:
-    def __init__(self, requests_per_minute: int = 60):
-        self.limits = {} # {ip: [timestamps]}
-        self.max_requests = requests_per_minute
-
-    def check_rate(self, ip: str):
-        now = time.time()
-        # Clean old timestamps
-        if ip not in self.limits:
-            self.limits[ip] = []
-        
-        self.limits[ip] = [t for t in self.limits[ip] if now - t < 60]
-        
-        if len(self.limits[ip]) >= self.max_requests:
-            return False
-        
-        self.limits[ip].append(now)
-        return True
-
-limiter = SimpleRateLimiter(requests_per_minute=20)
-
-async def rate_limit(request: Request):
+async def streamed_signature(request: Request):
+    """
+    verify_signature for routes that consume `request.stream()` themselves:
+    checks the headers up front and returns a SignatureVerifier the route
+    feeds each body chunk to, then verifies before responding.
+    """
+    return SignatureVerifier(request, *_signature_headers(request))
+
+# Sliding-window rate limiter (see rate_limiter.py)
+# RATE_LIMIT_BACKEND=sqlite shares counters between uvicorn workers on one host;
+# RATE_LIMIT_CALLER_PER_MINUTE caps each client IP over all routes (the old per-IP limit),
+# RATE_LIMIT_PER_MINUTE each (IP, route) unless RATE_LIMIT_ROUTES overrides it;
+# RATE_LIMIT_ROUTES / RATE_LIMIT_API_KEYS take JSON maps of {route or key: requests per minute}
+def _build_rate_limiter():
+    if os.getenv("RATE_LIMIT_BACKEND", "memory") == "sqlite":
+        backend = SQLiteRateLimitBackend(os.getenv("RATE_LIMIT_DB", "/tmp/agrolink_rate_limits.db"))
+    else:
+        backend = InMemoryRateLimitBackend()
+    return RateLimiter(
+        backend=backend,
+        requests_per_minute=int(os.getenv("RATE_LIMIT_PER_MINUTE", "20")),
+        caller_limit=int(os.getenv("RATE_LIMIT_CALLER_PER_MINUTE", os.getenv("RATE_LIMIT_PER_MINUTE", "20"))),
+        route_limits=json.loads(os.getenv("RATE_LIMIT_ROUTES", "{}")),
+        api_key_limits=json.loads(os.getenv("RATE_LIMIT_API_KEYS", "{}")),
+    )
+
+limiter = _build_rate_limiter()
+
+def rate_limit(request: Request):
     """
     Throttles requests to prevent ML Model Scraping and Brute-Force Abuse.
+    Sync so FastAPI runs it in the threadpool: the SQLite backend blocks on its write lock.
     """
     client_ip = request.client.host
-    if not limiter.check_rate(client_ip):
-        audit_logger.error(f"RATE LIMIT EXCEEDED: Defensive throttling active for IP {client_ip}")
+    route = request.scope.get("route")
+    route_path = route.path if route is not None else request.url.path
+    allowed, retry_after = limiter.check(client_ip, route_path, request.headers.get(API_KEY_NAME))
+    if not allowed:
+        audit_log.violation("RATE_LIMIT_EXCEEDED", client_ip, route_path, retry_after=retry_after)
         raise HTTPException(
             status_code=429, 
-            detail="Rate Limit Exceeded: Protection Protocol Active. Please slow down inference requests."
+            detail="Rate Limit Exceeded: Protection Protocol Active. Please slow down inference requests.",
+            headers={"Retry-After": str(retry_after)}
         )
     return True
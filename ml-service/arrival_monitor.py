@@ -0,0 +1,275 @@
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class ChangePointState:
+    """
+    O(1) Page-Hinkley state for one arrival series: the mean of the current
+    supply regime and two one-sided cumulative sums of the relative
+    deviation from it (CUSUM form, clamped at zero).
+    """
+
+    __slots__ = ('count', 'mean', 'g_up', 'g_down', 'last_quantity', 'last_change')
+
+    def __init__(self, count=0, mean=0.0, g_up=0.0, g_down=0.0, last_quantity=None, last_change=None):
+        self.count = count
+        self.mean = mean
+        self.g_up = g_up
+        self.g_down = g_down
+        self.last_quantity = last_quantity
+        self.last_change = last_change
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class ArrivalChangePointDetector:
+    """
+    Streaming supply-shock detection on daily `Arrival Quantity` per
+    (market, commodity).
+
+    Each day's arrival is compared with the mean of the current regime;
+    sustained relative deviations beyond `delta` accumulate until one side
+    crosses `threshold`, which emits SUPPLY_SURGE or SUPPLY_DROP and starts
+    a new regime at the shocked level. Subscribers (gap analyzer, alerts)
+    receive events shaped like the alert system's EventBus payloads.
+    """
+
+    EVENTS = ('SUPPLY_SURGE', 'SUPPLY_DROP')
+
+    def __init__(self, delta=0.15, threshold=1.5, min_samples=5):
+        """
+        Args:
+            delta (float): Relative day-to-day deviation tolerated as noise
+            threshold (float): Cumulative excess deviation that signals a change
+            min_samples (int): Days in a regime before changes can be signalled
+        """
+        self.delta = delta
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.series = {}
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def series_key(market, commodity):
+        return (str(market or '').strip().lower(), str(commodity or '').strip().lower())
+
+    def get(self, market, commodity):
+        return self.series.get(self.series_key(market, commodity))
+
+    # --- EVENTS ---
+
+    def subscribe(self, event_type, callback):
+        """Registers `callback(event)` for SUPPLY_SURGE or SUPPLY_DROP."""
+        if event_type not in self.EVENTS:
+            raise ValueError(f"Unknown arrival event: {event_type}")
+        self._subscribers.setdefault(event_type, []).append(callback)
+
+    def _emit(self, event):
+        for callback in self._subscribers.get(event['event'], ()):
+            try:
+                callback(event)
+            except Exception:
+                logger.exception("Arrival event subscriber failed for %s", event['event'])
+
+    @staticmethod
+    def _event(direction, market, commodity, quantity, baseline, statistic, date):
+        surge = direction == 'SUPPLY_SURGE'
+        return {
+            'event': direction,
+            'market': market,
+            'commodity': commodity,
+            'date': date,
+            'arrival_quantity': float(quantity),
+            'baseline_quantity': round(float(baseline), 2),
+            'change_ratio': round(float(quantity / baseline), 3) if baseline else None,
+            'statistic': round(float(statistic), 3),
+            # Same shape as price_alert_system events, so they can be forwarded to its EventBus
+            'alert_type': "Supply Shock",
+            'crop': commodity,
+            'region': market,
+            'trigger_reason': (
+                f"{commodity} arrivals in {market} {'surged' if surge else 'dropped'} to {float(quantity):.1f} MT "
+                f"against a {float(baseline):.1f} MT regime"
+            ),
+            'recommended_action': "SELL EARLY (Price Drop Expected)" if surge else "HOLD / WAIT (Price Rise Expected)"
+        }
+
+    # --- STREAMING ---
+
+    def _step(self, state, quantity):
+        """Feeds one arrival; returns (direction, baseline, statistic) on a change."""
+        quantity = float(quantity)
+        if state.count >= self.min_samples:
+            deviation = (quantity - state.mean) / state.mean if state.mean > 0 else 0.0
+            state.g_up = max(0.0, state.g_up + deviation - self.delta)
+            state.g_down = max(0.0, state.g_down - deviation - self.delta)
+            direction = None
+            if state.g_up > self.threshold:
+                direction, statistic = 'SUPPLY_SURGE', state.g_up
+            elif state.g_down > self.threshold:
+                direction, statistic = 'SUPPLY_DROP', state.g_down
+            if direction:
+                baseline = state.mean
+                # The shocked level opens a new regime
+                state.count, state.mean, state.g_up, state.g_down = 1, quantity, 0.0, 0.0
+                state.last_quantity = quantity
+                return direction, baseline, statistic
+        state.count += 1
+        state.mean += (quantity - state.mean) / state.count
+        state.last_quantity = quantity
+        return None
+
+    def update(self, market, commodity, quantity, date=None):
+        """
+        Feeds one day's total arrival for a series. Returns the emitted
+        event, or None when the series stays in its regime.
+        """
+        key = self.series_key(market, commodity)
+        with self._lock:
+            state = self.series.get(key)
+            if state is None:
+                state = self.series[key] = ChangePointState()
+            change = self._step(state, quantity)
+            if change is None:
+                return None
+            event = self._event(change[0], market, commodity, quantity, change[1], change[2], date)
+            state.last_change = event
+        self._emit(event)
+        return event
+
+    # --- BULK REPLAY ---
+
+    def replay(self, df, emit=False, emit_since=None):
+        """
+        Replays an arrival history (Market/Commodity/Arrival Quantity/Arrival
+        Date columns) through the detectors, continuing from current state.
+
+        Varieties are summed per market, commodity and day. All series then
+        advance in lockstep, one vectorized step per day position, so the
+        cost scales with the longest series rather than with the row count.
+        Returns the change events in date order; they are only delivered to
+        subscribers when `emit` is set, and with `emit_since` (a datetime)
+        only those dated on or after it.
+        """
+        df = df.dropna(subset=['Market', 'Commodity', 'Arrival Quantity'])
+        if df.empty:
+            return []
+        # Normalize each distinct name once, then fold rows onto integer series ids
+        key_codes = []
+        for column in ('Market', 'Commodity'):
+            codes, names = pd.factorize(df[column])
+            normalized_codes, normalized = pd.factorize(pd.Index(names).astype(str).str.strip().str.lower())
+            key_codes.append((normalized_codes[codes], normalized))
+        (market, markets), (commodity, commodities) = key_codes
+        daily = (
+            pd.DataFrame({
+                'series': market.astype(np.int64) * len(commodities) + commodity,
+                'date': df['Arrival Date'].to_numpy(),
+                'quantity': df['Arrival Quantity'].to_numpy(dtype=float),
+                'row': np.arange(len(df)),
+            })
+            .groupby(['series', 'date'], sort=True)
+            .agg(quantity=('quantity', 'sum'), row=('row', 'first'))
+            .reset_index()
+        )
+        series_ids, codes = np.unique(daily['series'].to_numpy(), return_inverse=True)
+        uniques = [(markets[sid // len(commodities)], commodities[sid % len(commodities)]) for sid in series_ids.tolist()]
+        position = np.arange(len(daily)) - np.searchsorted(codes, codes)
+        n_series, n_steps = len(uniques), int(position.max()) + 1
+        values = np.full((n_series, n_steps), np.nan)
+        values[codes, position] = daily['quantity'].to_numpy()
+        row_of = np.full((n_series, n_steps), -1)
+        row_of[codes, position] = np.arange(len(daily))
+
+        with self._lock:
+            states = [self.series.get(key) or ChangePointState() for key in uniques]
+            count = np.array([s.count for s in states], dtype=np.int64)
+            mean = np.array([s.mean for s in states], dtype=float)
+            g_up = np.array([s.g_up for s in states], dtype=float)
+            g_down = np.array([s.g_down for s in states], dtype=float)
+
+            changes = []  # (row, direction, baseline, statistic)
+            for step in range(n_steps):
+                quantity = values[:, step]
+                valid = ~np.isnan(quantity)
+                armed = valid & (count >= self.min_samples)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    deviation = np.where(mean > 0, (quantity - mean) / mean, 0.0)
+                g_up = np.where(armed, np.maximum(0.0, g_up + deviation - self.delta), g_up)
+                g_down = np.where(armed, np.maximum(0.0, g_down - deviation - self.delta), g_down)
+                surge = armed & (g_up > self.threshold)
+                drop = armed & ~surge & (g_down > self.threshold)
+                changed = surge | drop
+                for i in np.flatnonzero(changed).tolist():
+                    changes.append((
+                        row_of[i, step], 'SUPPLY_SURGE' if surge[i] else 'SUPPLY_DROP',
+                        mean[i], g_up[i] if surge[i] else g_down[i]
+                    ))
+
+                grown = np.where(valid & ~changed, count + 1, count)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    mean = np.where(changed, quantity, np.where(valid & ~changed, mean + (quantity - mean) / grown, mean))
+                count = np.where(changed, 1, grown)
+                g_up = np.where(changed, 0.0, g_up)
+                g_down = np.where(changed, 0.0, g_down)
+
+            events = []
+            changes.sort(key=lambda change: change[0])  # rows are in series/date order
+            source = daily['row'].to_numpy()
+            for row, direction, baseline, statistic in changes:
+                record = df.iloc[source[row]]
+                date = daily['date'].iat[row]
+                events.append(self._event(
+                    direction, record['Market'], record['Commodity'], daily['quantity'].iat[row], baseline, statistic,
+                    date.strftime('%Y-%m-%d') if hasattr(date, 'strftime') else date
+                ))
+            last_quantity = daily['quantity'].to_numpy()[np.searchsorted(codes, np.arange(n_series), side='right') - 1]
+            for i, key in enumerate(uniques):
+                state = states[i]
+                state.count, state.mean = int(count[i]), float(mean[i])
+                state.g_up, state.g_down = float(g_up[i]), float(g_down[i])
+                state.last_quantity = float(last_quantity[i])
+                self.series[key] = state
+            for event in events:
+                self.series[self.series_key(event['market'], event['commodity'])].last_change = event
+
+        events.sort(key=lambda event: str(event['date']))
+        if emit:
+            since = emit_since.strftime('%Y-%m-%d') if emit_since is not None else None
+            for event in events:
+                if since is None or (event['date'] is not None and str(event['date'])[:10] >= since):
+                    self._emit(event)
+        return events
+
+    def ingest_csv(self, csv_path, emit=False, emit_since=None):
+        """Replays the raw daily arrival report export (title row + header)."""
+        df = pd.read_csv(csv_path, skiprows=1)
+        df['Arrival Quantity'] = pd.to_numeric(df['Arrival Quantity'].astype(str).str.replace(',', ''), errors='coerce')
+        df['Arrival Date'] = pd.to_datetime(df['Arrival Date'], format='%d-%m-%Y', errors='coerce')
+        return self.replay(df.dropna(subset=['Arrival Date']), emit=emit, emit_since=emit_since)
+
+
+if __name__ == "__main__":
+    import os
+    from price_alert_system import push_notification_handler
+
+    detector = ArrivalChangePointDetector()
+    detector.subscribe('SUPPLY_DROP', push_notification_handler)
+
+    # Stable onion arrivals, then a sudden supply crunch
+    for day, quantity in enumerate([320, 335, 310, 328, 316, 322, 140, 120, 110, 105]):
+        detector.update("Ahmedabad APMC", "Onion", quantity, date=f"2026-01-{day + 1:02d}")
+
+    report = os.path.join(os.path.dirname(__file__), "..", "Vegetables  price 01-01-26 to 25-01-26.csv")
+    if os.path.exists(report):
+        events = ArrivalChangePointDetector().ingest_csv(report)
+        print(f"\nReplayed arrival report: {len(events)} change points")
+        for event in events[:5]:
+            print(f" - {event['date']} {event['event']}: {event['trigger_reason']}")
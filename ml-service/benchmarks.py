@@ -0,0 +1,350 @@
+import os
+import sys
+import tempfile
+import time
+
+# Ensure the root directory is in the path when run from elsewhere
+sys.path.append(os.path.dirname(__file__))
+
+import numpy as np
+import pandas as pd
+
+from anomaly_detector import AgricultureAnomalyDetector
+from arrival_monitor import ArrivalChangePointDetector
+from blockchain_engine import AgricultureBlockchain
+from profit_aggregates import FarmerProfitAggregates
+from profit_analyzer import FarmerProfitAnalyzer
+from price_statistics import PriceStatisticsStore, SlidingWindowMedian
+from reputation import propagate
+from trade_graph import TradeGraphIndex
+from trust_engine import BuyerTrustEngine
+from velocity_counters import VelocityCounters
+
+
+def _report(name, count, elapsed, unit):
+    print(f"{name:<32}: {count:>10,} {unit} in {elapsed:7.3f}s -> {count / elapsed:>12,.0f} {unit}/s")
+
+
+def bench_bulk_integrity(n_orders=100_000, tamper_every=1000):
+    """Nightly tamper sweep: recompute canonical SHA-256 for n orders."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = AgricultureBlockchain(storage_path=os.path.join(tmp_dir, 'trade_ledger.json'))
+        orders = []
+        for i in range(n_orders):
+            order = {
+                'farmer_id': f"FARMER_{i % 5000:05d}",
+                'buyer_id': f"BUYER_{i % 700:04d}",
+                'crop_type': "Onion",
+                'quantity': 10 + i % 90,
+                'agreed_price': 1800 + i % 400,
+                'order_id': f"ORD-{i:08d}"
+            }
+            order['stored_hash'] = AgricultureBlockchain.integrity_hash(
+                order['farmer_id'], order['buyer_id'], order['crop_type'],
+                order['quantity'], order['agreed_price'], order['order_id']
+            )
+            if i % tamper_every == 0:
+                order['agreed_price'] += 1
+            orders.append(order)
+
+        started = time.perf_counter()
+        summary = ledger.verify_integrity_bulk(orders)
+        elapsed = time.perf_counter() - started
+
+        assert summary['tampered'] == len(range(0, n_orders, tamper_every))
+        _report("bulk integrity verification", n_orders, elapsed, "orders")
+
+
+def bench_block_sealing(n_blocks=2000, n_pow_blocks=20):
+    """Per-block sealing latency: Proof-of-Authority signing vs PoW mining."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for consensus, count in (('poa', n_blocks), ('pow', n_pow_blocks)):
+            ledger = AgricultureBlockchain(
+                storage_path=os.path.join(tmp_dir, f'{consensus}_ledger.json'),
+                consensus=consensus, seal_key='benchmark-seal-key'
+            )
+            started = time.perf_counter()
+            with ledger.batch():  # isolate sealing from the file write
+                for i in range(count):
+                    ledger.add_transaction("FARMER_001", "BUYER_001", "Onion", 10, 2000, f"ORD-{i}")
+                    ledger._seal_pending()
+            elapsed = time.perf_counter() - started
+            assert ledger.verify_chain()
+            _report(f"{consensus} block sealing", count, elapsed, "blocks")
+            print(f"{'':<32}  {elapsed / count * 1000:.3f} ms per sealed block")
+
+
+def bench_price_backfill(n_points=2_000_000, n_series=5000, n_streamed=200_000, window=60):
+    """Historical arrival-report backfill into per-series Welford/EWMA + median/MAD state."""
+    rng = np.random.default_rng(7)
+    series = rng.integers(0, n_series, n_points)
+    # Heavy-tailed prices: lognormal body with occasional Pareto spikes
+    prices = rng.lognormal(7.5, 0.25, n_points) * np.where(rng.random(n_points) < 0.01, 1 + rng.pareto(1.5, n_points), 1)
+    df = pd.DataFrame({
+        'Market': np.char.add('MARKET_', (series % 250).astype(str)),
+        'Commodity': np.char.add('CROP_', (series // 250).astype(str)),
+        'Variety': 'Other',
+        'Modal Price': prices.round(0),
+        'Arrival Date': pd.Timestamp('2020-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 2000, n_points)), unit='D')
+    })
+
+    store = PriceStatisticsStore(robust_window=window)
+    started = time.perf_counter()
+    store.ingest_market_data(df)
+    elapsed = time.perf_counter() - started
+    assert len(store.series) == n_series
+    _report("price history backfill", n_points, elapsed, "points")
+
+    sliding = SlidingWindowMedian(window)
+    started = time.perf_counter()
+    for price in prices[:n_streamed].tolist():
+        sliding.add(price)
+    elapsed = time.perf_counter() - started
+    _report(f"sliding window updates (w={window})", n_streamed, elapsed, "points")
+
+    n_queries = n_streamed // 10
+    started = time.perf_counter()
+    for _ in range(n_queries):
+        sliding.median()
+        sliding.mad()
+    elapsed = time.perf_counter() - started
+    _report("median + MAD queries", n_queries, elapsed, "queries")
+
+
+def bench_batch_audit(n_transactions=1_000_000, n_users=50_000, n_series=2000):
+    """Nightly marketplace sweep through the vectorized batch audit."""
+    rng = np.random.default_rng(11)
+    store = PriceStatisticsStore()
+    for s in range(n_series):
+        for price in rng.lognormal(7.5, 0.1, 30):
+            store.update(f"MARKET_{s % 100}", f"CROP_{s // 100}", "Other", price)
+    detector = AgricultureAnomalyDetector(price_stats=store, price_mode="robust")
+
+    series = rng.integers(0, n_series, n_transactions)
+    transactions = {
+        'id': np.char.add('TX-', np.arange(n_transactions).astype(str)),
+        'user_id': np.char.add('USER_', rng.integers(0, n_users, n_transactions).astype(str)),
+        'price': rng.lognormal(7.5, 0.2, n_transactions),
+        'market': np.char.add('MARKET_', (series % 100).astype(str)),
+        'commodity': np.char.add('CROP_', (series // 100).astype(str)),
+        'variety': 'Other',
+    }
+    total_deals = rng.integers(0, 40, n_users)
+    users = {
+        'id': np.char.add('USER_', np.arange(n_users).astype(str)),
+        'total_deals': total_deals,
+        'cancelled_deals': (total_deals * rng.beta(1, 6, n_users)).astype(int),
+        'failed_payments': rng.poisson(0.3, n_users),
+        'recent_deal_frequency': rng.exponential(2, n_users),
+        'average_deal_value': rng.lognormal(11, 0.8, n_users),
+    }
+
+    started = time.perf_counter()
+    result = detector.audit_batch(transactions, users)
+    elapsed = time.perf_counter() - started
+    assert result['total'] == n_transactions
+    _report("batch transaction audit", n_transactions, elapsed, "transactions")
+    print(f"{'':<32}  {result['flagged_count']:,} flagged, {result['price_anomalies']:,} price anomalies")
+
+
+def bench_velocity_counters(n_users=1_000_000, n_events=2_000_000, n_lookups=200_000):
+    """Deal/cancellation events for a million users, then a bulk behaviour read."""
+    rng = np.random.default_rng(11)
+    counters = VelocityCounters()
+    users = rng.integers(0, n_users, n_events)
+    kinds = rng.choice(['deal', 'deal', 'deal', 'cancellation', 'failed_payment'], n_events)
+    start = time.time() - 7 * 86400
+    stamps = start + np.sort(rng.uniform(0, 7 * 86400, n_events))
+
+    started = time.perf_counter()
+    for user, kind, now in zip(users.tolist(), kinds.tolist(), stamps.tolist()):
+        counters.record(user, kind, now)
+    _report("velocity event recording", n_events, time.perf_counter() - started, "events")
+
+    counter_bytes = counters._totals.nbytes + sum(a.nbytes for a in counters._rings.values()) \
+        + sum(a.nbytes for a in counters._epochs.values())
+    print(f"{'':<32}  {len(counters):,} users, {counter_bytes / counters.capacity:.0f} bytes/user of counters")
+
+    lookup = rng.integers(0, n_users, n_lookups).astype(str)
+    started = time.perf_counter()
+    known, _ = counters.behavior_columns(lookup)
+    _report("velocity bulk behaviour read", n_lookups, time.perf_counter() - started, "users")
+    assert known.any()
+
+
+def bench_arrival_replay(n_series=5000, n_days=365):
+    """Replays a year of daily arrivals for every market/commodity series."""
+    rng = np.random.default_rng(13)
+    series = np.repeat(np.arange(n_series), n_days)
+    base = rng.uniform(5, 500, n_series)[series]
+    # A third of the series take a supply shock halfway through the year
+    shocked = (rng.random(n_series) < 0.33)[series] & (np.tile(np.arange(n_days), n_series) >= n_days // 2)
+    quantity = base * rng.lognormal(0, 0.2, len(series)) * np.where(shocked, 0.4, 1.0)
+    df = pd.DataFrame({
+        'Market': np.char.add('Market ', (series % 250).astype(str)),
+        'Commodity': np.char.add('Crop ', series.astype(str)),
+        'Arrival Quantity': quantity,
+        'Arrival Date': np.tile(pd.date_range('2025-01-01', periods=n_days).to_numpy(), n_series),
+    })
+
+    detector = ArrivalChangePointDetector()
+    started = time.perf_counter()
+    events = detector.replay(df)
+    _report("arrival change-point replay", len(df), time.perf_counter() - started, "arrivals")
+    print(f"{'':<32}  {len(detector.series):,} series, {len(events):,} change points")
+
+
+def bench_trade_graph(n_trades=1_000_000, n_farmers=50_000, n_buyers=5_000, n_rings=200):
+    """Streams trades into the wash-trading graph, with planted 3-party rings."""
+    rng = np.random.default_rng(17)
+    farmers = np.char.add('FARMER_', rng.integers(0, n_farmers, n_trades).astype(str))
+    # Skewed buyer popularity: a few large buyers see most trades (high-degree nodes)
+    buyers = np.char.add('BUYER_', np.minimum(rng.zipf(1.5, n_trades), n_buyers).astype(str))
+    stamps = time.time() + np.arange(n_trades) * 0.5
+    trades = list(zip(farmers.tolist(), buyers.tolist(), stamps.tolist()))
+    for ring in range(n_rings):
+        members = [f"RING_{ring}_{k}" for k in range(3)]
+        at = int(rng.integers(0, n_trades - 3))
+        trades[at:at] = [(members[k], members[(k + 1) % 3], stamps[at]) for k in range(3)]
+
+    graph = TradeGraphIndex()
+    started = time.perf_counter()
+    cycles = 0
+    for farmer_id, buyer_id, stamp in trades:
+        for finding in graph.add_trade(farmer_id, buyer_id, 1800.0, stamp):
+            cycles += finding['pattern'] == 'SHORT_CYCLE'
+    _report("trade graph incremental index", len(trades), time.perf_counter() - started, "trades")
+    print(f"{'':<32}  {len(graph):,} users, {graph.edge_count:,} pairs, {cycles:,} cycle findings")
+    assert cycles >= n_rings
+
+
+def bench_buyer_trust(n_buyers=1_000_000, top_k=100):
+    """Trust ranking over every active buyer: full scoring, then top-k and bottom-k."""
+    rng = np.random.default_rng(19)
+    total_deals = rng.integers(0, 200, n_buyers)
+    payments = (total_deals * rng.uniform(0.5, 1.0, n_buyers)).astype(int)
+    failed = rng.binomial(payments, 0.02)
+    delayed = rng.binomial(payments - failed, 0.1)
+    buyers = {
+        'buyer_id': np.char.add('BUYER_', np.arange(n_buyers).astype(str)),
+        'total_deals': total_deals,
+        'completed_deals': rng.binomial(total_deals, 0.93),
+        'on_time_payments': payments - failed - delayed,
+        'delayed_payments': delayed,
+        'failed_payments': failed,
+        'disputes_raised_by_farmers': rng.poisson(0.4, n_buyers),
+        'years_on_platform': rng.exponential(1.5, n_buyers).round(1),
+    }
+    engine = BuyerTrustEngine()
+
+    started = time.perf_counter()
+    scores = engine.score_columns(buyers)
+    _report("buyer trust scoring (columns)", n_buyers, time.perf_counter() - started, "buyers")
+
+    started = time.perf_counter()
+    result = engine.score_buyers_bulk(buyers)
+    _report("buyer trust scoring (all rows)", n_buyers, time.perf_counter() - started, "buyers")
+    print(f"{'':<32}  {result['rank_counts']}")
+
+    for lowest in (False, True):
+        started = time.perf_counter()
+        selected = engine.score_buyers_bulk(buyers, top_k=top_k, lowest=lowest)['buyers']
+        _report(f"buyer trust {'bottom' if lowest else 'top'}-{top_k}", n_buyers, time.perf_counter() - started, "buyers")
+        assert len(selected) == top_k
+    assert selected[0]['score'] == round(float(scores['score'].min()), 1)
+
+
+def bench_reputation(n_farmers=900_000, n_buyers=100_000, n_edges=5_000_000, n_new=50_000):
+    """Personalized PageRank over a million-node trade graph: cold solve, then a warm-started update."""
+    rng = np.random.default_rng(23)
+    n_nodes = n_farmers + n_buyers
+    src = rng.integers(0, n_farmers, n_edges)
+    # Skewed buyer popularity, as in the trade graph benchmark
+    dst = n_farmers + np.minimum(rng.zipf(1.3, n_edges), n_buyers) - 1
+    counts = rng.integers(1, 5, n_edges)
+    prior = rng.uniform(0, 1, n_nodes)
+
+    started = time.perf_counter()
+    scores, iterations = propagate(n_nodes, src, dst, counts, prior)
+    _report("reputation cold solve", n_edges, time.perf_counter() - started, "edges")
+    print(f"{'':<32}  {n_nodes:,} nodes, {iterations} iterations")
+
+    src = np.concatenate([src, rng.integers(0, n_farmers, n_new)])
+    dst = np.concatenate([dst, n_farmers + rng.integers(0, n_buyers, n_new)])
+    counts = np.concatenate([counts, np.ones(n_new, dtype=counts.dtype)])
+    started = time.perf_counter()
+    warm, warm_iterations = propagate(n_nodes, src, dst, counts, prior, start=scores)
+    _report("reputation warm-started update", len(src), time.perf_counter() - started, "edges")
+    print(f"{'':<32}  +{n_new:,} trades, {warm_iterations} iterations")
+    assert warm_iterations < iterations
+
+
+def bench_profit_dashboard(n_transactions=1_000_000, n_days=3 * 365):
+    """Profit dashboard for a cooperative with three years of transactions."""
+    rng = np.random.default_rng(29)
+    crops = np.array(['Onion', 'Potato', 'Tomato', 'Wheat', 'Cotton', 'Garlic', 'Cumin', 'Groundnut'])
+    quantity = rng.uniform(5, 150, n_transactions).round(1)
+    price = rng.lognormal(7.4, 0.4, n_transactions).round(0)
+    df = pd.DataFrame({
+        'Date': (pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, n_days, n_transactions), unit='D'))
+        .strftime('%Y-%m-%d'),
+        'Crop': crops[rng.integers(0, len(crops), n_transactions)],
+        'Quantity_Quintals': quantity,
+        'Price_Per_Quintal': price,
+        'Total_Revenue': quantity * price,
+    })
+
+    started = time.perf_counter()
+    dashboard = FarmerProfitAnalyzer(df).generate_dashboard()
+    _report("profit dashboard generation", n_transactions, time.perf_counter() - started, "transactions")
+    assert set(dashboard['optimal_selling_windows']) == set(crops)
+
+
+def bench_profit_aggregates(n_trades=500_000, n_farmers=10_000, n_reads=20_000):
+    """Sealed trades folded into per-farmer aggregates, then dashboards served from them."""
+    rng = np.random.default_rng(31)
+    crops = np.array(['Onion', 'Potato', 'Tomato', 'Wheat', 'Cotton', 'Garlic', 'Cumin', 'Groundnut'])
+    records = [
+        {'farmer_id': f"FARMER_{farmer}", 'crop': crop, 'quantity': f"{quantity} Quintals",
+         'price': f"Rs.{price}", 'timestamp': stamp}
+        for farmer, crop, quantity, price, stamp in zip(
+            rng.integers(0, n_farmers, n_trades).tolist(),
+            crops[rng.integers(0, len(crops), n_trades)].tolist(),
+            rng.integers(5, 150, n_trades).tolist(),
+            rng.integers(800, 4000, n_trades).tolist(),
+            (time.time() - rng.uniform(0, 3 * 365 * 86400, n_trades)).tolist(),
+        )
+    ]
+    aggregates = FarmerProfitAggregates()
+    started = time.perf_counter()
+    for record in records:
+        aggregates._on_trade(record)
+    _report("profit aggregate updates", n_trades, time.perf_counter() - started, "trades")
+
+    farmers = [f"FARMER_{farmer}" for farmer in rng.integers(0, n_farmers, n_reads).tolist()]
+    started = time.perf_counter()
+    for farmer_id in farmers:
+        aggregates.generate_dashboard(farmer_id)
+    _report("dashboards from aggregates", n_reads, time.perf_counter() - started, "dashboards")
+
+
+BENCHMARKS = {
+    'bulk_integrity': bench_bulk_integrity,
+    'block_sealing': bench_block_sealing,
+    'price_backfill': bench_price_backfill,
+    'batch_audit': bench_batch_audit,
+    'velocity_counters': bench_velocity_counters,
+    'arrival_replay': bench_arrival_replay,
+    'trade_graph': bench_trade_graph,
+    'buyer_trust': bench_buyer_trust,
+    'reputation': bench_reputation,
+    'profit_dashboard': bench_profit_dashboard,
+    'profit_aggregates': bench_profit_aggregates,
+}
+
+
+if __name__ == "__main__":
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    print("\n--- AGROLINK ML SERVICE BENCHMARKS ---")
+    for name in selected:
+        BENCHMARKS[name]()
@@ -1,43 +1,325 @@
 import hashlib
+import hmac
 import json
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor
+from json.encoder import encode_basestring_ascii
 from time import time
 import os
+import uuid
+import zlib
+from contextlib import contextmanager
+
+from contract_store import EscrowContractStore
+from ledger_archive import LedgerArchive
+from merkle_tree import MERKLE_VERSION, hash_transaction, merkle_root, merkle_proof, verify_merkle_proof
+
+logger = logging.getLogger(__name__)
+
+class IdempotencyConflictError(Exception):
+    """Raised when an order id or idempotency key is reused for a different trade."""
+
 
 class AgricultureBlockchain:
     """
     A lightweight, private permissioned blockchain ledger for AgroLink.
     Ensures immutability of trade records for transparency and trust.
     """
-    def __init__(self, storage_path='models/trade_ledger.json'):
+    CONSENSUS_MODES = ('pow', 'poa')
+    # Crop prefixes of records the ledger writes itself; client trades cannot use them
+    INTEGRITY_PREFIX = 'INTEGRITY_SEAL:'
+    LIFECYCLE_PREFIXES = ('DISPATCHED:', 'RELEASED:', 'EXPIRED:', 'AUTO_RELEASED:')
+    ESCROW_TIMEOUT_PREFIXES = ('EXPIRED:', 'AUTO_RELEASED:')
+    EVENTS = ('trade_sealed', 'contract_initiated', 'contract_dispatched', 'contract_released',
+              'contract_expired', 'contract_auto_released')
+
+    def __init__(self, storage_path='models/trade_ledger.json', segment_size=500,
+                 keep_tail=50, snapshot_interval=100, consensus='pow', seal_key=None,
+                 trusted_seal_keys=None):
+        """
+        Args:
+            storage_path (str): Hot tail file; archive and snapshot live next to it
+            segment_size (int): Blocks per compressed archive segment
+            keep_tail (int): Recent blocks always kept uncompressed in memory (at least 1, the tip)
+            snapshot_interval (int): New blocks between periodic snapshots
+            consensus (str): 'pow' (hash puzzle) or 'poa' (HMAC-signed by the service key)
+            seal_key (str): Service key used to sign blocks in 'poa' mode
+            trusted_seal_keys (list): Retired keys still accepted when verifying
+        """
+        if consensus not in self.CONSENSUS_MODES:
+            raise ValueError(f"Unknown consensus mode: {consensus}")
+        if consensus == 'poa' and not seal_key:
+            raise ValueError("Proof-of-Authority sealing requires a seal_key")
+        if keep_tail < 1 or segment_size < 1:
+            raise ValueError("keep_tail and segment_size must be at least 1 (the chain tip stays in memory)")
+        self.consensus = consensus
+        self.seal_key = seal_key.encode() if isinstance(seal_key, str) else seal_key
+        self.sealer_id = self.key_id(self.seal_key) if self.seal_key else None
+        self._verification_keys = {}
+        for key in [seal_key] + list(trusted_seal_keys or []):
+            if key:
+                key = key.encode() if isinstance(key, str) else key
+                self._verification_keys[self.key_id(key)] = key
         self.storage_path = storage_path
-        self.contract_storage = storage_path.replace('.json', '_contracts.json')
-        self.chain = []
+        self.contract_storage = storage_path.replace('.json', '_contracts.db')
+        self.segment_size = segment_size
+        self.keep_tail = keep_tail
+        self.snapshot_interval = snapshot_interval
+        self.archive = LedgerArchive(
+            storage_path.replace('.json', '_archive'),
+            storage_path.replace('.json', '_snapshot.json')
+        )
+        self.chain = []  # Hot tail only; older blocks are read lazily from the archive
+        self.archived_height = 0
+        self.archived_tip = None  # {'index', 'hash', 'proof'} of the newest archived block
+        self.verified_height = 0
+        self.snapshot_height = 0
+        self.consensus_history = []  # [[first block index, mode]], each in force from that block on
+        self._first_poa = None       # Lowest PoA-sealed block index seen while indexing
         self.pending_transactions = []
-        self.contracts = {} # Smart Contract Escrow state
+        self._pending_seals = []  # Receipts waiting for the next mined block
+        self._pending_keys = {}   # Idempotency key -> receipt for not-yet-sealed trades
+        self.transactions_sealed = 0  # Trades recorded by this process (idempotent retries excluded)
+        self.order_index = {}     # Idempotency key -> (block_index, tx_index) of sealed trades
+        self._batching = False
+        self._dirty = False
+        self._subscribers = {}    # Event type -> callbacks, run on the writing thread
+        self._pending_events = []  # (event type, data) held back until their mutation is saved
+        # Smart Contract Escrow state (legacy JSON dumps are migrated on first start)
+        self.contracts = EscrowContractStore(
+            self.contract_storage,
+            legacy_json_path=storage_path.replace('.json', '_contracts.json')
+        )
         
         # Load existing chain or create Genesis Block
         if os.path.exists(self.storage_path):
-            self._load_chain()
+            switched = self._load_chain()
         else:
             self.create_block(previous_hash='0', proof=100)
-            
-        # Load existing contracts
-        if os.path.exists(self.contract_storage):
-            with open(self.contract_storage, 'r') as f:
-                self.contracts = json.load(f)
+            switched = self._record_consensus(None)
+        if switched:
+            self.write_snapshot()
 
     def _load_chain(self):
+        """
+        Fast startup: restore the latest snapshot, then replay only the hot tail.
+        """
+        snapshot = self.archive.load_snapshot()
+        history = snapshot.get('consensus_history') if snapshot else None
+        if snapshot:
+            self.archived_height = snapshot['archived_height']
+            self.archived_tip = snapshot['archived_tip']
+            self.verified_height = snapshot['verified_height']
+            self.snapshot_height = snapshot['height']
+        else:
+            # Lost snapshot: fall back to the archive itself (left unverified until verify_chain)
+            self.archived_height = self.archive.contiguous_height()
+            if self.archived_height:
+                last = self.archive.read_block(self.archived_height)
+                self.archived_tip = {'index': last['index'], 'hash': self.hash(last), 'proof': last['proof']}
+        self.archive.retain_up_to(self.archived_height)
+        self._restore_order_index()
+
         try:
             with open(self.storage_path, 'r') as f:
-                self.chain = json.load(f)
+                tail = json.load(f)
         except:
+            tail = []
+        # A crash between snapshot and tail write can leave already-archived blocks behind
+        self.chain = [block for block in tail if block['index'] > self.archived_height]
+        if not self.chain and not self.archived_height:
             self.create_block(previous_hash='0', proof=100)
+            return self._record_consensus(history)
+        for block in self.chain:
+            self._index_block(block)
+
+        switched = self._record_consensus(history)
+        self.verified_height = self._replay_tail()
+        self._maybe_compact()
+        return switched
+
+    def _record_consensus(self, history):
+        """
+        Restores which consensus mode each block height was sealed under and
+        records a switch to the configured mode from the next block on.
+        Returns True when a switch was recorded (and must be persisted).
+
+        Ledgers without a recorded history (older snapshots, lost snapshot)
+        derive it from the lowest PoA block found, or from a PoA-sealed
+        archived tip, which bounds where the switch happened.
+        """
+        if history is None:
+            history = []
+            first_poa = self._first_poa
+            if self.archived_height:
+                tip = self.archive.read_block(self.archived_height)
+                if tip is not None and tip.get('consensus') == 'poa':
+                    first_poa = min(first_poa or tip['index'], tip['index'])
+            if first_poa is not None:
+                history.append([first_poa, 'poa'])
+        self.consensus_history = [list(entry) for entry in history]
+        current = self.consensus_history[-1][1] if self.consensus_history else 'pow'
+        if current == self.consensus:
+            return False
+        self.consensus_history.append([self.height + 1, self.consensus])
+        return True
+
+    def consensus_at(self, block_index):
+        """Consensus mode in force when the block at `block_index` was sealed."""
+        mode = 'pow'
+        for start, entry_mode in self.consensus_history:
+            if start > block_index:
+                break
+            mode = entry_mode
+        return mode
+
+    def _restore_order_index(self):
+        """
+        Loads the idempotency index for archived blocks from the segments'
+        sidecars, rebuilding (and writing) the sidecar of any segment that
+        lacks one, e.g. archives that predate them.
+        """
+        for start, end, path in list(self.archive.segments):
+            entries = self.archive.read_segment_index(path)
+            if entries is None:
+                blocks = list(self.archive.iter_blocks(start, end))
+                entries = self._segment_index(blocks)
+                self.archive.write_segment_index(path, entries)
+            for key, position in entries.items():
+                self.order_index.setdefault(key, tuple(position))
+
+    @classmethod
+    def _idempotency_key(cls, crop, order_id, idempotency_key=None):
+        # Each operation has its own namespace: trade seals, integrity seals and the
+        # escrow timeouts the ledger seals itself never share keys, and client-chosen
+        # keys cannot collide with derived ones
+        crop = str(crop)
+        if crop.startswith(cls.INTEGRITY_PREFIX):
+            kind = 'integrity'
+        elif crop.startswith(cls.ESCROW_TIMEOUT_PREFIXES):
+            kind = 'escrow'
+        else:
+            kind = 'trade'
+        if idempotency_key:
+            return f"{kind}:key:{idempotency_key}"
+        if order_id is None:
+            return None
+        return f"{kind}:order:{order_id}"
+
+    def _tx_key(self, tx):
+        return self._idempotency_key(tx.get('crop', ''), tx.get('order_id'), tx.get('idempotency_key'))
+
+    def _segment_index(self, blocks):
+        index = {}
+        for block in blocks:
+            for tx_index, tx in enumerate(block['transactions']):
+                key = self._tx_key(tx)
+                if key is not None:
+                    index.setdefault(key, [block['index'], tx_index])
+        return index
+
+    def _index_block(self, block):
+        if block.get('consensus') == 'poa' and (self._first_poa is None or block['index'] < self._first_poa):
+            self._first_poa = block['index']
+        for tx_index, tx in enumerate(block['transactions']):
+            key = self._tx_key(tx)
+            if key is not None:
+                self.order_index.setdefault(key, (block['index'], tx_index))
+
+    def _replay_tail(self):
+        """
+        Verifies tail blocks above the snapshot's verified height.
+        Returns the highest index up to which the chain is known to be valid.
+        """
+        verified = min(self.verified_height, self.height)
+        previous = self.archived_tip
+        for block in self.chain:
+            if block['index'] == verified + 1:
+                if previous is not None and not self._valid_link(previous['hash'], previous['proof'], block):
+                    break
+                verified = block['index']
+            previous = {'index': block['index'], 'hash': self.hash(block), 'proof': block['proof']}
+        return verified
 
     def _save_chain(self):
-        with open(self.storage_path, 'w') as f:
+        self._maybe_compact()
+        tmp_path = self.storage_path + '.tmp'
+        with open(tmp_path, 'w') as f:
             json.dump(self.chain, f, indent=4)
-        with open(self.contract_storage, 'w') as f:
-            json.dump(self.contracts, f, indent=4)
+        os.replace(tmp_path, self.storage_path)
+        if self.height - self.snapshot_height >= self.snapshot_interval:
+            self.write_snapshot()
+
+    # --- SNAPSHOTS & COMPACTION ---
+
+    def _maybe_compact(self):
+        """
+        Moves full segments of old blocks out of the hot tail into the archive.
+        """
+        compacted = False
+        while len(self.chain) >= self.segment_size + self.keep_tail:
+            segment = self.chain[:self.segment_size]
+            self.archive.write_segment(segment, self._segment_index(segment))
+            last = segment[-1]
+            self.archived_tip = {'index': last['index'], 'hash': self.hash(last), 'proof': last['proof']}
+            self.archived_height = last['index']
+            self.chain = self.chain[self.segment_size:]
+            compacted = True
+        if compacted:
+            self.write_snapshot()
+
+    def write_snapshot(self):
+        """
+        Persists the chain tip, archive index, verified height and a
+        checkpoint of the escrow contract store for fast restarts. The
+        idempotency index is not part of it: archived entries live in the
+        segments' sidecars, so a snapshot costs the same however many
+        orders the ledger holds.
+        """
+        snapshot = {
+            'height': self.height,
+            'tip_hash': self.hash(self.last_block),
+            'archived_height': self.archived_height,
+            'archived_tip': self.archived_tip,
+            'verified_height': self.verified_height,
+            'consensus_history': self.consensus_history,
+            'segments': [
+                {'start': start, 'end': end, 'file': os.path.basename(path)}
+                for start, end, path in self.archive.segments
+            ],
+            'contracts': self.contracts.checkpoint(),
+            'created_at': time()
+        }
+        self.archive.write_snapshot(snapshot)
+        self.snapshot_height = snapshot['height']
+        return snapshot
+
+    def _persist(self):
+        # Inside a batch the write is deferred to a single save on exit; a failed
+        # save leaves the ledger dirty so the next write retries it
+        self._dirty = True
+        if not self._batching:
+            self._save_chain()
+            self._dirty = False
+
+    @contextmanager
+    def batch(self):
+        """
+        Groups several mutations into one sealed block and one persisted write.
+        Only the single ledger writer thread (see ledger_writer.py) should use this.
+        """
+        self._batching = True
+        try:
+            yield self
+        finally:
+            self._batching = False
+            if self._pending_seals:
+                self._seal_pending()
+            if self._dirty:
+                self._save_chain()
+                self._dirty = False
+            self._deliver_events()
 
     # --- SMART CONTRACT (ESCROW) LOGIC ---
     
@@ -45,8 +327,9 @@ class AgricultureBlockchain:
         """
         Creates a new Smart Contract in LOCK state (Payment simulation).
         """
-        contract_id = f"SC-{int(time())}-{farmer_id[:4]}"
-        self.contracts[contract_id] = {
+        # Random suffix keeps IDs unique when one farmer opens several contracts per second
+        contract_id = f"SC-{int(time())}-{farmer_id[:4]}-{uuid.uuid4().hex[:6]}"
+        contract = self.contracts.create({
             'id': contract_id,
             'farmer_id': farmer_id,
             'buyer_id': buyer_id,
@@ -57,28 +340,30 @@ class AgricultureBlockchain:
             'created_at': time(),
             'delivered_at': None,
             'released_at': None
-        }
-        self._save_chain()
-        # Log to blockchain as an event
-        self.add_transaction(farmer_id, buyer_id, crop, quantity, price)
-        return self.contracts[contract_id]
+        })
+        # Log to blockchain as an event; the contract id doubles as its order id so
+        # consumers can tell this row and the contract_initiated event are one order
+        self.add_transaction(farmer_id, buyer_id, crop, quantity, price, order_id=contract_id)
+        self._emit('contract_initiated', contract)
+        self._settle()
+        return contract
 
     def mark_as_dispatched(self, contract_id):
         """
         Farmer marks as dispatched -> Transitions from LOCKED to DISPATCHED.
         """
-        if contract_id not in self.contracts:
+        applied, contract = self.contracts.transition(
+            contract_id, 'PAYMENT_LOCKED', 'DISPATCHED', dispatched_at=time()
+        )
+        if contract is None:
             return None, "Contract Not Found"
-            
-        contract = self.contracts[contract_id]
-        if contract['status'] != 'PAYMENT_LOCKED':
+        if not applied:
             return None, f"Cannot dispatch. Current Status: {contract['status']}"
 
-        contract['status'] = 'DISPATCHED'
-        self._save_chain()
-        
         # Log event
         self.add_transaction(contract['farmer_id'], contract['buyer_id'], f"DISPATCHED: {contract['crop']}", 0, 0)
+        self._emit('contract_dispatched', contract)
+        self._settle()
         return contract, None
 
     def confirm_delivery(self, contract_id):
@@ -86,20 +371,17 @@ class AgricultureBlockchain:
         Buyer confirms delivery -> Reverses Escrow LOCK and RELEASES payment.
         Must be in DISPATCHED state.
         """
-        if contract_id not in self.contracts:
+        # Automate Release Logic
+        now = time()
+        applied, contract = self.contracts.transition(
+            contract_id, 'DISPATCHED', 'PAYMENT_RELEASED',
+            delivered_at=now, released_at=now
+        )
+        if contract is None:
             return None, "Contract Not Found"
-            
-        contract = self.contracts[contract_id]
-        if contract['status'] != 'DISPATCHED':
+        if not applied:
             return None, f"Cannot release payment. Delivery must be DISPATCHED first. Current Status: {contract['status']}"
 
-        # Automate Release Logic
-        contract['status'] = 'PAYMENT_RELEASED'
-        contract['delivered_at'] = time()
-        contract['released_at'] = time()
-        
-        self._save_chain()
-        
         # Log the release event as a new transaction on the chain
         self.add_transaction(
             contract['farmer_id'], 
@@ -108,26 +390,232 @@ class AgricultureBlockchain:
             0, 
             contract['price']
         )
+        self._emit('contract_released', contract)
+        self._settle()
         return contract, None
 
+    def expire_contracts(self, contract_ids):
+        """
+        Dispatch deadline missed -> LOCKED contracts become EXPIRED and the
+        buyer's locked payment is refunded. Batched: one SQLite transaction,
+        and under `batch()` all refund events are sealed into one block.
+        """
+        expired = self.contracts.transition_many(
+            contract_ids, 'PAYMENT_LOCKED', 'EXPIRED', expired_at=time()
+        )
+        for contract in expired:
+            # Parties keep their roles; the record's direction says the money goes back to the buyer
+            self._seal_trade(
+                contract['farmer_id'], contract['buyer_id'], f"EXPIRED: {contract['crop']}", 0, contract['price'],
+                order_id=contract['id'], idempotency_key=f"escrow-timeout:{contract['id']}",
+                direction='refund_to_buyer'
+            )
+            self._emit('contract_expired', contract)
+        self._settle()
+        return expired
+
+    def auto_release_contracts(self, contract_ids):
+        """
+        Buyer never confirmed within the release window -> DISPATCHED
+        contracts release payment to the farmer automatically.
+        """
+        released = self.contracts.transition_many(
+            contract_ids, 'DISPATCHED', 'PAYMENT_RELEASED', released_at=time()
+        )
+        for contract in released:
+            self._seal_trade(
+                contract['farmer_id'], contract['buyer_id'], f"AUTO_RELEASED: {contract['crop']}", 0, contract['price'],
+                order_id=contract['id'], idempotency_key=f"escrow-timeout:{contract['id']}",
+                direction='release_to_farmer'
+            )
+            self._emit('contract_auto_released', contract)
+        self._settle()
+        return released
+
     def get_contract(self, contract_id):
         return self.contracts.get(contract_id)
 
+    def list_contracts(self, farmer_id=None, buyer_id=None, status=None, limit=50, offset=0):
+        """
+        Paginated contract lookup, e.g. all PAYMENT_LOCKED contracts for a buyer.
+        """
+        return self.contracts.list_contracts(farmer_id, buyer_id, status, limit, offset)
+
+    # --- EVENTS ---
+
+    def subscribe(self, event_type, callback):
+        """
+        Registers `callback(data)` for a ledger event (see EVENTS). Trade events
+        carry the transaction record, contract events the contract. Integrity
+        seals are not trades and emit nothing.
+
+        Events are delivered only once their mutation is sealed and saved: on
+        `batch()` exit after the write, or when a mutation outside a batch
+        returns. A failed save keeps them queued until a later save succeeds.
+        Callbacks run on the thread applying the mutation (the ledger writer),
+        so they must stay cheap, e.g. counter updates.
+        """
+        if event_type not in self.EVENTS:
+            raise ValueError(f"Unknown ledger event: {event_type}")
+        self._subscribers.setdefault(event_type, []).append(callback)
+
+    def _emit(self, event_type, data):
+        if event_type in self._subscribers:
+            self._pending_events.append((event_type, data))
+
+    def _settle(self):
+        # End of a mutation outside `batch()`: anything it sealed has been saved
+        if not self._batching and not self._dirty:
+            self._deliver_events()
+
+    def _deliver_events(self):
+        events, self._pending_events = self._pending_events, []
+        for event_type, data in events:
+            for callback in self._subscribers.get(event_type, ()):
+                try:
+                    callback(data)
+                except Exception:
+                    # A failing subscriber must never abort the ledger mutation
+                    logger.exception("Ledger event subscriber failed for %s", event_type)
+
     # --- BLOCKCHAIN CORE ---
 
-    def create_block(self, proof, previous_hash):
+    def create_block(self, proof, previous_hash, signed=False):
         block = {
-            'index': len(self.chain) + 1,
+            'index': self.height + 1,
             'timestamp': time(),
             'transactions': self.pending_transactions,
+            'merkle_root': merkle_root([hash_transaction(tx) for tx in self.pending_transactions]),
+            'merkle_version': MERKLE_VERSION,
             'proof': proof,
             'previous_hash': previous_hash or self.hash(self.chain[-1]),
         }
+        if signed:
+            block['consensus'] = 'poa'
+            block['sealer'] = self.sealer_id
+            block['signature'] = self.sign_block(block, self.seal_key)
         self.pending_transactions = []
+        # Blocks sealed on top of a verified tip are valid by construction
+        if self.verified_height == block['index'] - 1:
+            self.verified_height = block['index']
         self.chain.append(block)
-        self._save_chain()
+        self._index_block(block)
+        self._persist()
         return block
 
+    def _seal_pending(self):
+        """
+        Seals the pending transactions into a block and fills waiting receipts.
+        """
+        last_block = self.last_block
+        # Receipts are filled before the write, so a failed save cannot leave
+        # them waiting to be matched against the next block
+        batching, self._batching = self._batching, True
+        try:
+            if self.consensus == 'poa':
+                block = self.create_block(0, self.hash(last_block), signed=True)
+            else:
+                proof = self.proof_of_work(last_block['proof'])
+                block = self.create_block(proof, self.hash(last_block))
+            for receipt in self._pending_seals:
+                receipt['block'] = block
+            self._pending_seals = []
+            self._pending_keys = {}
+        finally:
+            self._batching = batching
+        if not batching:
+            self._persist()
+        return block
+
+    def seal_trade(self, farmer_id, buyer_id, crop, quantity, price, order_id=None, idempotency_key=None):
+        """
+        Records a trade and seals it into a mined block.
+
+        Returns a receipt {'block', 'tx_index', 'tx_hash', 'duplicate'}. Inside
+        `batch()` the block is mined once for the whole batch and filled in on exit.
+        Retries carrying the same order_id (or idempotency key) get the original
+        receipt back without any new transaction, mining or write; reusing one
+        for a different trade raises IdempotencyConflictError.
+        """
+        if str(crop).startswith((self.INTEGRITY_PREFIX,) + self.LIFECYCLE_PREFIXES):
+            raise ValueError(f"Crop names starting with a ledger record prefix are reserved: {crop}")
+        receipt = self._seal_trade(farmer_id, buyer_id, crop, quantity, price, order_id, idempotency_key,
+                                   event='trade_sealed')
+        self._settle()
+        return receipt
+
+    def _seal_trade(self, farmer_id, buyer_id, crop, quantity, price, order_id=None, idempotency_key=None,
+                    event=None, direction=None):
+        # Escrow timeouts and integrity seals pass no `event`: timeouts emit their own
+        # contract events, integrity seals re-record an existing trade
+        key = self._idempotency_key(crop, order_id, idempotency_key)
+        if key is not None:
+            existing = self._find_sealed(key)
+            if existing is not None:
+                recorded = existing['block']['transactions'][existing['tx_index']]
+                self._check_retry(key, recorded, farmer_id, buyer_id, crop, quantity, price, order_id)
+                return existing
+            pending = self._pending_keys.get(key)
+            if pending is not None:
+                recorded = self.pending_transactions[pending['tx_index']]
+                self._check_retry(key, recorded, farmer_id, buyer_id, crop, quantity, price, order_id)
+                receipt = dict(pending, duplicate=True)
+                self._pending_seals.append(receipt)
+                return receipt
+
+        self.add_transaction(farmer_id, buyer_id, crop, quantity, price, order_id)
+        self.transactions_sealed += 1
+        if idempotency_key:
+            self.pending_transactions[-1]['idempotency_key'] = idempotency_key
+        if direction:
+            # Which way escrowed money moves, for records that are not a plain sale
+            self.pending_transactions[-1]['direction'] = direction
+        if event:
+            self._emit(event, self.pending_transactions[-1])
+        receipt = {
+            'block': None,
+            'tx_index': len(self.pending_transactions) - 1,
+            'tx_hash': hash_transaction(self.pending_transactions[-1]),
+            'duplicate': False
+        }
+        self._pending_seals.append(receipt)
+        if key is not None:
+            self._pending_keys[key] = receipt
+        if not self._batching:
+            self._seal_pending()
+        return receipt
+
+    @staticmethod
+    def _check_retry(key, recorded, farmer_id, buyer_id, crop, quantity, price, order_id):
+        # Recorded amounts are stored as "10 Quintals" / "Rs.2000", so compare them as numbers
+        def amount(text):
+            return float(str(text).split()[0].replace('Rs.', ''))
+
+        same = (
+            (recorded.get('farmer_id'), recorded.get('buyer_id'), recorded.get('crop'), recorded.get('order_id'))
+            == (farmer_id, buyer_id, crop, order_id)
+            and amount(recorded['quantity']) == float(quantity)
+            and amount(recorded['price']) == float(price)
+        )
+        if not same:
+            raise IdempotencyConflictError(
+                f"{key.split(':', 2)[-1]!r} was already used for a different trade "
+                f"(order {recorded.get('order_id')}); use a new order id or idempotency key."
+            )
+
+    def _find_sealed(self, key):
+        position = self.order_index.get(key)
+        if position is None:
+            return None
+        block_index, tx_index = position
+        block = self.get_block(block_index)
+        return {
+            'block': block,
+            'tx_index': tx_index,
+            'tx_hash': hash_transaction(block['transactions'][tx_index]),
+            'duplicate': True
+        }
+
     def add_transaction(self, farmer_id, buyer_id, crop, quantity, price, order_id=None):
         """
         Creates a new trade record to go into the next mined Block.
@@ -144,32 +632,34 @@ class AgricultureBlockchain:
         self.pending_transactions.append(transaction)
         return self.last_block['index'] + 1
 
-    def seal_transaction_integrity(self, farmer_id, buyer_id, crop, quantity, price, order_id):
+    def seal_records(self, records):
         """
-        Core Security Module: Generates an immutable integrity hash for a trade.
+        Seals non-trade records (e.g. cross-shard anchors) into the next block.
         """
-        # 1. Create the canonical data string for hashing
-        transaction_payload = {
-            'farmer_id': str(farmer_id),
-            'buyer_id': str(buyer_id),
-            'crop': str(crop),
-            'quantity': float(quantity),
-            'price': float(price),
-            'order_id': str(order_id)
+        for record in records:
+            self.pending_transactions.append(dict(record, timestamp=time()))
+        receipt = {
+            'block': None,
+            'tx_index': len(self.pending_transactions) - 1,
+            'tx_hash': hash_transaction(self.pending_transactions[-1])
         }
+        self._pending_seals.append(receipt)
+        if not self._batching:
+            self._seal_pending()
+        return receipt
+
+    def seal_transaction_integrity(self, farmer_id, buyer_id, crop, quantity, price, order_id, idempotency_key=None):
+        """
+        Core Security Module: Generates an immutable integrity hash for a trade.
+        """
+        # 1. Hash the canonical data string
+        integrity_hash = self.integrity_hash(farmer_id, buyer_id, crop, quantity, price, order_id)
         
-        # Sort keys for consistency
-        data_string = json.dumps(transaction_payload, sort_keys=True)
-        integrity_hash = hashlib.sha256(data_string.encode()).hexdigest()
-        
-        # 2. Add as a blockchain event
-        self.add_transaction(farmer_id, buyer_id, f"INTEGRITY_SEAL: {crop}", quantity, price, order_id)
-        
-        # 3. Trigger mining for immediate immutability (in this simplified local chain)
-        last_block = self.last_block
-        proof = self.proof_of_work(last_block['proof'])
-        prev_hash = self.hash(last_block)
-        self.create_block(proof, prev_hash)
+        # 2. Add as a blockchain event and seal it for immediate immutability
+        # (a retried seal for the same order returns the same hash without re-sealing,
+        # a different payload for a sealed order raises IdempotencyConflictError)
+        self._seal_trade(farmer_id, buyer_id, f"{self.INTEGRITY_PREFIX} {crop}", quantity, price, order_id,
+                         idempotency_key)
         
         return integrity_hash
 
@@ -178,15 +668,7 @@ class AgricultureBlockchain:
         Tamper Detection Logic: Recomputes the hash and verifies against the ledger.
         """
         # 1. Recompute the hash from current database values
-        payload = {
-            'farmer_id': str(farmer_id),
-            'buyer_id': str(buyer_id),
-            'crop': str(crop),
-            'quantity': float(quantity),
-            'price': float(price),
-            'order_id': str(order_id)
-        }
-        current_hash = hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+        current_hash = self.integrity_hash(farmer_id, buyer_id, crop, quantity, price, order_id)
         
         # 2. Check match
         is_authentic = (current_hash == stored_hash)
@@ -198,10 +680,102 @@ class AgricultureBlockchain:
             'tampered_detected': not is_authentic
         }
 
+    def verify_integrity_bulk(self, orders, workers=None, chunk_size=2048, offset=0):
+        """
+        Bulk Tamper Sweep: recomputes integrity hashes for many orders in
+        parallel worker threads and reports only the mismatches.
+
+        `orders` is a list of dicts shaped like IntegrityVerifyRequest
+        (farmer_id, buyer_id, crop_type, quantity, agreed_price, order_id, stored_hash).
+        Mismatch positions start at `offset`, for uploads verified in pieces.
+        """
+        chunks = [
+            (offset + start, orders[start:start + chunk_size]) for start in range(0, len(orders), chunk_size)
+        ]
+        summary = {'total': len(orders), 'authentic': 0, 'tampered': 0, 'invalid': 0, 'mismatches': []}
+
+        with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+            for authentic, mismatches in pool.map(self._verify_integrity_chunk, chunks):
+                summary['authentic'] += authentic
+                summary['mismatches'].extend(mismatches)
+
+        for mismatch in summary['mismatches']:
+            summary['invalid' if mismatch['recomputed_hash'] is None else 'tampered'] += 1
+        return summary
+
+    def _verify_integrity_chunk(self, chunk):
+        start, orders = chunk
+        authentic = 0
+        mismatches = []
+        for position, order in enumerate(orders, start):
+            try:
+                current_hash = self.integrity_hash(
+                    order['farmer_id'], order['buyer_id'], order['crop_type'],
+                    order['quantity'], order['agreed_price'], order['order_id']
+                )
+                stored_hash = order['stored_hash']
+            except (KeyError, TypeError, ValueError) as e:
+                mismatches.append({
+                    'position': position,
+                    'order_id': str(order['order_id']) if isinstance(order, dict) and order.get('order_id') is not None else None,
+                    'stored_hash': None,
+                    'recomputed_hash': None,
+                    'error': f"Invalid order payload: {e}"
+                })
+                continue
+
+            if current_hash == stored_hash:
+                authentic += 1
+            else:
+                mismatches.append({
+                    'position': position,
+                    'order_id': str(order['order_id']),
+                    'stored_hash': stored_hash,
+                    'recomputed_hash': current_hash,
+                    'error': None
+                })
+        return authentic, mismatches
+
+    @staticmethod
+    def integrity_hash(farmer_id, buyer_id, crop, quantity, price, order_id):
+        """
+        SHA-256 over the canonical trade payload.
+
+        Byte-identical to json.dumps(payload, sort_keys=True) but built
+        directly, since this sits on the hot path of bulk tamper sweeps.
+        """
+        quantity = float(quantity)
+        price = float(price)
+        if not (math.isfinite(quantity) and math.isfinite(price)):
+            payload = {
+                'farmer_id': str(farmer_id),
+                'buyer_id': str(buyer_id),
+                'crop': str(crop),
+                'quantity': quantity,
+                'price': price,
+                'order_id': str(order_id)
+            }
+            data_string = json.dumps(payload, sort_keys=True)
+        else:
+            data_string = (
+                f'{{"buyer_id": {encode_basestring_ascii(str(buyer_id))}, '
+                f'"crop": {encode_basestring_ascii(str(crop))}, '
+                f'"farmer_id": {encode_basestring_ascii(str(farmer_id))}, '
+                f'"order_id": {encode_basestring_ascii(str(order_id))}, '
+                f'"price": {price!r}, "quantity": {quantity!r}}}'
+            )
+        return hashlib.sha256(data_string.encode()).hexdigest()
+
     @property
     def last_block(self):
         return self.chain[-1]
 
+    @property
+    def height(self):
+        """Index of the newest block (archived blocks included)."""
+        chain = self.chain
+        return chain[-1]['index'] if chain else self.archived_height
+
     def hash(self, block):
         """
         Creates a SHA-256 hash of a Block.
@@ -225,33 +799,211 @@ class AgricultureBlockchain:
         guess_hash = hashlib.sha256(guess).hexdigest()
         return guess_hash[:4] == "0000"
 
-    def verify_chain(self):
+    # --- PROOF OF AUTHORITY ---
+
+    @staticmethod
+    def key_id(key):
+        """Short public fingerprint identifying which service key sealed a block."""
+        return hashlib.sha256(b'agrolink-sealer:' + key).hexdigest()[:16]
+
+    @staticmethod
+    def _block_header(block):
+        # The Merkle root commits to the transactions, so the header is enough to sign
+        header = {
+            'index': block['index'],
+            'timestamp': block['timestamp'],
+            'merkle_root': block['merkle_root'],
+            'proof': block['proof'],
+            'previous_hash': block['previous_hash'],
+            'sealer': block['sealer']
+        }
+        if 'merkle_version' in block:
+            header['merkle_version'] = block['merkle_version']
+        return json.dumps(header, sort_keys=True).encode()
+
+    @classmethod
+    def sign_block(cls, block, key):
+        return hmac.new(key, cls._block_header(block), hashlib.sha256).hexdigest()
+
+    def valid_signature(self, block):
+        key = self._verification_keys.get(block.get('sealer'))
+        # Without a Merkle root the signed header would not commit to the transactions
+        if key is None or 'signature' not in block or 'merkle_root' not in block:
+            return False
+        return hmac.compare_digest(block['signature'], self.sign_block(block, key))
+
+    def _valid_link(self, previous_hash, previous_proof, block):
         """
-        Check if the blockchain is valid.
+        Checks one block against its predecessor's hash and proof.
         """
-        last_block = self.chain[0]
-        current_index = 1
+        if block['previous_hash'] != previous_hash:
+            return False
 
-        while current_index < len(self.chain):
-            block = self.chain[current_index]
-            # Check hash of the block
-            if block['previous_hash'] != self.hash(last_block):
+        # Check the seal: authority signature, or Proof of Work for blocks sealed
+        # before the switch to PoA. Above the switch a hash-puzzle seal proves
+        # nothing (anyone can mine one), so it is rejected.
+        if block.get('consensus') == 'poa':
+            if not self.valid_signature(block):
                 return False
+        elif self.consensus_at(block['index']) == 'poa':
+            return False
+        elif not self.valid_proof(previous_proof, block['proof']):
+            return False
 
-            # Check Proof of Work
-            if not self.valid_proof(last_block['proof'], block['proof']):
+        # Check Merkle commitment (older blocks predate the field and the versioned scheme)
+        if 'merkle_root' in block:
+            tx_hashes = [hash_transaction(tx) for tx in block['transactions']]
+            if block['merkle_root'] != merkle_root(tx_hashes, self.merkle_version(block)):
                 return False
+        return True
 
+    def verify_chain(self):
+        """
+        Check if the blockchain is valid.
+        Streams archived segments, so memory stays flat for long histories.
+        """
+        last_block = None
+        for block in self.iter_blocks():
+            if last_block is not None and not self._valid_link(self.hash(last_block), last_block['proof'], block):
+                return False
             last_block = block
-            current_index += 1
 
+        if last_block is not None:
+            # Blocks sealed meanwhile extend verified_height themselves
+            self.verified_height = max(self.verified_height, last_block['index'])
         return True
 
+    def _tail_view(self):
+        """
+        Consistent (archived height, hot tail) pair for readers running
+        alongside the writer. Compaction archives a segment before swapping
+        in a shorter tail list and the tail is otherwise only appended to,
+        so the archived height is derived from the one captured list.
+        """
+        tail = self.chain
+        return (tail[0]['index'] - 1 if tail else self.archived_height), tail
+
+    def get_block(self, block_index):
+        """
+        Returns the block at a 1-based chain index, or None.
+        Archived blocks are decompressed lazily on demand.
+        """
+        archived_height, tail = self._tail_view()
+        if archived_height < block_index <= archived_height + len(tail):
+            return tail[block_index - archived_height - 1]
+        if 1 <= block_index <= archived_height:
+            return self.archive.read_block(block_index)
+        return None
+
+    def iter_blocks(self, start=1, end=None):
+        """
+        Yields blocks in chain order from the archive, then the hot tail.
+        """
+        # One consistent view, so a concurrent compaction cannot make blocks
+        # disappear between the archive and the tail reads
+        archived_height, tail = self._tail_view()
+        tail = list(tail)
+        height = tail[-1]['index'] if tail else archived_height
+        end = height if end is None else min(end, height)
+        if start <= archived_height:
+            yield from self.archive.iter_blocks(start, min(end, archived_height))
+        for block in tail:
+            if block['index'] > archived_height and start <= block['index'] <= end:
+                yield block
+
+    def export_blocks(self, start_block=1, end_block=None, since=None, until=None, party=None):
+        """
+        Auditor export: streams blocks filtered by block range, sealing time
+        window and/or a party (farmer or buyer ID) involved in any transaction.
+        Blocks are yielded whole so their Merkle roots stay verifiable.
+        """
+        for block in self.iter_blocks(start_block, end_block):
+            if since is not None and block['timestamp'] < since:
+                continue
+            if until is not None and block['timestamp'] > until:
+                # Sealing clocks can step backwards, so a later block may still match
+                continue
+            if party is not None and not any(
+                tx.get('farmer_id') == party or tx.get('buyer_id') == party
+                for tx in block['transactions']
+            ):
+                continue
+            yield block
+
+    def export_ndjson(self, compress=False, chunk_size=64 * 1024, **filters):
+        """
+        Encodes `export_blocks` as NDJSON byte chunks, optionally gzip-compressed
+        on the fly. Only one chunk is buffered at a time.
+        """
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        buffer = []
+        buffered = 0
+        for block in self.export_blocks(**filters):
+            line = (json.dumps(block, sort_keys=True) + '\n').encode()
+            buffer.append(line)
+            buffered += len(line)
+            if buffered >= chunk_size:
+                data = b''.join(buffer)
+                buffer, buffered = [], 0
+                data = compressor.compress(data) if compressor else data
+                if data:
+                    yield data
+
+        data = b''.join(buffer)
+        if compressor:
+            data = compressor.compress(data) + compressor.flush()
+        if data:
+            yield data
+
+    def get_inclusion_proof(self, block_index, tx_index):
+        """
+        Builds a compact Merkle inclusion proof for one transaction of a block.
+        The proof can be checked with `verify_inclusion_proof` without the chain.
+        """
+        block = self.get_block(block_index)
+        if block is None:
+            return None, "Block Not Found"
+        if not 0 <= tx_index < len(block['transactions']):
+            return None, "Transaction Not Found in Block"
+
+        tx_hashes = [hash_transaction(tx) for tx in block['transactions']]
+        version = self.merkle_version(block)
+        # Blocks sealed before Merkle roots were introduced get one derived on the fly
+        root = block.get('merkle_root') or merkle_root(tx_hashes, version)
+        return {
+            'block_index': block_index,
+            'block_hash': self.hash(block),
+            'merkle_root': root,
+            'merkle_version': version,
+            'tx_index': tx_index,
+            'tx_hash': tx_hashes[tx_index],
+            'transaction': block['transactions'][tx_index],
+            'proof': merkle_proof(tx_hashes, tx_index, version)
+        }, None
+
+    @staticmethod
+    def merkle_version(block):
+        """
+        Merkle scheme a block's root was built with: blocks that carry a root
+        but no version use the legacy scheme, blocks without a root get the
+        current one derived on the fly.
+        """
+        if 'merkle_version' in block:
+            return block['merkle_version']
+        return 1 if 'merkle_root' in block else MERKLE_VERSION
+
+    @staticmethod
+    def verify_inclusion_proof(tx_hash, proof, root, version=MERKLE_VERSION):
+        """
+        Light-client check that a transaction hash is committed by a Merkle root.
+        """
+        return verify_merkle_proof(tx_hash, proof, root, version)
+
     def get_transaction_by_hash(self, tx_hash):
         """
         In this lightweight version, we verify blocks by their hash index.
         """
-        for block in self.chain:
+        for block in self.iter_blocks():
             if self.hash(block) == tx_hash:
                 return block
         return None
@@ -0,0 +1,191 @@
+import json
+import os
+import sqlite3
+import threading
+
+
+class EscrowContractStore:
+    """
+    SQLite-backed storage for Smart Contract (Escrow) state.
+    Runs in WAL mode so API readers never block the ledger writer, and
+    indexes the columns used for per-party listing queries.
+    """
+
+    COLUMNS = (
+        'id', 'farmer_id', 'buyer_id', 'crop', 'quantity', 'price',
+        'status', 'created_at', 'delivered_at', 'released_at',
+        'dispatched_at', 'expired_at'
+    )
+
+    # Columns added after the first release, back-filled as NULL on old databases
+    ADDED_COLUMNS = {'dispatched_at': 'REAL', 'expired_at': 'REAL'}
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS contracts (
+            id TEXT PRIMARY KEY,
+            farmer_id TEXT NOT NULL,
+            buyer_id TEXT NOT NULL,
+            crop TEXT NOT NULL,
+            quantity TEXT NOT NULL,
+            price REAL NOT NULL,
+            status TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            delivered_at REAL,
+            released_at REAL,
+            dispatched_at REAL,
+            expired_at REAL
+        );
+        CREATE INDEX IF NOT EXISTS idx_contracts_farmer ON contracts (farmer_id, status, created_at);
+        CREATE INDEX IF NOT EXISTS idx_contracts_buyer ON contracts (buyer_id, status, created_at);
+        CREATE INDEX IF NOT EXISTS idx_contracts_status ON contracts (status, created_at);
+        CREATE INDEX IF NOT EXISTS idx_contracts_created ON contracts (created_at);
+    """
+
+    def __init__(self, db_path='models/trade_ledger_contracts.db', legacy_json_path=None):
+        self.db_path = db_path
+        self._local = threading.local()
+
+        conn = self._connection()
+        conn.executescript(self.SCHEMA)
+        existing = {row['name'] for row in conn.execute('PRAGMA table_info(contracts)')}
+        for col, col_type in self.ADDED_COLUMNS.items():
+            if col not in existing:
+                conn.execute(f'ALTER TABLE contracts ADD COLUMN {col} {col_type}')
+        conn.commit()
+
+        if legacy_json_path and os.path.exists(legacy_json_path):
+            self._import_legacy_json(legacy_json_path)
+
+    def _connection(self):
+        # One connection per thread: WAL lets readers run alongside the writer
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _import_legacy_json(self, json_path):
+        """
+        One-time migration of the old `*_contracts.json` dump into SQLite.
+        """
+        conn = self._connection()
+        if conn.execute('SELECT 1 FROM contracts LIMIT 1').fetchone():
+            return
+        with open(json_path, 'r') as f:
+            contracts = json.load(f)
+        with conn:
+            conn.executemany(
+                f"INSERT OR IGNORE INTO contracts ({', '.join(self.COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in self.COLUMNS)})",
+                [tuple(c.get(col) for col in self.COLUMNS) for c in contracts.values()]
+            )
+        os.replace(json_path, json_path + '.migrated')
+
+    @staticmethod
+    def _to_dict(row):
+        return dict(row) if row is not None else None
+
+    def create(self, contract):
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                f"INSERT INTO contracts ({', '.join(self.COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in self.COLUMNS)})",
+                tuple(contract.get(col) for col in self.COLUMNS)
+            )
+        return contract
+
+    def get(self, contract_id):
+        row = self._connection().execute(
+            'SELECT * FROM contracts WHERE id = ?', (contract_id,)
+        ).fetchone()
+        return self._to_dict(row)
+
+    def transition(self, contract_id, from_status, to_status, **fields):
+        """
+        Atomically moves a contract between escrow states.
+
+        The UPDATE is guarded by the expected current status, so two racing
+        transitions can never both succeed. Returns (applied, contract) where
+        contract is the row after the attempt, or None if it does not exist.
+        """
+        assignments = ['status = ?'] + [f'{col} = ?' for col in fields]
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                f"UPDATE contracts SET {', '.join(assignments)} WHERE id = ? AND status = ?",
+                (to_status, *fields.values(), contract_id, from_status)
+            )
+            row = conn.execute('SELECT * FROM contracts WHERE id = ?', (contract_id,)).fetchone()
+        return cursor.rowcount == 1, self._to_dict(row)
+
+    def transition_many(self, contract_ids, from_status, to_status, **fields):
+        """
+        Batched `transition`: applies the same guarded state change to many
+        contracts in one SQLite transaction. Returns the contracts that moved.
+        """
+        assignments = ['status = ?'] + [f'{col} = ?' for col in fields]
+        conn = self._connection()
+        moved = []
+        with conn:
+            for contract_id in contract_ids:
+                cursor = conn.execute(
+                    f"UPDATE contracts SET {', '.join(assignments)} WHERE id = ? AND status = ?",
+                    (to_status, *fields.values(), contract_id, from_status)
+                )
+                if cursor.rowcount == 1:
+                    moved.append(contract_id)
+            rows = [
+                conn.execute('SELECT * FROM contracts WHERE id = ?', (contract_id,)).fetchone()
+                for contract_id in moved
+            ]
+        return [self._to_dict(r) for r in rows]
+
+    def iter_open(self, batch_size=10000):
+        """
+        Streams (id, status, created_at, dispatched_at) for every contract
+        still waiting on dispatch or delivery, used to re-arm escrow timers.
+        """
+        cursor = self._connection().execute(
+            "SELECT id, status, created_at, dispatched_at FROM contracts "
+            "WHERE status IN ('PAYMENT_LOCKED', 'DISPATCHED')"
+        )
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            for row in rows:
+                yield tuple(row)
+
+    def list_contracts(self, farmer_id=None, buyer_id=None, status=None, limit=50, offset=0):
+        """
+        Paginated listing, newest first. Filters map onto the composite
+        indexes, so only the requested page is materialized.
+        """
+        clauses, params = [], []
+        for col, value in (('farmer_id', farmer_id), ('buyer_id', buyer_id), ('status', status)):
+            if value is not None:
+                clauses.append(f'{col} = ?')
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+        conn = self._connection()
+        rows = conn.execute(
+            f'SELECT * FROM contracts {where} ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?',
+            (*params, limit, offset)
+        ).fetchall()
+        total = conn.execute(f'SELECT COUNT(*) FROM contracts {where}', params).fetchone()[0]
+        return [self._to_dict(r) for r in rows], total
+
+    def checkpoint(self):
+        """
+        Folds the WAL into the main database file and returns per-status
+        contract counts, recorded alongside ledger snapshots.
+        """
+        conn = self._connection()
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        rows = conn.execute('SELECT status, COUNT(*) FROM contracts GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
@@ -0,0 +1,232 @@
+import logging
+import math
+import threading
+from time import time
+
+from ledger_writer import LedgerBusyError, LedgerPersistError
+
+logger = logging.getLogger(__name__)
+
+
+class HierarchicalTimerWheel:
+    """
+    Hashed hierarchical timing wheel (Varghese & Lauck).
+
+    Timers live in per-level slot dicts keyed by timer id, so scheduling and
+    cancelling are O(1) no matter how many contracts are pending. Level 0
+    slots are one tick wide; each higher level covers `wheel_size` times the
+    span of the level below and is cascaded down as time reaches it. Deadlines
+    beyond the top level are parked there and re-hashed on each cascade.
+    """
+
+    def __init__(self, tick=1.0, wheel_size=256, levels=4, start=None):
+        """
+        Args:
+            tick (float): Resolution of the wheel in seconds
+            wheel_size (int): Slots per level
+            levels (int): Number of wheel levels (range = tick * wheel_size ** levels)
+            start (float): Wall-clock time of tick 0 (defaults to now)
+        """
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self.levels = levels
+        self.current = int((time() if start is None else start) / tick)
+        self.wheels = [[{} for _ in range(wheel_size)] for _ in range(levels)]
+        self._where = {}  # timer id -> (level, slot)
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def _place(self, key, deadline_tick, payload, earliest):
+        deadline_tick = max(deadline_tick, earliest)
+        delta = deadline_tick - self.current
+        level = 0
+        while level < self.levels - 1 and delta >= self.wheel_size ** (level + 1):
+            level += 1
+        slot = (deadline_tick // self.wheel_size ** level) % self.wheel_size
+        self.wheels[level][slot][key] = (deadline_tick, payload)
+        self._where[key] = (level, slot)
+
+    def schedule(self, key, deadline, payload=None):
+        """Arms (or re-arms) timer `key` to fire at wall-clock `deadline`."""
+        self.cancel(key)
+        # Past-due timers fire on the very next tick
+        self._place(key, math.ceil(deadline / self.tick), payload, self.current + 1)
+
+    def cancel(self, key):
+        """Disarms timer `key`. Returns True if it was pending."""
+        where = self._where.pop(key, None)
+        if where is None:
+            return False
+        level, slot = where
+        del self.wheels[level][slot][key]
+        return True
+
+    def _cascade(self, level):
+        slot = (self.current // self.wheel_size ** level) % self.wheel_size
+        entries = self.wheels[level][slot]
+        self.wheels[level][slot] = {}
+        for key, (deadline_tick, payload) in entries.items():
+            # Level 0 for the current tick is processed right after cascading
+            self._place(key, deadline_tick, payload, self.current)
+
+    def advance(self, now=None):
+        """
+        Moves the wheel up to `now` and returns [(key, payload)] for every
+        timer that fell due, in deadline order.
+        """
+        target = int((time() if now is None else now) / self.tick)
+        fired = []
+        while self.current < target:
+            if not self._where:
+                # Nothing armed: jump straight to the target tick
+                self.current = target
+                break
+            self.current += 1
+            for level in range(1, self.levels):
+                if self.current % self.wheel_size ** level:
+                    break
+                self._cascade(level)
+            slot = self.current % self.wheel_size
+            due = self.wheels[0][slot]
+            if due:
+                self.wheels[0][slot] = {}
+                for key, (_, payload) in due.items():
+                    del self._where[key]
+                    fired.append((key, payload))
+        return fired
+
+
+class EscrowTimeoutScheduler:
+    """
+    Drives escrow deadlines off a timer wheel:
+
+    - PAYMENT_LOCKED contracts not dispatched within `dispatch_timeout`
+      seconds expire and the buyer is refunded.
+    - DISPATCHED contracts not confirmed within `release_timeout` seconds
+      release payment to the farmer automatically.
+
+    Each tick's fired contracts are handed to the ledger writer as one
+    batched mutation, so they share a single sealed block and file write.
+    """
+
+    def __init__(self, ledger, writer, dispatch_timeout=None, release_timeout=None,
+                 tick=1.0, max_batch=1000):
+        """
+        Args:
+            ledger (AgricultureBlockchain): Engine holding the escrow contracts
+            writer (LedgerWriter): Single writer bound to `ledger`
+            dispatch_timeout (float): Seconds a LOCKED contract may wait for dispatch (None disables)
+            release_timeout (float): Seconds a DISPATCHED contract may wait for confirmation (None disables)
+            tick (float): Timer resolution in seconds
+            max_batch (int): Max contracts per ledger mutation
+        """
+        self.ledger = ledger
+        self.writer = writer
+        self.dispatch_timeout = dispatch_timeout
+        self.release_timeout = release_timeout
+        self.max_batch = max_batch
+        self.wheel = HierarchicalTimerWheel(tick=tick)
+        self._lock = threading.Lock()
+        self._retry = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _deadline(self, status, created_at, dispatched_at):
+        if status == 'PAYMENT_LOCKED' and self.dispatch_timeout:
+            return created_at + self.dispatch_timeout
+        if status == 'DISPATCHED' and self.release_timeout:
+            return (dispatched_at or created_at) + self.release_timeout
+        return None
+
+    def track(self, contract):
+        """
+        (Re-)arms the timer for a contract after it is created or dispatched,
+        and disarms it once the contract leaves the escrow-waiting states.
+        """
+        deadline = self._deadline(contract['status'], contract['created_at'], contract.get('dispatched_at'))
+        with self._lock:
+            if deadline is None:
+                self.wheel.cancel(contract['id'])
+            else:
+                self.wheel.schedule(contract['id'], deadline, contract['status'])
+
+    def load_pending(self):
+        """Re-arms timers for every open contract (e.g. after a restart)."""
+        count = 0
+        with self._lock:
+            for contract_id, status, created_at, dispatched_at in self.ledger.contracts.iter_open():
+                deadline = self._deadline(status, created_at, dispatched_at)
+                if deadline is not None:
+                    self.wheel.schedule(contract_id, deadline, status)
+                    count += 1
+        return count
+
+    def run_due(self, now=None):
+        """
+        Fires every timer due by `now` and submits the transitions to the
+        ledger writer. Returns the writer futures.
+        """
+        with self._lock:
+            fired = self._retry + self.wheel.advance(now)
+            self._retry = []
+
+        by_status = {'PAYMENT_LOCKED': [], 'DISPATCHED': []}
+        for contract_id, status in fired:
+            by_status[status].append(contract_id)
+
+        futures = []
+        for status, mutation in (('PAYMENT_LOCKED', self.ledger.expire_contracts),
+                                 ('DISPATCHED', self.ledger.auto_release_contracts)):
+            contract_ids = by_status[status]
+            for i in range(0, len(contract_ids), self.max_batch):
+                chunk = contract_ids[i:i + self.max_batch]
+                try:
+                    future = self.writer.submit(mutation, chunk)
+                except LedgerBusyError:
+                    # Writer saturated: try these again on the next tick
+                    self._requeue(chunk, status)
+                    continue
+                future.add_done_callback(lambda done, chunk=chunk, status=status: self._on_done(done, chunk, status))
+                futures.append(future)
+        return futures
+
+    def _requeue(self, contract_ids, status):
+        with self._lock:
+            self._retry.extend((contract_id, status) for contract_id in contract_ids)
+
+    def _on_done(self, future, contract_ids, status):
+        # The timers already left the wheel; a failed batch must fire them again next
+        # tick. Transitions only apply to contracts still in `status`, so a retry can
+        # never expire or release a contract twice. A batch that was applied but not
+        # yet persisted (LedgerPersistError) is written with the next ledger batch.
+        error = future.exception()
+        if error is not None and not isinstance(error, LedgerPersistError):
+            logger.warning("Escrow timeout batch failed, retrying %d contracts: %s", len(contract_ids), error)
+            self._requeue(contract_ids, status)
+
+    def start(self):
+        self.load_pending()
+        self._thread = threading.Thread(target=self._run, name="escrow-timeouts", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.wheel.tick):
+            self.run_due()
+
+    def close(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+if __name__ == '__main__':
+    wheel = HierarchicalTimerWheel(tick=1.0, wheel_size=8, levels=3, start=0)
+    for key, deadline in (('SC-A', 3), ('SC-B', 40), ('SC-C', 700), ('SC-D', 12)):
+        wheel.schedule(key, deadline, 'PAYMENT_LOCKED')
+    wheel.cancel('SC-D')
+    for now in (5, 50, 1000):
+        print(f"t={now}: fired {[key for key, _ in wheel.advance(now)]}")
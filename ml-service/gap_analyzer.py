@@ -5,7 +5,12 @@ import joblib
 from datetime import datetime, timedelta
 
 class DemandSupplyGapAnalyzer:
+    # Days a supply change point keeps overriding the arrival baseline
+    SHOCK_HORIZON_DAYS = 10
+
     def __init__(self, model_dir='models'):
+        # Latest arrival change point per (market, commodity), pushed by ArrivalChangePointDetector
+        self.supply_shocks = {}
         # We leverage the trained price model and features for trend context
         try:
             self.model = joblib.load(f'{model_dir}/price_regressor.pkl')
@@ -14,6 +19,26 @@ class DemandSupplyGapAnalyzer:
         except:
             print("Warning: Prediction models not found. Metrics will use heuristic mode.")
 
+    def on_supply_shock(self, event):
+        """Subscriber for SUPPLY_SURGE / SUPPLY_DROP arrival events."""
+        key = (str(event['market']).strip().lower(), str(event['commodity']).strip().lower())
+        self.supply_shocks[key] = event
+
+    def recent_supply_shock(self, market, crop_name, horizon_days=None):
+        """
+        Latest change point for the series if it falls within the forecast horizon.
+        A shock without a usable date cannot be placed in time and counts as stale.
+        """
+        shock = self.supply_shocks.get((str(market).strip().lower(), str(crop_name).strip().lower()))
+        if shock is None or shock['date'] is None:
+            return None
+        try:
+            shocked_on = datetime.strptime(str(shock['date'])[:10], "%Y-%m-%d")
+        except ValueError:
+            return None
+        horizon = timedelta(days=self.SHOCK_HORIZON_DAYS if horizon_days is None else horizon_days)
+        return shock if datetime.now() - shocked_on <= horizon else None
+
     def analyze_gap(self, crop_name, market, current_arrival, recent_prices, region_context=None):
         """
         Analyzes the gap between demand and supply.
@@ -33,6 +58,12 @@ class DemandSupplyGapAnalyzer:
         arrival_trend = -0.05 if np.mean(recent_prices[-3:]) > np.mean(recent_prices[:3]) else 0.05
         estimated_supply_7d = current_arrival * (1 + arrival_trend) * 7
         
+        # A recent arrival change point means today's arrival no longer reflects the
+        # demand-side baseline: use the pre-shock regime level instead
+        shock = self.recent_supply_shock(market, crop_name)
+        if shock is not None:
+            historical_avg_arrival = shock['baseline_quantity']
+        
         # 2. Demand Estimation (Synthetic Demand Indexing)
         # Demand in Ag-markets is often inversely proportional to price speed
         # If price rises while supply is stable, demand is surging
@@ -65,6 +96,8 @@ class DemandSupplyGapAnalyzer:
             risk_level = "LOW"
             color_code = "GREEN"
             insight = f"Stable {crop_name} supply-demand balance maintained in {market}."
+        if shock is not None:
+            insight += f" Supply shock on {shock['date']}: {shock['trigger_reason']}."
 
         # 5. Output Generation
         return {
@@ -80,7 +113,8 @@ class DemandSupplyGapAnalyzer:
                 "estimated_demand": f"{round(estimated_demand_7d, 2)} MT",
                 "gap_percentage": f"{round(gap_percentage, 2)}%",
                 "market_status": status,
-                "risk_index": risk_level
+                "risk_index": risk_level,
+                "supply_shock": shock['event'] if shock is not None else None
             },
             "human_readable_insight": insight,
             "academic_explanation": (
@@ -0,0 +1,177 @@
+import bisect
+import gzip
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+
+class LedgerArchive:
+    """
+    Cold storage for historical ledger blocks plus the startup snapshot.
+
+    Older blocks are compacted into immutable gzip-compressed NDJSON segments
+    named after the block range they hold, so any block can be located by a
+    binary search over segment start indexes and read lazily on demand.
+    Each segment can carry a small JSON sidecar with the ledger's
+    idempotency index entries for its blocks, written once with it.
+    The segment index and cache are shared by the ledger writer and API
+    readers, so both are only touched under `_lock`.
+    """
+
+    SEGMENT_PATTERN = re.compile(r'^segment_(\d{9})_(\d{9})\.jsonl\.gz$')
+
+    def __init__(self, archive_dir, snapshot_path, cache_segments=4):
+        """
+        Args:
+            archive_dir (str): Directory holding compressed block segments
+            snapshot_path (str): JSON file holding the latest ledger snapshot
+            cache_segments (int): Decompressed segments kept for random reads
+        """
+        self.archive_dir = archive_dir
+        self.snapshot_path = snapshot_path
+        self.cache_segments = cache_segments
+        self._lock = threading.Lock()
+        self._segment_cache = OrderedDict()
+        self.segments = []  # Sorted [(start, end, path)]
+        self._starts = []
+        if os.path.isdir(archive_dir):
+            self._discover_segments()
+
+    def _discover_segments(self):
+        found = []
+        for name in os.listdir(self.archive_dir):
+            match = self.SEGMENT_PATTERN.match(name)
+            if match:
+                found.append((int(match.group(1)), int(match.group(2)), os.path.join(self.archive_dir, name)))
+        with self._lock:
+            self.segments = sorted(found)
+            self._starts = [start for start, _, _ in self.segments]
+
+    def retain_up_to(self, height):
+        """Forgets segments past `height` (left behind by an interrupted compaction)."""
+        with self._lock:
+            self.segments = [seg for seg in self.segments if seg[1] <= height]
+            self._starts = [start for start, _, _ in self.segments]
+
+    def contiguous_height(self):
+        """Highest block index covered by segments contiguous from genesis."""
+        expected = 1
+        with self._lock:
+            segments = list(self.segments)
+        for start, end, _ in segments:
+            if start != expected:
+                break
+            expected = end + 1
+        return expected - 1
+
+    # --- SEGMENTS ---
+
+    def write_segment(self, blocks, index=None):
+        """
+        Writes a contiguous run of blocks as one compressed segment, plus
+        its idempotency index sidecar when `index` is given.
+        """
+        os.makedirs(self.archive_dir, exist_ok=True)
+        start, end = blocks[0]['index'], blocks[-1]['index']
+        path = os.path.join(self.archive_dir, f"segment_{start:09d}_{end:09d}.jsonl.gz")
+        tmp_path = path + '.tmp'
+        with gzip.open(tmp_path, 'wt', compresslevel=6) as f:
+            for block in blocks:
+                f.write(json.dumps(block, sort_keys=True))
+                f.write('\n')
+        os.replace(tmp_path, path)
+        if index is not None:
+            self.write_segment_index(path, index)
+
+        with self._lock:
+            self.segments.append((start, end, path))
+            self._starts.append(start)
+        return {'start': start, 'end': end, 'file': os.path.basename(path)}
+
+    @staticmethod
+    def _index_path(path):
+        return path[:-len('.jsonl.gz')] + '.index.json'
+
+    def read_segment_index(self, path):
+        """The sidecar index of a segment, or None if it was never written."""
+        try:
+            with open(self._index_path(path), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write_segment_index(self, path, index):
+        index_path = self._index_path(path)
+        with open(index_path + '.tmp', 'w') as f:
+            json.dump(index, f)
+        os.replace(index_path + '.tmp', index_path)
+
+    def _load_segment(self, path):
+        with self._lock:
+            blocks = self._segment_cache.get(path)
+            if blocks is not None:
+                self._segment_cache.move_to_end(path)
+                return blocks
+        # Decompress outside the lock; two readers racing on one segment just both load it
+        with gzip.open(path, 'rt') as f:
+            blocks = [json.loads(line) for line in f]
+        with self._lock:
+            self._segment_cache[path] = blocks
+            self._segment_cache.move_to_end(path)
+            while len(self._segment_cache) > self.cache_segments:
+                self._segment_cache.popitem(last=False)
+        return blocks
+
+    def read_block(self, index):
+        """
+        Random access to one archived block (decompresses its segment once).
+        """
+        with self._lock:
+            position = bisect.bisect_right(self._starts, index) - 1
+            if position < 0:
+                return None
+            start, end, path = self.segments[position]
+        if index > end:
+            return None
+        return self._load_segment(path)[index - start]
+
+    def iter_blocks(self, start=1, end=None):
+        """
+        Streams archived blocks in order, one segment line at a time, so
+        memory stays flat regardless of archive size.
+        """
+        with self._lock:
+            first = max(bisect.bisect_right(self._starts, start) - 1, 0)
+            segments = self.segments[first:]
+        for seg_start, seg_end, path in segments:
+            if end is not None and seg_start > end:
+                return
+            if seg_end < start:
+                continue
+            with gzip.open(path, 'rt') as f:
+                for line in f:
+                    block = json.loads(line)
+                    if block['index'] < start:
+                        continue
+                    if end is not None and block['index'] > end:
+                        return
+                    yield block
+
+    # --- SNAPSHOT ---
+
+    def load_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            with open(self.snapshot_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write_snapshot(self, snapshot):
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.snapshot_path)
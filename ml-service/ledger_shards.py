@@ -0,0 +1,235 @@
+import os
+import re
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from blockchain_engine import AgricultureBlockchain
+from ledger_writer import LedgerWriter
+
+
+class ShardedLedger:
+    """
+    Partitions the trade ledger into independent shards (by commodity or
+    region), each with its own chain, storage, index and single writer, so
+    one hot shard's queue never delays another's seals.
+
+    Shard writers and verify_all run on threads: they overlap file I/O and
+    keep queues apart, but PoW mining and hash/JSON verification hold the
+    GIL, so CPU-bound work does not scale with the shard count in one process.
+
+    The set of shards is bounded: configured `shard_keys` get a shard of
+    their own and every other commodity or region maps to one of a fixed
+    number of hash buckets, so caller-supplied strings cannot open shards
+    (directories, SQLite files, writer threads) without limit.
+
+    A lightweight anchor chain periodically commits every shard's tip hash,
+    which keeps global integrity checks cheap: verify each shard, then check
+    the anchored tips instead of cross-reading shards.
+    """
+
+    PRIMARY = 'main'
+    SHARD_MODES = ('none', 'commodity', 'region')
+
+    def __init__(self, base_dir, shard_by='none', primary=None, primary_writer=None,
+                 anchor_interval=100, shard_keys=None, shard_buckets=8, **ledger_options):
+        """
+        Args:
+            base_dir (str): Directory holding shard ledgers and the anchor chain
+            shard_by (str): 'none', 'commodity' or 'region' (state/district)
+            shard_keys (list): Commodities/regions that get a dedicated shard
+            shard_buckets (int): Hash buckets shared by all other keys (0 sends them to the primary)
+            primary (AgricultureBlockchain): Default shard (also owns escrow contracts)
+            primary_writer (LedgerWriter): Writer already bound to `primary`
+            anchor_interval (int): Seals across all shards between anchor blocks
+            ledger_options: Forwarded to each shard's AgricultureBlockchain
+        """
+        if shard_by not in self.SHARD_MODES:
+            raise ValueError(f"Unknown shard mode: {shard_by}")
+        self.base_dir = base_dir
+        self.shard_by = shard_by
+        self.anchor_interval = anchor_interval
+        self.shard_keys = {self._normalize(key) for key in shard_keys or ()} - {''}
+        self.shard_buckets = shard_buckets
+        self.ledger_options = ledger_options
+        self._lock = threading.Lock()
+        self._anchors_lock = threading.Lock()
+        self._sealed_at_anchor = 0
+        self.shards = {}  # name -> (ledger, writer)
+        self._subscriptions = []  # (event type, callback), replayed onto shards opened later
+
+        os.makedirs(os.path.join(base_dir, 'shards'), exist_ok=True)
+        if primary is None:
+            primary = AgricultureBlockchain(
+                storage_path=os.path.join(base_dir, 'trade_ledger.json'), **ledger_options
+            )
+        self.shards[self.PRIMARY] = (primary, primary_writer or LedgerWriter(primary))
+        for name in sorted(os.listdir(os.path.join(base_dir, 'shards'))):
+            self._open_shard(name)
+
+        self.anchor_ledger = AgricultureBlockchain(
+            storage_path=os.path.join(base_dir, 'anchor_ledger.json'), **ledger_options
+        )
+        self.anchor_writer = LedgerWriter(self.anchor_ledger)
+        self.latest_anchors = self._load_latest_anchors()
+
+    # --- ROUTING ---
+
+    @staticmethod
+    def _normalize(value):
+        return re.sub(r'[^a-z0-9]+', '_', str(value).strip().lower()).strip('_')
+
+    def shard_for(self, crop=None, region=None):
+        """
+        Maps a trade onto its shard name according to the shard mode: a
+        configured key's own shard, else a stable hash bucket ("bucket-NN",
+        which no normalized key can collide with).
+        """
+        if self.shard_by == 'commodity' and crop:
+            key = self._normalize(crop)
+        elif self.shard_by == 'region' and region:
+            key = self._normalize(region)
+        else:
+            key = ''
+        if not key:
+            return self.PRIMARY
+        if key in self.shard_keys:
+            return key
+        if not self.shard_buckets:
+            return self.PRIMARY
+        return f"bucket-{zlib.crc32(key.encode()) % self.shard_buckets:02d}"
+
+    def _open_shard(self, name):
+        storage_path = os.path.join(self.base_dir, 'shards', name, 'trade_ledger.json')
+        os.makedirs(os.path.dirname(storage_path), exist_ok=True)
+        ledger = AgricultureBlockchain(storage_path=storage_path, **self.ledger_options)
+        for event_type, callback in self._subscriptions:
+            ledger.subscribe(event_type, callback)
+        self.shards[name] = (ledger, LedgerWriter(ledger))
+        return self.shards[name]
+
+    def get(self, name, create=False):
+        """
+        Returns (ledger, writer) for a shard, opening it on first use.
+        """
+        shard = self.shards.get(name)
+        if shard is None and create:
+            with self._lock:
+                shard = self.shards.get(name) or self._open_shard(name)
+        return shard
+
+    def submit(self, shard_name, mutation, *args, **kwargs):
+        """
+        Queues a ledger mutation (method name) on a shard's writer.
+        Returns the writer's future.
+        """
+        ledger, writer = self.get(shard_name, create=True)
+        future = writer.submit(getattr(ledger, mutation), *args, **kwargs)
+        future.add_done_callback(self._count_seal)
+        return future
+
+    def subscribe(self, event_type, callback):
+        """
+        Subscribes to a ledger event on every trade shard, including shards
+        opened later (the anchor chain only carries anchors and is skipped).
+        """
+        with self._lock:
+            self._subscriptions.append((event_type, callback))
+            for ledger, _ in self.shards.values():
+                ledger.subscribe(event_type, callback)
+
+    # --- CROSS-SHARD ANCHORS ---
+
+    def _count_seal(self, _done=None):
+        # Counts transactions actually sealed, so idempotent retries do not bring anchors forward
+        with self._lock:
+            sealed = sum(ledger.transactions_sealed for ledger, _ in self.shards.values())
+            due = sealed - self._sealed_at_anchor >= self.anchor_interval
+            if due:
+                self._sealed_at_anchor = sealed
+        if due:
+            self.anchor()
+
+    def _load_latest_anchors(self):
+        latest = {}
+        for block in self.anchor_ledger.iter_blocks():
+            for record in block['transactions']:
+                if record.get('type') == 'SHARD_ANCHOR':
+                    latest[record['shard']] = {
+                        'height': record['height'],
+                        'tip_hash': record['tip_hash'],
+                        'anchor_block': block['index']
+                    }
+        return latest
+
+    def _write_anchor(self, tips):
+        return self.anchor_ledger.seal_records([
+            {'type': 'SHARD_ANCHOR', 'shard': name, 'height': height, 'tip_hash': tip_hash}
+            for name, height, tip_hash in tips
+        ])
+
+    def anchor(self):
+        """
+        Commits every shard's current tip hash in one anchor block.
+        Returns a future resolving to the anchor receipt.
+        """
+        tips = []
+        for name, (ledger, _) in list(self.shards.items()):
+            tip = ledger.last_block
+            tips.append((name, tip['index'], ledger.hash(tip)))
+
+        future = self.anchor_writer.submit(self._write_anchor, tips)
+
+        def remember(done):
+            if done.exception() is None:
+                anchor_block = done.result()['block']['index']
+                with self._anchors_lock:
+                    for name, height, tip_hash in tips:
+                        self.latest_anchors[name] = {
+                            'height': height, 'tip_hash': tip_hash, 'anchor_block': anchor_block
+                        }
+
+        future.add_done_callback(remember)
+        return future
+
+    def verify_anchors(self):
+        """
+        Checks each shard still holds the exact block its latest anchor committed.
+        """
+        # Anchors land on the anchor writer thread; check a copy
+        with self._anchors_lock:
+            latest = list(self.latest_anchors.items())
+        for name, anchored in latest:
+            shard = self.get(name)
+            if shard is None:
+                return False
+            block = shard[0].get_block(anchored['height'])
+            if block is None or shard[0].hash(block) != anchored['tip_hash']:
+                return False
+        return True
+
+    def verify_all(self, workers=None):
+        """
+        Verifies all shards concurrently (threads, so CPU-bound hashing is
+        GIL-limited), then the anchor chain and anchored tips.
+        """
+        shards = list(self.shards.items())
+        with ThreadPoolExecutor(max_workers=workers or min(8, len(shards))) as pool:
+            results = list(pool.map(lambda item: item[1][0].verify_chain(), shards))
+
+        report = {
+            name: {'is_valid': valid, 'height': ledger.height, 'tip_hash': ledger.hash(ledger.last_block)}
+            for (name, (ledger, _)), valid in zip(shards, results)
+        }
+        anchors_valid = self.anchor_ledger.verify_chain() and self.verify_anchors()
+        return {
+            'is_valid': all(results) and anchors_valid,
+            'anchors_valid': anchors_valid,
+            'anchor_height': self.anchor_ledger.height,
+            'shards': report
+        }
+
+    def close(self):
+        for _, writer in self.shards.values():
+            writer.close()
+        self.anchor_writer.close()
@@ -0,0 +1,122 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class LedgerBusyError(Exception):
+    """Raised when the writer inbox is full and the caller should back off."""
+
+
+class LedgerPersistError(Exception):
+    """
+    Raised for a mutation that was applied in a batch whose sealing or
+    persisted write then failed. Its effects are not rolled back: escrow
+    contract transitions are already committed to their own store, and the
+    ledger record stays queued (or sealed in memory) and is written with the
+    next batch. Callers must not resubmit it; `result` holds its return value.
+    """
+
+    def __init__(self, cause, result):
+        super().__init__(f"Mutation applied, but the ledger write failed and is retried with the next batch: {cause}")
+        self.cause = cause
+        self.result = result
+
+
+_STOP = object()
+
+
+class LedgerWriter:
+    """
+    Single-writer actor for the AgroLink ledger.
+
+    Every ledger and escrow mutation is queued to one dedicated thread, so
+    `pending_transactions`, `chain` and the ledger file are only ever touched
+    by that thread. Queued mutations are drained in batches: each batch mines
+    at most one block and performs a single persisted write, then the
+    callers' futures are resolved in submission order.
+    """
+
+    def __init__(self, ledger, max_pending=1024, max_batch=256):
+        """
+        Args:
+            ledger (AgricultureBlockchain): Engine owned by this writer
+            max_pending (int): Bounded inbox size (back-pressure on callers)
+            max_batch (int): Max mutations folded into one block/write
+        """
+        self.ledger = ledger
+        self.max_batch = max_batch
+        self.inbox = queue.Queue(maxsize=max_pending)
+        self.batches_written = 0
+        self._thread = threading.Thread(target=self._run, name="ledger-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, mutation, *args, timeout=5.0, **kwargs):
+        """
+        Queues `mutation(*args, **kwargs)` for the writer thread.
+        Returns a concurrent.futures.Future with the mutation's result.
+        """
+        future = Future()
+        try:
+            self.inbox.put((future, mutation, args, kwargs), timeout=timeout)
+        except queue.Full:
+            raise LedgerBusyError("Ledger writer is saturated. Retry shortly.")
+        return future
+
+    def close(self, timeout=None):
+        """Drains everything already queued, then stops the writer thread."""
+        self.inbox.put(_STOP)
+        self._thread.join(timeout)
+
+    def _run(self):
+        running = True
+        while running:
+            item = self.inbox.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self.inbox.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    running = False
+                    break
+                batch.append(item)
+            self._apply(batch)
+
+    def _apply(self, batch):
+        outcomes = []
+        try:
+            with self.ledger.batch():
+                for future, mutation, args, kwargs in batch:
+                    if not future.set_running_or_notify_cancel():
+                        outcomes.append(None)
+                        continue
+                    try:
+                        outcomes.append((True, mutation(*args, **kwargs)))
+                    except Exception as e:
+                        outcomes.append((False, e))
+        except Exception as e:
+            # Sealing or the persisted write failed after the mutations ran: they
+            # are applied but not yet durable, which callers have to be told apart
+            # from a mutation that failed by itself
+            for (future, _, _, _), outcome in zip(batch, outcomes):
+                if outcome is None:
+                    continue
+                ok, value = outcome
+                future.set_exception(LedgerPersistError(e, value) if ok else value)
+            for future, _, _, _ in batch[len(outcomes):]:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches_written += 1
+        for (future, _, _, _), outcome in zip(batch, outcomes):
+            if outcome is None:
+                continue
+            ok, value = outcome
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
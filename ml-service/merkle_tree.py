@@ -0,0 +1,116 @@
+import hashlib
+import json
+
+# Version 1 (blocks sealed before `merkle_version` existed) hashes leaves and
+# inner nodes alike and pads odd levels by duplicating the last node, so a
+# list with a repeated tail hashes to the same root (CVE-2012-2459) and an
+# inner node can pass as a leaf. Version 2 domain-separates leaves (0x00)
+# from inner nodes (0x01) and carries an odd last node up unpaired.
+MERKLE_VERSION = 2
+PROOF_POSITIONS = ('left', 'right')
+
+_LEAF_PREFIX = b'\x00'
+_NODE_PREFIX = b'\x01'
+
+
+def hash_transaction(transaction):
+    """
+    Canonical SHA-256 hash of a ledger transaction (its transaction id).
+    """
+    return hashlib.sha256(json.dumps(transaction, sort_keys=True).encode()).hexdigest()
+
+
+def _hash_leaf(tx_hash):
+    return hashlib.sha256(_LEAF_PREFIX + tx_hash.encode()).hexdigest()
+
+
+def _hash_node(left, right):
+    return hashlib.sha256(_NODE_PREFIX + (left + right).encode()).hexdigest()
+
+
+def _hash_pair(left, right):
+    # Version 1 inner node
+    return hashlib.sha256((left + right).encode()).hexdigest()
+
+
+def _leaves(tx_hashes, version):
+    if version == 1:
+        return list(tx_hashes)
+    if version == MERKLE_VERSION:
+        return [_hash_leaf(tx_hash) for tx_hash in tx_hashes]
+    raise ValueError(f"Unknown Merkle version: {version}")
+
+
+def _next_level(level, version):
+    if version == 1:
+        # Odd levels duplicate their last node (Bitcoin-style padding)
+        if len(level) % 2 == 1:
+            level = level + [level[-1]]
+        return [_hash_pair(level[i], level[i + 1]) for i in range(0, len(level), 2)]
+    paired = [_hash_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2 == 1:
+        paired.append(level[-1])
+    return paired
+
+
+def merkle_root(tx_hashes, version=MERKLE_VERSION):
+    """
+    Computes the Merkle root over a list of transaction hashes.
+    An empty block commits to the hash of the empty string.
+    """
+    if not tx_hashes:
+        return hashlib.sha256(b'').hexdigest()
+
+    level = _leaves(tx_hashes, version)
+    while len(level) > 1:
+        level = _next_level(level, version)
+    return level[0]
+
+
+def merkle_proof(tx_hashes, tx_index, version=MERKLE_VERSION):
+    """
+    Builds an O(log n) inclusion proof for the transaction at `tx_index`.
+
+    Returns a list of {'hash', 'position'} steps from leaf to root, where
+    `position` tells the verifier which side the sibling hash sits on.
+    """
+    if tx_index < 0 or tx_index >= len(tx_hashes):
+        raise IndexError(f"Transaction index {tx_index} out of range")
+
+    proof = []
+    level = _leaves(tx_hashes, version)
+    index = tx_index
+    while len(level) > 1:
+        if version == 1 and len(level) % 2 == 1:
+            level = level + [level[-1]]
+        sibling = index ^ 1
+        # An unpaired last node is carried up as is and adds no step
+        if sibling < len(level):
+            proof.append({
+                'hash': level[sibling],
+                'position': 'left' if sibling < index else 'right'
+            })
+        level = _next_level(level, version)
+        index //= 2
+    return proof
+
+
+def verify_merkle_proof(tx_hash, proof, root, version=MERKLE_VERSION):
+    """
+    Stateless verifier: checks that `tx_hash` is committed by `root`
+    using only the proof path (no chain access required).
+    Steps with a position other than 'left' or 'right' fail verification.
+    """
+    if version not in (1, MERKLE_VERSION):
+        return False
+    combine = _hash_pair if version == 1 else _hash_node
+    current = tx_hash if version == 1 else _hash_leaf(tx_hash)
+    for step in proof:
+        position = step.get('position')
+        if position not in PROOF_POSITIONS or not isinstance(step.get('hash'), str):
+            return False
+        if position == 'left':
+            current = combine(step['hash'], current)
+        else:
+            current = combine(current, step['hash'])
+    return current == root
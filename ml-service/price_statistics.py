@@ -0,0 +1,393 @@
+import json
+import math
+import os
+import random
+import threading
+from collections import deque
+from time import time
+
+import numpy as np
+import pandas as pd
+
+
+class RunningPriceStats:
+    """
+    O(1) running statistics for one price series.
+
+    Keeps Welford's count/mean/M2 (exact mean and variance over all
+    observations) alongside an exponentially weighted mean and variance
+    that follow the recent price regime.
+    """
+
+    __slots__ = ('count', 'mean', 'm2', 'ewma_mean', 'ewma_var', 'last_price', 'updated_at')
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, ewma_mean=0.0, ewma_var=0.0, last_price=None, updated_at=None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.ewma_mean = ewma_mean
+        self.ewma_var = ewma_var
+        self.last_price = last_price
+        self.updated_at = updated_at
+
+    def update(self, price, alpha):
+        price = float(price)
+        self.count += 1
+        delta = price - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (price - self.mean)
+
+        if self.count == 1:
+            self.ewma_mean, self.ewma_var = price, 0.0
+        else:
+            diff = price - self.ewma_mean
+            increment = alpha * diff
+            self.ewma_mean += increment
+            self.ewma_var = (1 - alpha) * (self.ewma_var + diff * increment)
+        self.last_price = price
+        self.updated_at = time()
+
+    def update_batch(self, prices, alpha):
+        """
+        Folds an ordered array of prices in at once: the Welford moments are
+        merged with Chan's parallel formula, the EWMA is stepped in order.
+        """
+        prices = np.asarray(prices, dtype=float)
+        if len(prices) == 0:
+            return
+        n = len(prices)
+        batch_mean = float(prices.mean())
+        batch_m2 = float(((prices - batch_mean) ** 2).sum())
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.m2 += batch_m2 + delta * delta * self.count * n / total
+        self.mean += delta * n / total
+
+        ewma_mean, ewma_var = self.ewma_mean, self.ewma_var
+        start = 0
+        if self.count == 0:
+            ewma_mean, ewma_var, start = float(prices[0]), 0.0, 1
+        for price in prices[start:].tolist():
+            diff = price - ewma_mean
+            increment = alpha * diff
+            ewma_mean += increment
+            ewma_var = (1 - alpha) * (ewma_var + diff * increment)
+        self.ewma_mean, self.ewma_var = ewma_mean, ewma_var
+        self.count = total
+        self.last_price = float(prices[-1])
+        self.updated_at = time()
+
+    @property
+    def std(self):
+        # Population std, matching np.std on the full history
+        return math.sqrt(self.m2 / self.count) if self.count else 0.0
+
+    @property
+    def ewma_std(self):
+        return math.sqrt(self.ewma_var)
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+
+class _SkipNode:
+    __slots__ = ('value', 'next', 'width')
+
+    def __init__(self, value, next, width):
+        self.value = value
+        self.next = next
+        self.width = width
+
+
+_TAIL = _SkipNode(math.inf, [], [])
+
+
+class IndexedSkiplist:
+    """
+    Sorted multiset with O(log n) insert, remove and access by rank
+    (each link stores how many elements it skips).
+    """
+
+    def __init__(self, expected_size=128):
+        self.size = 0
+        self.maxlevels = int(1 + math.log2(max(expected_size, 2)))
+        self.head = _SkipNode(None, [_TAIL] * self.maxlevels, [1] * self.maxlevels)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, rank):
+        node = self.head
+        rank += 1
+        for level in reversed(range(self.maxlevels)):
+            while node.width[level] <= rank:
+                rank -= node.width[level]
+                node = node.next[level]
+        return node.value
+
+    def __iter__(self):
+        node = self.head.next[0]
+        while node is not _TAIL:
+            yield node.value
+            node = node.next[0]
+
+    def insert(self, value):
+        chain = [None] * self.maxlevels
+        steps_at_level = [0] * self.maxlevels
+        node = self.head
+        for level in reversed(range(self.maxlevels)):
+            while node.next[level].value <= value:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        height = min(self.maxlevels, 1 - int(math.log2(1.0 - random.random())))
+        new_node = _SkipNode(value, [None] * height, [None] * height)
+        steps = 0
+        for level in range(height):
+            prev = chain[level]
+            new_node.next[level] = prev.next[level]
+            prev.next[level] = new_node
+            new_node.width[level] = prev.width[level] - steps
+            prev.width[level] = steps + 1
+            steps += steps_at_level[level]
+        for level in range(height, self.maxlevels):
+            chain[level].width[level] += 1
+        self.size += 1
+
+    def remove(self, value):
+        chain = [None] * self.maxlevels
+        node = self.head
+        for level in reversed(range(self.maxlevels)):
+            while node.next[level].value < value:
+                node = node.next[level]
+            chain[level] = node
+        if chain[0].next[0].value != value:
+            raise KeyError(value)
+
+        height = len(chain[0].next[0].next)
+        for level in range(height):
+            prev = chain[level]
+            prev.width[level] += prev.next[level].width[level] - 1
+            prev.next[level] = prev.next[level].next[level]
+        for level in range(height, self.maxlevels):
+            chain[level].width[level] -= 1
+        self.size -= 1
+
+    def bisect_left(self, value):
+        """Number of elements strictly less than `value`."""
+        rank = 0
+        node = self.head
+        for level in reversed(range(self.maxlevels)):
+            while node.next[level].value < value:
+                rank += node.width[level]
+                node = node.next[level]
+        return rank
+
+
+class SlidingWindowMedian:
+    """
+    Median and MAD (median absolute deviation) over the last `window`
+    prices. Updates are O(log w) on an indexed skiplist; the MAD is the
+    k-th smallest of two sorted distance runs around the median, found by
+    binary search in O(log^2 w) without materializing the deviations.
+    """
+
+    def __init__(self, window=60, values=()):
+        self.window = window
+        self.values = deque()
+        self.sorted = IndexedSkiplist(expected_size=window)
+        for value in values:
+            self.add(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, value):
+        value = float(value)
+        if len(self.values) == self.window:
+            self.sorted.remove(self.values.popleft())
+        self.values.append(value)
+        self.sorted.insert(value)
+
+    def median(self):
+        n = len(self.sorted)
+        if n == 0:
+            return None
+        if n % 2:
+            return self.sorted[n // 2]
+        return (self.sorted[n // 2 - 1] + self.sorted[n // 2]) / 2
+
+    def _kth_deviation(self, k, center, split):
+        # Distances below the median, nearest first: center - sorted[split-1-i]
+        # Distances above the median, nearest first: sorted[split+j] - center
+        n_below, n_above = split, len(self.sorted) - split
+
+        def below(i):
+            return center - self.sorted[split - 1 - i]
+
+        def above(j):
+            return self.sorted[split + j] - center
+
+        lo, hi = max(0, k + 1 - n_above), min(k + 1, n_below)
+        while True:
+            i = (lo + hi) // 2  # taken from `below`
+            j = k + 1 - i       # taken from `above`
+            if i < n_below and j > 0 and above(j - 1) > below(i):
+                lo = i + 1
+            elif i > 0 and j < n_above and below(i - 1) > above(j):
+                hi = i - 1
+            else:
+                return max(below(i - 1) if i > 0 else -math.inf, above(j - 1) if j > 0 else -math.inf)
+
+    def mad(self):
+        n = len(self.sorted)
+        if n == 0:
+            return None
+        center = self.median()
+        split = self.sorted.bisect_left(center)
+        if n % 2:
+            return self._kth_deviation(n // 2, center, split)
+        return (self._kth_deviation(n // 2 - 1, center, split) + self._kth_deviation(n // 2, center, split)) / 2
+
+
+class PriceStatisticsStore:
+    """
+    Server-side running price statistics keyed by (market, commodity, variety).
+
+    Fed from the mandi price/arrival feed and from audited transactions, so
+    pricing anomaly checks no longer need the caller to ship price history.
+    Each series also keeps a sliding window for robust median/MAD checks.
+    Periodically snapshotted to JSON for fast restarts.
+    """
+
+    def __init__(self, alpha=0.1, snapshot_path=None, snapshot_interval=500, robust_window=60):
+        """
+        Args:
+            alpha (float): Weight of the newest price in the EWMA statistics
+            snapshot_path (str): JSON file the statistics are persisted to
+            snapshot_interval (int): Updates between automatic snapshots
+            robust_window (int): Recent prices kept per series for median/MAD
+        """
+        self.alpha = alpha
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.robust_window = robust_window
+        self.series = {}
+        self.windows = {}
+        self._lock = threading.Lock()
+        # Serialises snapshot writes: they share one temp file and must land in order
+        self._snapshot_lock = threading.Lock()
+        self._updates_since_snapshot = 0
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.load_snapshot()
+
+    @staticmethod
+    def series_key(market, commodity, variety=None):
+        return (
+            str(market or '').strip().lower(),
+            str(commodity or '').strip().lower(),
+            str(variety or 'other').strip().lower()
+        )
+
+    def get(self, market, commodity, variety=None):
+        return self.series.get(self.series_key(market, commodity, variety))
+
+    def get_window(self, market, commodity, variety=None):
+        return self.windows.get(self.series_key(market, commodity, variety))
+
+    def _series_for(self, key):
+        stats = self.series.get(key)
+        if stats is None:
+            stats = self.series[key] = RunningPriceStats()
+            self.windows[key] = SlidingWindowMedian(self.robust_window)
+        return stats, self.windows[key]
+
+    def update(self, market, commodity, variety, price):
+        """
+        Folds one price into its series. Non-finite prices are dropped: a NaN
+        compares false both ways, so it would corrupt the skiplist ordering and
+        fail its own removal once it slid out of the window.
+        Returns the updated stats, or None when the price was dropped.
+        """
+        price = float(price)
+        if not math.isfinite(price):
+            return None
+        key = self.series_key(market, commodity, variety)
+        with self._lock:
+            stats, window = self._series_for(key)
+            stats.update(price, self.alpha)
+            window.add(price)
+            self._updates_since_snapshot += 1
+            due = self.snapshot_path and self._updates_since_snapshot >= self.snapshot_interval
+            if due:
+                # Claimed under the lock, so concurrent updates trigger one snapshot, not one each
+                self._updates_since_snapshot = 0
+        if due:
+            self.write_snapshot()
+        return stats
+
+    def ingest_market_data(self, df):
+        """
+        Bulk backfill from a mandi price report (Market/Commodity/Variety/
+        Modal Price/Arrival Date columns), in date order per series.
+
+        Rows are grouped with one stable argsort instead of per-row dict
+        lookups; only the last `robust_window` prices of each series are
+        pushed through its skiplist, since older ones would be evicted anyway.
+        """
+        # Report exports end with blank/summary rows
+        df = df.dropna(subset=['Market', 'Commodity', 'Modal Price'])
+        df = df[np.isfinite(df['Modal Price'].to_numpy(dtype=float))].sort_values('Arrival Date', kind='stable')
+        codes, uniques = pd.MultiIndex.from_frame(df[['Market', 'Commodity', 'Variety']]).factorize()
+        order = np.argsort(codes, kind='stable')
+        prices = df['Modal Price'].to_numpy(dtype=float)[order]
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+
+        with self._lock:
+            for code, (market, commodity, variety) in enumerate(uniques):
+                series_prices = prices[bounds[code]:bounds[code + 1]]
+                stats, window = self._series_for(self.series_key(market, commodity, variety))
+                stats.update_batch(series_prices, self.alpha)
+                for price in series_prices[-self.robust_window:].tolist():
+                    window.add(price)
+        return len(df)
+
+    def ingest_csv(self, csv_path):
+        """Loads the raw daily price report export (title row + header)."""
+        df = pd.read_csv(csv_path, skiprows=1)
+        df['Modal Price'] = pd.to_numeric(df['Modal Price'].astype(str).str.replace(',', ''), errors='coerce')
+        df['Arrival Date'] = pd.to_datetime(df['Arrival Date'], format='%d-%m-%Y')
+        return self.ingest_market_data(df)
+
+    # --- SNAPSHOT ---
+
+    def write_snapshot(self):
+        with self._snapshot_lock:
+            with self._lock:
+                payload = {
+                    'alpha': self.alpha,
+                    'created_at': time(),
+                    'series': [list(key) + [stats.to_dict()] for key, stats in self.series.items()],
+                    'windows': [list(key) + [list(window.values)] for key, window in self.windows.items()]
+                }
+                self._updates_since_snapshot = 0
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, self.snapshot_path)
+
+    def load_snapshot(self):
+        try:
+            with open(self.snapshot_path, 'r') as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self.series = {
+            (market, commodity, variety): RunningPriceStats(**stats)
+            for market, commodity, variety, stats in payload['series']
+        }
+        self.windows = {key: SlidingWindowMedian(self.robust_window) for key in self.series}
+        for market, commodity, variety, values in payload.get('windows', []):
+            self.windows[(market, commodity, variety)] = SlidingWindowMedian(self.robust_window, values)
+        return True
@@ -0,0 +1,369 @@
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from blockchain_engine import AgricultureBlockchain
+from merkle_tree import hash_transaction
+from profit_analyzer import FarmerProfitAnalyzer
+
+
+class ProfitAggregateStore:
+    """
+    SQLite persistence for the per-farmer profit aggregates: one row per
+    (farmer, crop, month of year), incremented in place with an UPSERT so
+    a new transaction never rewrites more than its own cell. Counted order
+    ids are recorded in the same transaction as their cells, next to the
+    ledger heights the cells have been caught up to.
+    """
+
+    FIELDS = ('revenue', 'cost', 'quantity', 'transactions', 'price_sum', 'margin_sum')
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS profit_aggregates (
+            farmer_id TEXT NOT NULL,
+            crop TEXT NOT NULL,
+            month INTEGER NOT NULL,
+            revenue REAL NOT NULL,
+            cost REAL NOT NULL,
+            quantity REAL NOT NULL,
+            transactions INTEGER NOT NULL,
+            price_sum REAL NOT NULL,
+            margin_sum REAL NOT NULL,
+            PRIMARY KEY (farmer_id, crop, month)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS counted_orders (
+            order_id TEXT PRIMARY KEY
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS ledger_heights (
+            ledger TEXT PRIMARY KEY,
+            height INTEGER NOT NULL
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, db_path='models/profit_aggregates.db'):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript(self.SCHEMA)
+        conn.commit()
+
+    def _connection(self):
+        # One connection per thread: WAL lets readers run alongside the writer
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def load_all(self):
+        """Yields (farmer_id, crop, month, [aggregate values in FIELDS order]) for every stored cell."""
+        rows = self._connection().execute(
+            f"SELECT farmer_id, crop, month, {', '.join(self.FIELDS)} FROM profit_aggregates"
+        )
+        for row in rows:
+            yield row[0], row[1], row[2], list(row[3:])
+
+    def load_heights(self):
+        """{ledger name: height} the stored cells have been caught up to."""
+        return dict(self._connection().execute('SELECT ledger, height FROM ledger_heights'))
+
+    def save_heights(self, heights):
+        conn = self._connection()
+        with conn:
+            conn.executemany('INSERT OR REPLACE INTO ledger_heights (ledger, height) VALUES (?, ?)', heights.items())
+
+    def counted(self, order_ids):
+        """The subset of `order_ids` whose sales have already been added."""
+        conn = self._connection()
+        return {
+            order_id for order_id in set(order_ids)
+            if conn.execute('SELECT 1 FROM counted_orders WHERE order_id = ?', (order_id,)).fetchone()
+        }
+
+    def add(self, increments, order_ids=()):
+        """
+        Adds [(farmer_id, crop, month, values)] to the stored cells and marks
+        `order_ids` counted, in one transaction.
+        """
+        conn = self._connection()
+        with conn:
+            conn.executemany('INSERT OR IGNORE INTO counted_orders (order_id) VALUES (?)',
+                             [(order_id,) for order_id in order_ids])
+            conn.executemany(
+                f"INSERT INTO profit_aggregates (farmer_id, crop, month, {', '.join(self.FIELDS)}) "
+                f"VALUES (?, ?, ?, {', '.join('?' for _ in self.FIELDS)}) "
+                f"ON CONFLICT (farmer_id, crop, month) DO UPDATE SET "
+                + ', '.join(f"{field} = {field} + excluded.{field}" for field in self.FIELDS),
+                [(farmer_id, crop, month, *values) for farmer_id, crop, month, values in increments]
+            )
+
+
+class FarmerProfitAggregates:
+    """
+    Running profit totals per farmer, crop and month of year, kept current
+    from sealed trades, released escrow payments and reported transactions.
+
+    Each cell holds revenue, production cost, quantity, transaction count
+    and the sums of per-transaction price and margin, which is everything
+    FarmerProfitAnalyzer.generate_dashboard derives from the full history.
+    A dashboard is then assembled from at most crops x 12 cells, however
+    many transactions the farmer has; figures match the full recompute up
+    to floating-point summation order.
+
+    Every sale carries an order key (the order id, the contract id of an
+    escrow, or the hash of a ledger row without one) and is added once
+    however often it is reported, so the ledger can be replayed safely.
+    """
+
+    # Integrity seals re-record a sale and lifecycle rows carry no sale; neither is revenue
+    SKIPPED_PREFIXES = (AgricultureBlockchain.INTEGRITY_PREFIX,) + AgricultureBlockchain.LIFECYCLE_PREFIXES
+
+    def __init__(self, store=None, cost_basis=None):
+        """
+        Args:
+            store (ProfitAggregateStore): Persistence for the cells (None keeps them in memory)
+            cost_basis (dict): Production cost per Quintal [Rs], as in FarmerProfitAnalyzer
+        """
+        self.store = store
+        self.cost_basis = cost_basis or dict(FarmerProfitAnalyzer.DEFAULT_COST_BASIS)
+        self._lock = threading.Lock()
+        self._month_names = FarmerProfitAnalyzer.MONTH_NAMES.to_dict()
+        # farmer id -> {crop: {month: [values in ProfitAggregateStore.FIELDS order]}}
+        self.farmers = {}
+        # Order keys already added, when there is no store to look them up in
+        self._counted_orders = set()
+        # Ledger name -> height whose blocks are already in the cells
+        self.heights = {}
+        if store is not None:
+            for farmer_id, crop, month, values in store.load_all():
+                self.farmers.setdefault(farmer_id, {}).setdefault(crop, {})[month] = values
+            self.heights = store.load_heights()
+
+    def __contains__(self, farmer_id):
+        return str(farmer_id) in self.farmers
+
+    @staticmethod
+    def _month(date):
+        if isinstance(date, (int, float)):
+            return datetime.fromtimestamp(date).month
+        return pd.Timestamp(date).month
+
+    def _increment(self, crop, quantity, price):
+        revenue = quantity * price
+        cost = self.cost_basis.get(crop, FarmerProfitAnalyzer.DEFAULT_UNIT_COST) * quantity
+        return [revenue, cost, quantity, 1, price, (revenue - cost) / revenue * 100]
+
+    def add_transactions(self, farmer_id, transactions):
+        """
+        Folds (date, crop, quantity, price per Quintal[, order id]) sales into
+        the farmer's cells. Sales without positive quantity and price are
+        skipped, as are orders already added. Returns the number of
+        transactions added.
+        """
+        farmer_id = str(farmer_id)
+        sales = []
+        for date, crop, quantity, price, *order_id in transactions:
+            quantity, price = float(quantity), float(price)
+            if quantity <= 0 or price <= 0:
+                continue
+            order_id = str(order_id[0]) if order_id and order_id[0] is not None else None
+            sales.append((crop, self._month(date), quantity, price, order_id))
+        if not sales:
+            return 0
+
+        with self._lock:
+            keys = [order_id for *_, order_id in sales if order_id is not None]
+            if self.store is not None:
+                counted = self.store.counted(keys)
+            else:
+                counted = self._counted_orders & set(keys)
+            cells, new_orders = {}, []
+            for crop, month, quantity, price, order_id in sales:
+                if order_id is not None:
+                    if order_id in counted:
+                        continue
+                    # A key repeated within the batch is counted once too
+                    counted.add(order_id)
+                    new_orders.append(order_id)
+                increment = self._increment(crop, quantity, price)
+                key = (crop, month)
+                if key in cells:
+                    cells[key] = [total + value for total, value in zip(cells[key], increment)]
+                else:
+                    cells[key] = increment
+            if not cells:
+                return 0
+            crops = self.farmers.setdefault(farmer_id, {})
+            for (crop, month), increment in cells.items():
+                months = crops.setdefault(crop, {})
+                if month in months:
+                    months[month] = [total + value for total, value in zip(months[month], increment)]
+                else:
+                    months[month] = list(increment)
+            if self.store is not None:
+                self.store.add([(farmer_id, crop, month, values) for (crop, month), values in cells.items()], new_orders)
+            else:
+                self._counted_orders.update(new_orders)
+        return sum(values[3] for values in cells.values())
+
+    def add_transaction(self, farmer_id, crop, quantity, price, date, order_id=None):
+        return self.add_transactions(farmer_id, [(date, crop, quantity, price, order_id)])
+
+    # --- LEDGER EVENTS ---
+
+    @staticmethod
+    def _number(value):
+        # Ledger rows carry "10 Quintals" and "Rs.2000"; contracts carry a float price
+        if isinstance(value, str):
+            match = re.search(r'\d+(?:\.\d+)?', value.replace(',', ''))
+            return float(match.group()) if match else 0.0
+        return float(value or 0.0)
+
+    def subscribe_to(self, ledger):
+        """
+        Feeds the aggregates from an AgricultureBlockchain or ShardedLedger:
+        directly sealed trades, and escrow contracts once their payment is
+        released to the farmer (dated when the contract was agreed).
+        """
+        ledger.subscribe('trade_sealed', self._on_trade)
+        ledger.subscribe('contract_released', self._on_contract_paid)
+        ledger.subscribe('contract_auto_released', self._on_contract_paid)
+
+    @staticmethod
+    def order_key(record):
+        # Rows sealed without an order id are told apart by their hash (it covers the timestamp)
+        return record.get('order_id') or f"tx:{hash_transaction(record)}"
+
+    def _on_trade(self, record):
+        if str(record.get('crop', '')).startswith(self.SKIPPED_PREFIXES):
+            return
+        self.add_transaction(record['farmer_id'], record['crop'], self._number(record['quantity']),
+                             self._number(record['price']), record['timestamp'], self.order_key(record))
+
+    def _on_contract_paid(self, contract):
+        self.add_transaction(contract['farmer_id'], contract['crop'], self._number(contract['quantity']),
+                             self._number(contract['price']), contract['created_at'], contract['id'])
+
+    def build_from_ledger(self, ledger, name='main'):
+        """
+        Adds the sales in a ledger's blocks above the height already covered
+        for `name`. An escrow's opening row counts only once its contract has
+        been released, with the contract's terms. Returns transactions added.
+        """
+        sales = {}
+        for block in ledger.iter_blocks(start=self.heights.get(name, 0) + 1):
+            for record in block['transactions']:
+                # Anchors and other sealed records carry no parties
+                if not (record.get('farmer_id') and record.get('buyer_id')):
+                    continue
+                if str(record.get('crop', '')).startswith(self.SKIPPED_PREFIXES):
+                    continue
+                contract = ledger.contracts.get(record['order_id']) if record.get('order_id') else None
+                if contract is None:
+                    sale = (record['timestamp'], record['crop'], self._number(record['quantity']),
+                            self._number(record['price']), self.order_key(record))
+                elif contract['status'] == 'PAYMENT_RELEASED':
+                    sale = (contract['created_at'], contract['crop'], self._number(contract['quantity']),
+                            self._number(contract['price']), contract['id'])
+                else:
+                    continue  # Still in escrow (or refunded): counted by the release event
+                sales.setdefault(record['farmer_id'], []).append(sale)
+        added = sum(self.add_transactions(farmer_id, farmer_sales) for farmer_id, farmer_sales in sales.items())
+        self.save_heights({name: max(self.heights.get(name, 0), ledger.height)})
+        return added
+
+    def catch_up(self, ledgers):
+        """
+        Brings the aggregates up to date with {name: ledger} at startup,
+        replaying only blocks above the stored heights. A ledger now shorter
+        than its stored height was replaced and is replayed from the start;
+        order keys keep sales already added from being counted twice.
+        """
+        for name, ledger in ledgers.items():
+            if ledger.height < self.heights.get(name, 0):
+                self.heights[name] = 0
+        return sum(self.build_from_ledger(ledger, name) for name, ledger in ledgers.items())
+
+    def save_heights(self, heights):
+        """
+        Records {name: ledger height} as covered. Only pass heights taken while
+        no trades are being sealed (startup, shutdown); sales above a stale
+        height are simply replayed and skipped by their order keys.
+        """
+        self.heights.update(heights)
+        if self.store is not None:
+            self.store.save_heights(heights)
+
+    # --- DASHBOARD ---
+
+    def generate_dashboard(self, farmer_id):
+        """
+        FarmerProfitAnalyzer.generate_dashboard for a farmer from the
+        aggregates, or None for a farmer without transactions.
+        """
+        with self._lock:
+            crops = self.farmers.get(str(farmer_id))
+            if not crops:
+                return None
+            crops = {crop: {month: list(values) for month, values in months.items()} for crop, months in crops.items()}
+
+        month_names = self._month_names
+        crop_analytics, best_months, monthly = {}, {}, {}
+        total_profit = margin_sum = transactions = 0
+        for crop, months in crops.items():
+            revenue, cost, quantity, count, _, margins = (sum(column) for column in zip(*months.values()))
+            crop_analytics[crop] = {
+                'Net_Profit': revenue - cost,
+                'Profit_Margin_%': margins / count,
+                'Quantity_Quintals': quantity
+            }
+            total_profit += revenue - cost
+            margin_sum += margins
+            transactions += count
+            # Highest average price; ties go to the alphabetically first month name, as in the analyzer
+            best_months[crop] = min(
+                (-values[4] / values[3], month_names[month]) for month, values in months.items()
+            )[1]
+            for month, values in months.items():
+                monthly[month] = monthly.get(month, 0) + values[0] - values[1]
+
+        # Most profitable first; equal profits keep crop-name order
+        ranked = sorted(sorted(crop_analytics), key=lambda crop: -crop_analytics[crop]['Net_Profit'])
+        return {
+            "overall": {
+                "total_net_profit": round(total_profit, 2),
+                "avg_profit_margin": f"{round(margin_sum / transactions, 2)}%",
+                "most_profitable_crop": ranked[0]
+            },
+            "crop_analytics": {crop: crop_analytics[crop] for crop in ranked},
+            "optimal_selling_windows": best_months,
+            "monthly_distribution": [
+                {'MonthName': month_names[month], 'Net_Profit': monthly[month]} for month in sorted(monthly)
+            ]
+        }
+
+
+if __name__ == "__main__":
+    aggregates = FarmerProfitAggregates()
+    history = [
+        ('2025-01-10', 'Onion', 50, 1500), ('2025-01-25', 'Onion', 40, 1800), ('2025-02-15', 'Potato', 100, 1100),
+        ('2025-03-05', 'Onion', 60, 1200), ('2025-05-10', 'Tomato', 30, 1400), ('2025-06-12', 'Tomato', 25, 900),
+        ('2025-08-20', 'Wheat', 80, 2400), ('2025-10-15', 'Cotton', 20, 6500), ('2025-11-20', 'Potato', 120, 1300),
+        ('2025-12-05', 'Onion', 50, 2200),
+    ]
+    aggregates.add_transactions("FARMER_001", history)
+    dashboard = aggregates.generate_dashboard("FARMER_001")
+    print(f"TOTAL NET PROFIT     : Rs.{dashboard['overall']['total_net_profit']}")
+    print(f"AVG MARGIN           : {dashboard['overall']['avg_profit_margin']}")
+    print(f"MOST PROFITABLE CROP : {dashboard['overall']['most_profitable_crop']}")
+    print("OPTIMAL SELLING WINDOWS:", dashboard['optimal_selling_windows'])
+
+    # A new sealed trade updates one cell; the dashboard is not recomputed from history
+    aggregates._on_trade({'farmer_id': "FARMER_001", 'crop': "Onion", 'quantity': "70 Quintals",
+                          'price': "Rs.2600", 'timestamp': datetime(2025, 12, 20).timestamp()})
+    print("After December sale:", aggregates.generate_dashboard("FARMER_001")['optimal_selling_windows'])
@@ -9,6 +9,17 @@ class FarmerProfitAnalyzer:
     Helps farmers identify high-margin crops and optimal selling windows.
     """
 
+    # Default cost basis if not provided (Avg costs in Gujarat region)
+    DEFAULT_COST_BASIS = {
+        'Onion': 800,
+        'Potato': 500,
+        'Tomato': 600,
+        'Wheat': 1200,
+        'Cotton': 4000
+    }
+    # Production cost per Quintal [Rs] for crops missing from the cost basis
+    DEFAULT_UNIT_COST = 1000
+
     def __init__(self, transactions_df, cost_basis=None):
         """
         Args:
@@ -16,26 +27,27 @@ class FarmerProfitAnalyzer:
             cost_basis (dict): Estimated production cost per Quintal [Rs]
         """
         self.df = transactions_df
-        # Default cost basis if not provided (Avg costs in Gujarat region)
-        self.cost_basis = cost_basis or {
-            'Onion': 800,
-            'Potato': 500,
-            'Tomato': 600,
-            'Wheat': 1200,
-            'Cotton': 4000
-        }
+        self.cost_basis = cost_basis or dict(self.DEFAULT_COST_BASIS)
         self._calculate_net_profit()
 
+    # Month names in the active locale (what strftime('%B') gives), looked up per month number
+    MONTH_NAMES = pd.Series([datetime(2000, m, 1).strftime('%B') for m in range(1, 13)], index=range(1, 13))
+
     def _calculate_net_profit(self):
         """Applies production cost mapping and calculates net profit."""
-        self.df['Production_Cost_Total'] = self.df.apply(
-            lambda x: self.cost_basis.get(x['Crop'], 1000) * x['Quantity_Quintals'], axis=1
+        # Crops and dates are resolved once per distinct value, then gathered per row
+        # (unknown crops, and a missing crop at code -1, fall back to DEFAULT_UNIT_COST)
+        self._crop_codes, self._crops = pd.factorize(self.df['Crop'])
+        unit_cost = np.array(
+            [self.cost_basis.get(crop, self.DEFAULT_UNIT_COST) for crop in self._crops] + [self.DEFAULT_UNIT_COST]
         )
+        self.df['Production_Cost_Total'] = unit_cost[self._crop_codes] * self.df['Quantity_Quintals'].to_numpy()
         self.df['Net_Profit'] = self.df['Total_Revenue'] - self.df['Production_Cost_Total']
         self.df['Profit_Margin_%'] = (self.df['Net_Profit'] / self.df['Total_Revenue']) * 100
-        self.df['Date'] = pd.to_datetime(self.df['Date'])
+        date_codes, dates = pd.factorize(self.df['Date'])
+        self.df['Date'] = pd.to_datetime(dates).take(date_codes, allow_fill=True, fill_value=pd.NaT)
         self.df['Month'] = self.df['Date'].dt.month
-        self.df['MonthName'] = self.df['Date'].dt.strftime('%B')
+        self.df['MonthName'] = self.df['Month'].map(self.MONTH_NAMES)
 
     def generate_dashboard(self):
         """Generates a structured analytical summary."""
@@ -45,23 +57,31 @@ class FarmerProfitAnalyzer:
         avg_margin = self.df['Profit_Margin_%'].mean()
         
         # 2. Crop Performance
-        crop_stats = self.df.groupby('Crop').agg({
+        # Grouped on the integer crop codes, then relabelled and put in crop-name order
+        crop_stats = self.df.groupby(self._crop_codes).agg({
             'Net_Profit': 'sum',
             'Profit_Margin_%': 'mean',
             'Quantity_Quintals': 'sum'
-        }).sort_values('Net_Profit', ascending=False)
+        })
+        crop_stats.index = self._crops[crop_stats.index]
+        crop_stats = crop_stats.sort_index().sort_values('Net_Profit', ascending=False)
         
         most_profitable_crop = crop_stats.index[0]
         
         # 3. Seasonal Patterns (Best Month per Crop)
-        best_months = {}
-        for crop in self.df['Crop'].unique():
-            crop_data = self.df[self.df['Crop'] == crop]
-            best_month = crop_data.groupby('MonthName')['Price_Per_Quintal'].mean().idxmax()
-            best_months[crop] = best_month
+        # One groupby over (crop, month), with months keyed by the alphabetical rank of
+        # their name so that idxmax breaks ties on the first month name, as before
+        month_names = self.MONTH_NAMES.sort_values()
+        month_rank = pd.Series(np.arange(12), index=month_names.index)
+        month_prices = self.df.groupby(
+            [self._crop_codes, self.df['Month'].map(month_rank).to_numpy()]
+        )['Price_Per_Quintal'].mean()
+        best = month_prices.groupby(level=0).idxmax()
+        best_months = {self._crops[code]: month_names.iat[rank] for code, rank in best.tolist()}
 
         # 4. Monthly Distribution
-        monthly_trend = self.df.groupby(['Month', 'MonthName'])['Net_Profit'].sum().reset_index().sort_values('Month')
+        monthly_trend = self.df.groupby('Month')['Net_Profit'].sum().reset_index()
+        monthly_trend['MonthName'] = monthly_trend['Month'].map(self.MONTH_NAMES)
 
         return {
             "overall": {
@@ -0,0 +1,210 @@
+import threading
+from time import time
+
+import numpy as np
+from scipy import sparse
+
+
+def propagate(n_nodes, src, dst, weight, prior, damping=0.85, start=None, tol=1e-8, max_iter=200):
+    """
+    Personalized PageRank over an undirected weighted graph by sparse power
+    iteration (EigenTrust form: local trust is each node's share of its
+    trade weight, pre-trust is `prior`).
+
+    Args:
+        n_nodes (int): Number of nodes
+        src, dst (array): Edge endpoints; each edge links both ways
+        weight (array): Edge weights (trade counts)
+        prior (array): Non-negative pre-trust per node, normalized here
+        damping (float): Probability of following a trade instead of teleporting to the prior
+        start (array): Warm-start vector, e.g. the previous solution (None starts from the prior)
+        tol (float): L1 change between iterations at which to stop
+        max_iter (int): Iteration cap
+
+    Returns (scores summing to 1, iterations run).
+    """
+    prior = np.asarray(prior, dtype=float)
+    p = prior / prior.sum() if prior.sum() > 0 else np.full(n_nodes, 1.0 / n_nodes)
+    # Column-stochastic transition matrix M = (D^-1 A)^T, built once per solve
+    rows = np.concatenate([src, dst])
+    cols = np.concatenate([dst, src])
+    values = np.concatenate([weight, weight]).astype(float)
+    strength = np.bincount(rows, weights=values, minlength=n_nodes)
+    dangling = strength == 0
+    with np.errstate(divide='ignore'):
+        values /= strength[rows]
+    transition = sparse.csr_matrix((values, (cols, rows)), shape=(n_nodes, n_nodes))
+
+    r = p.copy() if start is None else np.asarray(start, dtype=float) / np.sum(start)
+    for iteration in range(1, max_iter + 1):
+        # Mass on isolated nodes has nowhere to go and returns to the prior
+        updated = damping * (transition @ r) + (damping * r[dangling].sum() + 1.0 - damping) * p
+        change = np.abs(updated - r).sum()
+        r = updated
+        if change < tol:
+            break
+    return r, iteration
+
+
+class ReputationPropagator:
+    """
+    Network reputation for every trader, propagated over the farmer-buyer
+    trade graph (TradeGraphIndex) so that who a buyer trades with counts:
+    a new buyer trading with well-rated farmers inherits more reputation
+    than one trading with flagged accounts.
+
+    Pre-trust comes from the buyer trust scores where available, a neutral
+    value otherwise, and zero for accounts with wash-trading findings.
+    Solutions are recomputed on a background thread (see start()) when the
+    graph has changed, warm-started from the previous vector so a few new
+    trades cost a few iterations; lookups only read the last solution.
+    """
+
+    # Wash-trading patterns that withdraw an account's pre-trust
+    DISTRUSTED_PATTERNS = ('SHORT_CYCLE', 'RAPID_REVERSAL')
+
+    def __init__(self, trade_graph, trust_engine=None, damping=0.85, neutral_prior=0.5,
+                 tol=1e-8, max_iter=200, min_interval=30.0):
+        """
+        Args:
+            trade_graph (TradeGraphIndex): Graph of sealed trades
+            trust_engine (BuyerTrustEngine): Source of buyer pre-trust (None treats everyone as neutral)
+            damping (float): PageRank damping factor
+            neutral_prior (float): Pre-trust (0-1) of accounts without a trust score
+            tol (float): Convergence threshold on the L1 change
+            max_iter (int): Iteration cap per solve
+            min_interval (float): Seconds a solution is served before a changed graph triggers a re-solve
+        """
+        self.trade_graph = trade_graph
+        self.trust_engine = trust_engine
+        self.damping = damping
+        self.neutral_prior = neutral_prior
+        self.tol = tol
+        self.max_iter = max_iter
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        # (user id -> node, scores), swapped in as one tuple so readers never see a mix
+        self._solution = ({}, np.zeros(0))
+        self._version = None
+        self._solved_at = 0.0
+        self.last_iterations = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _prior(self, index, graph_suspicion):
+        prior = np.full(len(index), self.neutral_prior)
+        if self.trust_engine is not None:
+            buyer_ids, scores = self.trust_engine.aggregate_scores()
+            positions = [index.get(buyer_id, -1) for buyer_id in buyer_ids]
+            known = np.array(positions, dtype=np.int64)
+            prior[known[known >= 0]] = scores[known >= 0] / 100.0
+        flagged = sum(graph_suspicion[pattern] for pattern in self.DISTRUSTED_PATTERNS) > 0
+        prior[flagged] = 0.0
+        return prior
+
+    def refresh(self, force=False):
+        """
+        Re-solves if the graph changed (at most every `min_interval` seconds
+        unless forced). Readers keep the previous solution while a solve runs.
+        """
+        graph = self.trade_graph
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if self._version == graph.version:
+                return False
+            if not force and self._version is not None and time() - self._solved_at < self.min_interval:
+                return False
+            version = graph.version
+            nodes, src, dst, counts = graph.edge_arrays()
+            if not nodes:
+                return False
+            index = {user_id: node for node, user_id in enumerate(nodes)}
+            prior = self._prior(index, graph.suspicion_columns(nodes))
+            # Nodes are append-only, so the old solution is a prefix of the new one
+            previous = self._solution[1]
+            start = None
+            if len(previous):
+                start = np.concatenate([previous, np.full(len(nodes) - len(previous), 1.0 / len(nodes))])
+            scores, self.last_iterations = propagate(
+                len(nodes), src, dst, counts, prior, self.damping, start, self.tol, self.max_iter
+            )
+            self._solution = (index, scores)
+            self._version = version
+            self._solved_at = time()
+            return True
+        finally:
+            self._lock.release()
+
+    def start(self):
+        """Solves once, then re-solves in the background whenever the graph has changed."""
+        self._thread = threading.Thread(target=self._run, name="reputation-refresh", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        self.refresh(force=True)
+        while not self._stop.wait(self.min_interval):
+            self.refresh()
+
+    def close(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def reputation(self, user_id):
+        """
+        Network reputation relative to the average account (1.0), or None
+        for a user who never traded (or not yet in a solution). Values above
+        1 mean trust flows to the account from its counterparties.
+        """
+        index, scores = self._solution
+        node = index.get(str(user_id))
+        if node is None or node >= len(scores):
+            return None
+        return float(scores[node] * len(scores))
+
+    def top(self, limit=10):
+        """[(user id, relative reputation)] for the highest-ranked accounts."""
+        index, scores = self._solution
+        if not len(scores):
+            return []
+        ids = {node: user_id for user_id, node in index.items()}
+        best = np.argsort(-scores)[:limit]
+        return [(ids[node], float(scores[node] * len(scores))) for node in best.tolist()]
+
+
+if __name__ == "__main__":
+    from trade_graph import TradeGraphIndex
+    from trust_engine import BuyerTrustEngine
+
+    graph = TradeGraphIndex()
+    trust = BuyerTrustEngine()
+    now = time()
+    # Established buyers with clean records, trading with a pool of farmers
+    for b in range(3):
+        for i in range(20):
+            trust._on_contract_initiated({'buyer_id': f"TRUSTED_{b}", 'created_at': now - 3 * 365 * 86400})
+            trust._on_contract_released({'buyer_id': f"TRUSTED_{b}", 'created_at': now - 86400,
+                                         'dispatched_at': now - 86400, 'released_at': now - 80000})
+        for f in range(5):
+            graph.add_trade(f"FARMER_{f}", f"TRUSTED_{b}", 1800, now)
+    # A ring of accounts trading among themselves
+    for i in range(5):
+        for a, b in (("RING_A", "RING_B"), ("RING_B", "RING_C"), ("RING_C", "RING_A")):
+            graph.add_trade(a, b, 5000, now + i)
+
+    # Two new buyers with identical (empty) histories but different counterparties
+    graph.add_trade("FARMER_0", "NEW_BUYER_GOOD", 1500, now)
+    graph.add_trade("FARMER_1", "NEW_BUYER_GOOD", 1500, now)
+    graph.add_trade("RING_A", "NEW_BUYER_RING", 1500, now)
+    graph.add_trade("RING_B", "NEW_BUYER_RING", 1500, now)
+
+    reputation = ReputationPropagator(graph, trust)
+    reputation.refresh(force=True)
+    for user in ("NEW_BUYER_GOOD", "NEW_BUYER_RING", "TRUSTED_0", "RING_A"):
+        print(f"{user:<16} reputation {reputation.reputation(user):.3f}")
+
+    graph.add_trade("FARMER_2", "NEW_BUYER_RING", 1500, now)
+    reputation.refresh(force=True)
+    print(f"After one more trade: {reputation.reputation('NEW_BUYER_RING'):.3f} "
+          f"({reputation.last_iterations} warm-started iterations)")
@@ -0,0 +1,56 @@
+from anomaly_detector import AgricultureAnomalyDetector
+from price_statistics import PriceStatisticsStore
+
+
+def _detector():
+    store = PriceStatisticsStore()
+    for price in [1900, 2000, 2100, 2000, 1950, 2050, 2000, 2020]:
+        store.update("Lasalgaon", "Onion", "Red", price)
+    return AgricultureAnomalyDetector(price_stats=store)
+
+
+TRANSACTIONS = [
+    {'id': "T1", 'user_id': "U1", 'price': 2000, 'market': "Lasalgaon", 'commodity': "Onion", 'variety': "Red"},
+    {'id': "T2", 'user_id': "U2", 'price': 9000, 'market': "Lasalgaon", 'commodity': "Onion", 'variety': "Red"},
+    {'id': "T3", 'user_id': "U3", 'price': 2010, 'market': "Lasalgaon", 'commodity': "Onion", 'variety': "Red"},
+]
+RISKY_USER = {'id': "U3", 'total_deals': 10, 'cancelled_deals': 8, 'failed_payments': 4,
+              'average_deal_value': 1000, 'recent_deal_frequency': 1}
+
+
+def test_batch_without_users_scores_prices_only():
+    detector = _detector()
+    for users in (None, [], {'id': []}):
+        result = detector.audit_batch(TRANSACTIONS, users)
+        assert result['total'] == 3 and result['suspicious_users'] == 0
+        assert [row['transaction_id'] for row in result['flagged']] == ["T2"]
+        assert result['flagged'][0]['behavior_score'] == 0.0
+
+
+def test_unknown_users_score_zero_and_known_users_are_flagged():
+    detector = _detector()
+    result = detector.audit_batch(TRANSACTIONS + [dict(TRANSACTIONS[0], id="T4", user_id=None)], [RISKY_USER])
+    flagged = {row['transaction_id']: row for row in result['flagged']}
+    assert sorted(flagged) == ["T2", "T3"]
+    assert flagged["T2"]['behavior_score'] == 0.0
+    assert any("failed payment" in flag for flag in flagged["T3"]['flags'])
+
+    single = detector.perform_full_audit(dict(TRANSACTIONS[2]), RISKY_USER)
+    assert flagged["T3"]['risk_level'] == single['risk_level'] == "Medium Risk"
+    assert abs(flagged["T3"]['risk_score'] - single['risk_score']) < 1e-9
+
+
+def test_duplicate_user_ids_are_rejected():
+    detector = _detector()
+    try:
+        detector.audit_batch(TRANSACTIONS, [RISKY_USER, dict(RISKY_USER, failed_payments=0)])
+    except ValueError as e:
+        assert "U3" in str(e)
+    else:
+        raise AssertionError("duplicate user ids were accepted")
+
+
+if __name__ == "__main__":
+    test_batch_without_users_scores_prices_only()
+    test_unknown_users_score_zero_and_known_users_are_flagged()
+    test_duplicate_user_ids_are_rejected()
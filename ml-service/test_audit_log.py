@@ -0,0 +1,101 @@
+import json
+import os
+import random
+import tempfile
+
+from app.audit_log import SecurityAuditLog, worker_log_path
+
+
+def _written(audit_log):
+    audit_log.close()
+    with open(audit_log.log_path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_successes_are_sampled_and_violations_always_kept():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        log_path = os.path.join(tmp_dir, 'security_audit.jsonl')
+        random.seed(7)
+        audit_log = SecurityAuditLog(log_path, success_sample_rate=0.1)
+        assert audit_log.log_path == worker_log_path(log_path) != log_path
+        for i in range(2000):
+            audit_log.success("SIGNATURE_VERIFIED", "10.0.0.1", "/predict")
+            if i % 100 == 0:
+                audit_log.violation("SIGNATURE_MISMATCH", "10.0.0.2", "/predict", severity="critical")
+
+        records = _written(audit_log)
+        sampled = sum(r['event'] == "SIGNATURE_VERIFIED" for r in records)
+        assert 120 < sampled < 280
+        violations = [r for r in records if r['event'] == "SIGNATURE_MISMATCH"]
+        assert len(violations) == 20 and all(r['severity'] == "critical" for r in violations)
+
+
+def test_sampling_rate_bounds():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        audit_log = SecurityAuditLog(os.path.join(tmp_dir, 'none.jsonl'), success_sample_rate=0)
+        for _ in range(50):
+            audit_log.success("SIGNATURE_VERIFIED", "10.0.0.1", "/predict")
+        audit_log.violation("API_KEY_VIOLATION", "10.0.0.1", "/predict")
+        assert [r['event'] for r in _written(audit_log)] == ["API_KEY_VIOLATION"]
+
+        audit_log = SecurityAuditLog(os.path.join(tmp_dir, 'all.jsonl'), success_sample_rate=1)
+        for _ in range(50):
+            audit_log.success("SIGNATURE_VERIFIED", "10.0.0.1", "/predict")
+        assert len(_written(audit_log)) == 50
+
+
+def _record_violations(audit_log):
+    audit_log.violation("API_KEY_VIOLATION", "10.0.0.1", "/api/buyer-trust/B1")
+    audit_log.violation("RATE_LIMIT_EXCEEDED", "10.0.0.2", "/predict", retry_after=3)
+    audit_log.violation("API_KEY_VIOLATION", "10.0.0.2", "/api/buyer-trust/B2")
+    audit_log.violation("REPLAY_DETECTED", "10.0.0.1", "/api/profit-dashboard", severity="critical")
+
+
+def _check_queries(audit_log):
+    assert [r['path'] for r in audit_log.recent_violations(limit=2)] == ["/api/profit-dashboard", "/api/buyer-trust/B2"]
+    assert [r['event'] for r in audit_log.recent_violations(ip="10.0.0.1")] == ["REPLAY_DETECTED", "API_KEY_VIOLATION"]
+    assert [r['ip'] for r in audit_log.recent_violations(path="/api/buyer-trust")] == ["10.0.0.2", "10.0.0.1"]
+    assert audit_log.recent_violations(event="RATE_LIMIT_EXCEEDED")[0]['retry_after'] == 3
+    assert audit_log.recent_violations(ip="10.0.0.2", event="REPLAY_DETECTED") == []
+    assert audit_log.recent_violations(since=0) and audit_log.recent_violations(since=2 ** 40) == []
+
+
+def test_violation_queries_in_memory():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        audit_log = SecurityAuditLog(os.path.join(tmp_dir, 'security_audit.jsonl'))
+        _record_violations(audit_log)
+        _check_queries(audit_log)
+        audit_log.close()
+
+
+def test_violation_queries_shared_across_workers():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'violations.db')
+        worker = SecurityAuditLog(os.path.join(tmp_dir, 'security_audit.jsonl'), violations_db=db_path)
+        _record_violations(worker)
+        # Stopping the listener flushes the queued violations into SQLite
+        worker.close()
+
+        other_worker = SecurityAuditLog(os.path.join(tmp_dir, 'security_audit.jsonl'), violations_db=db_path)
+        _check_queries(other_worker)
+        other_worker.close()
+
+
+def test_shared_store_keeps_the_newest_violations():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        audit_log = SecurityAuditLog(os.path.join(tmp_dir, 'security_audit.jsonl'), recent_violations=10,
+                                     violations_db=os.path.join(tmp_dir, 'violations.db'))
+        audit_log.violation_store.prune_every = 5
+        for i in range(25):
+            audit_log.violation("API_KEY_VIOLATION", f"10.0.0.{i}", "/predict")
+        audit_log.close()
+        kept = audit_log.recent_violations(limit=100)
+        assert len(kept) == 10 and kept[0]['ip'] == "10.0.0.24"
+
+
+if __name__ == "__main__":
+    test_successes_are_sampled_and_violations_always_kept()
+    test_sampling_rate_bounds()
+    test_violation_queries_in_memory()
+    test_violation_queries_shared_across_workers()
+    test_shared_store_keeps_the_newest_violations()
@@ -0,0 +1,115 @@
+import os
+import tempfile
+
+from blockchain_engine import AgricultureBlockchain
+from merkle_tree import hash_transaction, merkle_root
+
+SEAL_KEY = 'test-seal-key'
+
+
+def _ledger(tmp_dir, **options):
+    return AgricultureBlockchain(storage_path=os.path.join(tmp_dir, 'trade_ledger.json'), **options)
+
+
+def _seal(ledger, count, start=0):
+    for i in range(start, start + count):
+        ledger.seal_trade(f"FARMER_{i:03d}", "BUYER_001", "Onion", 10, 2000 + i, order_id=f"ORD-{i}")
+
+
+def _append_pow_block(ledger, crop="Onion"):
+    # What anyone without the seal key can do: mine a hash-puzzle block on top
+    ledger.add_transaction("FARMER_X", "BUYER_X", crop, 999, 1)
+    last = ledger.last_block
+    return ledger.create_block(ledger.proof_of_work(last['proof']), ledger.hash(last))
+
+
+def test_poa_ledger_rejects_pow_blocks():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir, consensus='poa', seal_key=SEAL_KEY)
+        _seal(ledger, 3)
+        assert ledger.consensus_history == [[2, 'poa']]
+        assert ledger.verify_chain()
+
+        _append_pow_block(ledger)
+        assert not ledger.verify_chain()
+
+
+def test_rewritten_history_needs_the_seal_key():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir, consensus='poa', seal_key=SEAL_KEY)
+        _seal(ledger, 3)
+        # Rewrite block 3 and re-seal it (and its successor) with another key
+        forger = AgricultureBlockchain(storage_path=os.path.join(tmp_dir, 'forger.json'),
+                                       consensus='poa', seal_key='not-the-seal-key')
+        block = ledger.chain[2]
+        block['transactions'][0]['price'] = "Rs.1"
+        block['merkle_root'] = merkle_root([hash_transaction(tx) for tx in block['transactions']])
+        block['sealer'] = forger.sealer_id
+        block['signature'] = forger.sign_block(block, forger.seal_key)
+        ledger.chain[3]['previous_hash'] = ledger.hash(block)
+        assert not ledger.verify_chain()
+
+
+def test_switch_from_pow_keeps_old_blocks_valid():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        _seal(ledger, 2)
+        pow_height = ledger.height
+
+        switched = _ledger(tmp_dir, consensus='poa', seal_key=SEAL_KEY)
+        assert switched.consensus_history == [[pow_height + 1, 'poa']]
+        _seal(switched, 2, start=2)
+        assert switched.get_block(pow_height).get('consensus') is None
+        assert switched.get_block(pow_height + 1)['consensus'] == 'poa'
+        assert switched.verify_chain()
+
+        # The switch is persisted, so a restart keeps refusing PoW blocks above it
+        reopened = _ledger(tmp_dir, consensus='poa', seal_key=SEAL_KEY)
+        assert reopened.consensus_history == [[pow_height + 1, 'poa']]
+        _append_pow_block(reopened)
+        assert not reopened.verify_chain()
+
+
+def test_switch_is_derived_without_a_snapshot():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        _seal(ledger, 2)
+        poa = _ledger(tmp_dir, consensus='poa', seal_key=SEAL_KEY)
+        _seal(poa, 2, start=2)
+        os.remove(poa.archive.snapshot_path)
+
+        reopened = _ledger(tmp_dir, consensus='poa', seal_key=SEAL_KEY)
+        assert reopened.consensus_history == [[poa.consensus_history[0][0], 'poa']]
+        assert reopened.verify_chain()
+        _append_pow_block(reopened)
+        assert not reopened.verify_chain()
+
+
+def test_poa_block_without_merkle_root_is_rejected():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir, consensus='poa', seal_key=SEAL_KEY)
+        _seal(ledger, 2)
+        block = dict(ledger.last_block)
+        del block['merkle_root']
+        assert not ledger.valid_signature(block)
+        ledger.chain[-1] = block
+        assert not ledger.verify_chain()
+
+
+def test_retired_seal_keys_still_verify():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir, consensus='poa', seal_key='old-key')
+        _seal(ledger, 2)
+        rotated = _ledger(tmp_dir, consensus='poa', seal_key=SEAL_KEY, trusted_seal_keys=['old-key'])
+        _seal(rotated, 1, start=2)
+        assert rotated.verify_chain()
+        assert not _ledger(tmp_dir, consensus='poa', seal_key=SEAL_KEY).verify_chain()
+
+
+if __name__ == "__main__":
+    test_poa_ledger_rejects_pow_blocks()
+    test_rewritten_history_needs_the_seal_key()
+    test_switch_from_pow_keeps_old_blocks_valid()
+    test_switch_is_derived_without_a_snapshot()
+    test_poa_block_without_merkle_root_is_rejected()
+    test_retired_seal_keys_still_verify()
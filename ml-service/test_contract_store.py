@@ -0,0 +1,141 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+from contract_store import EscrowContractStore
+
+
+def _contract(contract_id, farmer_id="FARMER_001", buyer_id="BUYER_001", status='PAYMENT_LOCKED', created_at=1000.0):
+    return {
+        'id': contract_id, 'farmer_id': farmer_id, 'buyer_id': buyer_id, 'crop': "Onion",
+        'quantity': "10 Quintals", 'price': 2000.0, 'status': status, 'created_at': created_at,
+        'delivered_at': None, 'released_at': None
+    }
+
+
+def test_transition_is_guarded_by_the_current_status():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = EscrowContractStore(os.path.join(tmp_dir, 'contracts.db'))
+        store.create(_contract("SC-1"))
+
+        applied, contract = store.transition("SC-1", 'PAYMENT_LOCKED', 'DISPATCHED', dispatched_at=1100.0)
+        assert applied and contract['status'] == 'DISPATCHED' and contract['dispatched_at'] == 1100.0
+        applied, contract = store.transition("SC-1", 'PAYMENT_LOCKED', 'EXPIRED', expired_at=1200.0)
+        assert not applied and contract['status'] == 'DISPATCHED' and contract['expired_at'] is None
+        assert store.transition("SC-404", 'PAYMENT_LOCKED', 'DISPATCHED') == (False, None)
+
+
+def test_racing_transitions_only_one_wins():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'contracts.db')
+        store = EscrowContractStore(db_path)
+        store.create(_contract("SC-1"))
+        # A buyer-side release and the expiry timer race from separate connections
+        attempts = [('EXPIRED', {'expired_at': 1.0}), ('DISPATCHED', {'dispatched_at': 1.0})] * 4
+        start_gate = threading.Barrier(len(attempts))
+        results = []
+
+        def attempt(to_status, fields):
+            own_store = EscrowContractStore(db_path)
+            start_gate.wait()
+            applied, _ = own_store.transition("SC-1", 'PAYMENT_LOCKED', to_status, **fields)
+            results.append((applied, to_status))
+
+        threads = [threading.Thread(target=attempt, args=a) for a in attempts]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        winners = [to_status for applied, to_status in results if applied]
+        assert len(winners) == 1
+        assert store.get("SC-1")['status'] == winners[0]
+
+
+def test_transition_many_skips_contracts_in_other_states():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = EscrowContractStore(os.path.join(tmp_dir, 'contracts.db'))
+        store.create(_contract("SC-1"))
+        store.create(_contract("SC-2", status='DISPATCHED'))
+        store.create(_contract("SC-3"))
+
+        moved = store.transition_many(["SC-1", "SC-2", "SC-3", "SC-404"], 'PAYMENT_LOCKED', 'EXPIRED', expired_at=5.0)
+        assert [c['id'] for c in moved] == ["SC-1", "SC-3"]
+        assert all(c['status'] == 'EXPIRED' and c['expired_at'] == 5.0 for c in moved)
+        assert store.get("SC-2")['status'] == 'DISPATCHED'
+        # A second run (e.g. a retried timer batch) moves nothing
+        assert store.transition_many(["SC-1", "SC-3"], 'PAYMENT_LOCKED', 'EXPIRED', expired_at=6.0) == []
+        assert sorted(row[0] for row in store.iter_open()) == ["SC-2"]
+
+
+def test_list_contracts_pages_and_filters():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = EscrowContractStore(os.path.join(tmp_dir, 'contracts.db'))
+        for i in range(12):
+            store.create(_contract(f"SC-{i:02d}", buyer_id=f"BUYER_{i % 2}",
+                                   status='DISPATCHED' if i % 3 == 0 else 'PAYMENT_LOCKED', created_at=1000.0 + i))
+
+        page, total = store.list_contracts(limit=5)
+        assert total == 12 and [c['id'] for c in page] == [f"SC-{i:02d}" for i in range(11, 6, -1)]
+        page, total = store.list_contracts(limit=5, offset=10)
+        assert total == 12 and [c['id'] for c in page] == ["SC-01", "SC-00"]
+
+        page, total = store.list_contracts(buyer_id="BUYER_0", status='DISPATCHED')
+        assert total == 2 and [c['id'] for c in page] == ["SC-06", "SC-00"]
+        page, total = store.list_contracts(farmer_id="FARMER_404")
+        assert page == [] and total == 0
+        assert store.checkpoint() == {'DISPATCHED': 4, 'PAYMENT_LOCKED': 8}
+
+
+def test_old_schema_gains_the_added_columns():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'contracts.db')
+        conn = sqlite3.connect(db_path)
+        conn.execute(
+            "CREATE TABLE contracts (id TEXT PRIMARY KEY, farmer_id TEXT NOT NULL, buyer_id TEXT NOT NULL, "
+            "crop TEXT NOT NULL, quantity TEXT NOT NULL, price REAL NOT NULL, status TEXT NOT NULL, "
+            "created_at REAL NOT NULL, delivered_at REAL, released_at REAL)"
+        )
+        conn.execute("INSERT INTO contracts VALUES ('SC-OLD', 'F', 'B', 'Onion', '1 Quintals', 1.0, "
+                     "'PAYMENT_LOCKED', 1.0, NULL, NULL)")
+        conn.commit()
+        conn.close()
+
+        store = EscrowContractStore(db_path)
+        old = store.get("SC-OLD")
+        assert set(EscrowContractStore.ADDED_COLUMNS) <= set(old)
+        assert old['dispatched_at'] is None and old['expired_at'] is None
+        applied, contract = store.transition("SC-OLD", 'PAYMENT_LOCKED', 'DISPATCHED', dispatched_at=2.0)
+        assert applied and contract['dispatched_at'] == 2.0
+        # Re-opening an already migrated database is a no-op
+        assert EscrowContractStore(db_path).get("SC-OLD")['dispatched_at'] == 2.0
+
+
+def test_legacy_json_is_imported_once():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'contracts.db')
+        json_path = os.path.join(tmp_dir, 'trade_ledger_contracts.json')
+        legacy = {f"SC-{i}": _contract(f"SC-{i}") for i in range(3)}
+        with open(json_path, 'w') as f:
+            json.dump(legacy, f)
+
+        store = EscrowContractStore(db_path, legacy_json_path=json_path)
+        assert store.list_contracts()[1] == 3
+        assert not os.path.exists(json_path) and os.path.exists(json_path + '.migrated')
+
+        # A dump reappearing next to a populated database is left alone
+        with open(json_path, 'w') as f:
+            json.dump({"SC-NEW": _contract("SC-NEW")}, f)
+        store = EscrowContractStore(db_path, legacy_json_path=json_path)
+        assert store.get("SC-NEW") is None and store.list_contracts()[1] == 3
+        assert os.path.exists(json_path)
+
+
+if __name__ == "__main__":
+    test_transition_is_guarded_by_the_current_status()
+    test_racing_transitions_only_one_wins()
+    test_transition_many_skips_contracts_in_other_states()
+    test_list_contracts_pages_and_filters()
+    test_old_schema_gains_the_added_columns()
+    test_legacy_json_is_imported_once()
@@ -0,0 +1,69 @@
+import os
+import tempfile
+
+from blockchain_engine import AgricultureBlockchain
+from escrow_scheduler import EscrowTimeoutScheduler
+from ledger_writer import LedgerWriter
+
+LEDGER_OPTIONS = {'consensus': 'poa', 'seal_key': 'test-seal-key'}
+
+
+def _ledger(tmp_dir):
+    return AgricultureBlockchain(storage_path=os.path.join(tmp_dir, 'trade_ledger.json'), **LEDGER_OPTIONS)
+
+
+def test_refund_record_keeps_the_parties_roles():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        contract = ledger.initiate_smart_contract("FARMER_001", "BUYER_001", "Onion", 10, 2000)
+        ledger.expire_contracts([contract['id']])
+
+        refund = ledger.last_block['transactions'][-1]
+        assert refund['crop'] == "EXPIRED: Onion"
+        assert refund['farmer_id'] == "FARMER_001" and refund['buyer_id'] == "BUYER_001"
+        assert refund['direction'] == 'refund_to_buyer'
+
+        contract = ledger.initiate_smart_contract("FARMER_002", "BUYER_001", "Potato", 5, 900)
+        ledger.mark_as_dispatched(contract['id'])
+        ledger.auto_release_contracts([contract['id']])
+        release = ledger.last_block['transactions'][-1]
+        assert release['farmer_id'] == "FARMER_002" and release['direction'] == 'release_to_farmer'
+        assert ledger.verify_chain()
+
+
+def test_failed_timeout_batch_is_retried():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        writer = LedgerWriter(ledger)
+        scheduler = EscrowTimeoutScheduler(ledger, writer, dispatch_timeout=5)
+        contract = ledger.initiate_smart_contract("FARMER_001", "BUYER_001", "Onion", 10, 2000)
+        scheduler.track(contract)
+
+        expire = ledger.expire_contracts
+        failures = {'left': 1}
+
+        def flaky_expire(contract_ids):
+            if failures['left']:
+                failures['left'] -= 1
+                raise OSError("database is locked")
+            return expire(contract_ids)
+
+        ledger.expire_contracts = flaky_expire
+        try:
+            deadline = contract['created_at'] + 10
+            futures = scheduler.run_due(deadline)
+            assert len(futures) == 1 and futures[0].exception() is not None
+            assert ledger.contracts.get(contract['id'])['status'] == 'PAYMENT_LOCKED'
+
+            # The timer left the wheel, so only the retry queue can still expire it
+            for future in scheduler.run_due(deadline):
+                future.result()
+            assert ledger.contracts.get(contract['id'])['status'] == 'EXPIRED'
+            assert scheduler.run_due(deadline + 10) == []
+        finally:
+            writer.close()
+
+
+if __name__ == "__main__":
+    test_refund_record_keeps_the_parties_roles()
+    test_failed_timeout_batch_is_retried()
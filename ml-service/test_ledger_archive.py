@@ -0,0 +1,155 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from blockchain_engine import AgricultureBlockchain
+from ledger_archive import LedgerArchive
+
+
+def _ledger(tmp_dir, **options):
+    options = {'segment_size': 5, 'keep_tail': 2, 'snapshot_interval': 3,
+               'consensus': 'poa', 'seal_key': 'test-seal-key', **options}
+    return AgricultureBlockchain(storage_path=os.path.join(tmp_dir, 'trade_ledger.json'), **options)
+
+
+def _seal(ledger, count, start=0):
+    return [
+        ledger.seal_trade(f"FARMER_{i:03d}", "BUYER_001", "Onion", 10, 2000 + i, order_id=f"ORD-{i}")
+        for i in range(start, start + count)
+    ]
+
+
+def test_compaction_keeps_every_block_readable():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        receipts = _seal(ledger, 23)
+
+        assert ledger.archived_height == 20 and len(ledger.archive.segments) == 4
+        assert len(ledger.chain) < ledger.segment_size + ledger.keep_tail
+        for receipt in receipts:
+            block = ledger.get_block(receipt['block']['index'])
+            assert ledger.hash(block) == ledger.hash(receipt['block'])
+        assert [block['index'] for block in ledger.iter_blocks()] == list(range(1, ledger.height + 1))
+        assert ledger.verify_chain()
+
+        proof, error = ledger.get_inclusion_proof(3, 0)
+        assert error is None
+        assert AgricultureBlockchain.verify_inclusion_proof(
+            proof['tx_hash'], proof['proof'], proof['merkle_root'], proof['merkle_version']
+        )
+
+
+def test_restart_from_snapshot_replays_only_the_tail():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        _seal(ledger, 23)
+        assert ledger.verify_chain()
+
+        reloaded = _ledger(tmp_dir)
+        assert reloaded.height == ledger.height
+        assert reloaded.archived_height == ledger.archived_height
+        assert reloaded.verified_height == reloaded.height
+        assert reloaded.hash(reloaded.last_block) == ledger.hash(ledger.last_block)
+
+        # Idempotency survives the restart for archived and tail orders alike
+        for order in (0, 22):
+            retry = reloaded.seal_trade(f"FARMER_{order:03d}", "BUYER_001", "Onion", 10, 2000 + order,
+                                        order_id=f"ORD-{order}")
+            assert retry['duplicate']
+        assert reloaded.height == ledger.height
+        _seal(reloaded, 1, start=23)
+        assert reloaded.verify_chain()
+
+
+def test_restart_without_snapshot_recovers_from_the_archive():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        _seal(ledger, 23)
+        os.remove(ledger.archive.snapshot_path)
+
+        reloaded = _ledger(tmp_dir)
+        assert reloaded.archived_height == ledger.archived_height
+        assert reloaded.height == ledger.height
+        assert reloaded.seal_trade("FARMER_004", "BUYER_001", "Onion", 10, 2004, order_id="ORD-4")['duplicate']
+        assert reloaded.verify_chain()
+
+
+def test_restart_after_interrupted_compaction():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        _seal(ledger, 5)
+        stale_tail = os.path.join(tmp_dir, 'stale_tail.json')
+        shutil.copy(ledger.storage_path, stale_tail)
+        _seal(ledger, 1, start=5)
+        assert ledger.archived_height == 5
+
+        # Crash after the segment and snapshot were written but before the tail was:
+        # the old tail still holds the archived blocks and the newest block is lost
+        shutil.copy(stale_tail, ledger.storage_path)
+        reloaded = _ledger(tmp_dir)
+        assert reloaded.archived_height == 5
+        assert [block['index'] for block in reloaded.iter_blocks()] == list(range(1, 7))
+        assert reloaded.verify_chain()
+        _seal(reloaded, 1, start=6)
+        assert reloaded.verify_chain()
+
+
+def test_tampered_tail_is_not_trusted_after_restart():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir, snapshot_interval=1000)
+        _seal(ledger, 3)
+        with open(ledger.storage_path) as f:
+            tail = json.load(f)
+        tail[-2]['transactions'][0]['price'] = "Rs.1"
+        with open(ledger.storage_path, 'w') as f:
+            json.dump(tail, f)
+
+        reloaded = _ledger(tmp_dir, snapshot_interval=1000)
+        assert reloaded.verified_height < tail[-2]['index']
+        assert not reloaded.verify_chain()
+
+
+def test_keep_tail_must_hold_the_tip():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for options in ({'keep_tail': 0}, {'segment_size': 0}):
+            try:
+                _ledger(tmp_dir, **options)
+                assert False, f"expected ValueError for {options}"
+            except ValueError:
+                pass
+
+
+def test_segment_cache_survives_concurrent_readers():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        _seal(ledger, 40)
+        archive = LedgerArchive(ledger.archive.archive_dir, ledger.archive.snapshot_path, cache_segments=1)
+        errors = []
+
+        def reader(offset):
+            try:
+                for i in range(200):
+                    index = (i * 7 + offset) % ledger.archived_height + 1
+                    assert archive.read_block(index)['index'] == index
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=reader, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not errors, errors
+        assert len(archive._segment_cache) <= 1
+
+
+if __name__ == "__main__":
+    test_compaction_keeps_every_block_readable()
+    test_restart_from_snapshot_replays_only_the_tail()
+    test_restart_without_snapshot_recovers_from_the_archive()
+    test_restart_after_interrupted_compaction()
+    test_tampered_tail_is_not_trusted_after_restart()
+    test_keep_tail_must_hold_the_tip()
+    test_segment_cache_survives_concurrent_readers()
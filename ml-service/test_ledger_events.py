@@ -0,0 +1,82 @@
+import os
+import tempfile
+
+from blockchain_engine import AgricultureBlockchain
+from ledger_writer import LedgerWriter
+
+LEDGER_OPTIONS = {'consensus': 'poa', 'seal_key': 'test-seal-key'}
+
+
+def _ledger(tmp_dir):
+    return AgricultureBlockchain(storage_path=os.path.join(tmp_dir, 'trade_ledger.json'), **LEDGER_OPTIONS)
+
+
+def _saved_order_ids(ledger):
+    reloaded = AgricultureBlockchain(storage_path=ledger.storage_path, **LEDGER_OPTIONS)
+    return {tx.get('order_id') for block in reloaded.iter_blocks() for tx in block['transactions']}
+
+
+def test_events_are_delivered_after_the_block_is_saved():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        seen = []
+
+        def on_trade(tx):
+            # By the time a subscriber hears of the trade it is on disk
+            seen.append((tx['order_id'], tx['order_id'] in _saved_order_ids(ledger)))
+
+        ledger.subscribe('trade_sealed', on_trade)
+        ledger.seal_trade("FARMER_001", "BUYER_001", "Onion", 10, 2000, order_id="ORD-1")
+
+        writer = LedgerWriter(ledger)
+        futures = [
+            writer.submit(ledger.seal_trade, "FARMER_001", "BUYER_001", "Onion", 10, 2000 + i, order_id=f"ORD-{i}")
+            for i in range(2, 12)
+        ]
+        for future in futures:
+            future.result()
+        writer.close()
+        assert [order for order, _ in seen] == ["ORD-1"] + [f"ORD-{i}" for i in range(2, 12)]
+        assert all(saved for _, saved in seen)
+
+
+def test_failed_save_holds_events_back():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        seen = []
+        ledger.subscribe('trade_sealed', lambda tx: seen.append(tx['order_id']))
+        original_save = ledger._save_chain
+
+        def failing_save():
+            raise OSError("disk full")
+
+        ledger._save_chain = failing_save
+        try:
+            ledger.seal_trade("FARMER_001", "BUYER_001", "Onion", 10, 2000, order_id="ORD-1")
+            assert False, "expected OSError"
+        except OSError:
+            pass
+        assert seen == []
+
+        ledger._save_chain = original_save
+        ledger.seal_trade("FARMER_001", "BUYER_001", "Onion", 10, 2100, order_id="ORD-2")
+        assert seen == ["ORD-1", "ORD-2"]
+
+
+def test_integrity_seals_emit_no_trade_event():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        seen = []
+        ledger.subscribe('trade_sealed', lambda tx: seen.append(tx['crop']))
+        ledger.subscribe('contract_expired', lambda contract: seen.append(contract['status']))
+        ledger.seal_trade("FARMER_001", "BUYER_001", "Onion", 10, 2000, order_id="ORD-1")
+        ledger.seal_transaction_integrity("FARMER_001", "BUYER_001", "Onion", 10, 2000, "ORD-1")
+        contract = ledger.initiate_smart_contract("FARMER_001", "BUYER_001", "Potato", 5, 900)
+        ledger.expire_contracts([contract['id']])
+        assert seen == ["Onion", "EXPIRED"]
+
+
+if __name__ == "__main__":
+    test_events_are_delivered_after_the_block_is_saved()
+    test_failed_save_holds_events_back()
+    test_integrity_seals_emit_no_trade_event()
@@ -0,0 +1,61 @@
+import gzip
+import json
+import os
+import tempfile
+
+from blockchain_engine import AgricultureBlockchain
+
+LEDGER_OPTIONS = {'consensus': 'poa', 'seal_key': 'test-seal-key'}
+
+
+def _ledger(tmp_dir):
+    ledger = AgricultureBlockchain(storage_path=os.path.join(tmp_dir, 'trade_ledger.json'), **LEDGER_OPTIONS)
+    for i, farmer_id in enumerate(["FARMER_001", "FARMER_002", "FARMER_001", "FARMER_003"]):
+        ledger.seal_trade(farmer_id, f"BUYER_00{i}", "Onion", 10, 2000, order_id=f"ORD-{i}")
+    return ledger
+
+
+def _indexes(blocks):
+    return [block['index'] for block in blocks]
+
+
+def test_range_and_party_filters():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        assert _indexes(ledger.export_blocks()) == [1, 2, 3, 4, 5]
+        assert _indexes(ledger.export_blocks(start_block=3, end_block=4)) == [3, 4]
+        assert _indexes(ledger.export_blocks(party="FARMER_001")) == [2, 4]
+        assert _indexes(ledger.export_blocks(party="BUYER_003")) == [5]
+        assert _indexes(ledger.export_blocks(start_block=3, party="FARMER_001")) == [4]
+
+
+def test_time_window_tolerates_clock_steps():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        # The sealing clock jumped forward at block 3 and was corrected at block 4
+        for block, timestamp in zip(ledger.chain, [0.0, 100.0, 300.0, 200.0, 400.0]):
+            block['timestamp'] = timestamp
+
+        assert _indexes(ledger.export_blocks(since=50, until=250)) == [2, 4]
+        assert _indexes(ledger.export_blocks(since=250)) == [3, 5]
+        assert _indexes(ledger.export_blocks(until=50)) == [1]
+
+
+def test_ndjson_export_round_trips_plain_and_gzip():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        expected = list(ledger.export_blocks(party="FARMER_001"))
+
+        # A tiny chunk size forces several chunks through the streaming path
+        plain = b''.join(ledger.export_ndjson(chunk_size=64, party="FARMER_001"))
+        assert [json.loads(line) for line in plain.splitlines()] == expected
+
+        chunks = list(ledger.export_ndjson(compress=True, chunk_size=64, party="FARMER_001"))
+        assert gzip.decompress(b''.join(chunks)) == plain
+        assert gzip.decompress(b''.join(ledger.export_ndjson(compress=True, party="NOBODY"))) == b''
+
+
+if __name__ == "__main__":
+    test_range_and_party_filters()
+    test_time_window_tolerates_clock_steps()
+    test_ndjson_export_round_trips_plain_and_gzip()
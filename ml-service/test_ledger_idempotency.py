@@ -0,0 +1,110 @@
+import json
+import os
+import tempfile
+
+from blockchain_engine import AgricultureBlockchain, IdempotencyConflictError
+
+LEDGER_OPTIONS = {'consensus': 'poa', 'seal_key': 'test-seal-key'}
+
+
+def _ledger(tmp_dir, **options):
+    return AgricultureBlockchain(storage_path=os.path.join(tmp_dir, 'trade_ledger.json'),
+                                 **{**LEDGER_OPTIONS, **options})
+
+
+def _expect_conflict(call, *args, **kwargs):
+    try:
+        call(*args, **kwargs)
+    except IdempotencyConflictError:
+        return
+    assert False, "expected IdempotencyConflictError"
+
+
+def test_retry_returns_the_original_receipt():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        first = ledger.seal_trade("FARMER_001", "BUYER_001", "Onion", 10, 2000, order_id="ORD-1")
+        retry = ledger.seal_trade("FARMER_001", "BUYER_001", "Onion", 10.0, 2000.0, order_id="ORD-1")
+        assert retry['duplicate'] and retry['tx_hash'] == first['tx_hash']
+        assert ledger.height == first['block']['index']
+
+
+def test_reused_order_id_with_a_different_trade_is_rejected():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        ledger.seal_trade("FARMER_001", "BUYER_001", "Onion", 10, 2000, order_id="ORD-1")
+        height = ledger.height
+        _expect_conflict(ledger.seal_trade, "FARMER_001", "BUYER_001", "Onion", 10, 1, order_id="ORD-1")
+        _expect_conflict(ledger.seal_trade, "FARMER_001", "BUYER_002", "Onion", 10, 2000, order_id="ORD-1")
+        assert ledger.height == height
+
+        # The same check applies to trades still waiting in a batch
+        with ledger.batch():
+            ledger.seal_trade("FARMER_002", "BUYER_001", "Potato", 5, 900, idempotency_key="KEY-1")
+            _expect_conflict(ledger.seal_trade, "FARMER_002", "BUYER_001", "Potato", 6, 900,
+                             idempotency_key="KEY-1")
+        assert len(ledger.last_block['transactions']) == 1
+
+
+def test_integrity_seal_only_reports_hashes_on_the_ledger():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        sealed = ledger.seal_transaction_integrity("FARMER_001", "BUYER_001", "Onion", 10, 2000, "ORD-1")
+        assert ledger.seal_transaction_integrity("FARMER_001", "BUYER_001", "Onion", 10, 2000, "ORD-1") == sealed
+        _expect_conflict(ledger.seal_transaction_integrity, "FARMER_001", "BUYER_001", "Onion", 10, 9999, "ORD-1")
+
+        record = ledger.last_block['transactions'][0]
+        assert record['crop'] == "INTEGRITY_SEAL: Onion"
+        assert AgricultureBlockchain.integrity_hash("FARMER_001", "BUYER_001", "Onion", 10, 2000, "ORD-1") == sealed
+
+
+def test_client_keys_cannot_collide_with_internal_keys():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        contract = ledger.initiate_smart_contract("FARMER_001", "BUYER_001", "Onion", 10, 2000)
+        # A client picking the escrow timer's key must not pre-empt the refund record
+        ledger.seal_trade("FARMER_001", "BUYER_001", "Onion", 10, 2000,
+                          idempotency_key=f"escrow-timeout:{contract['id']}")
+        height = ledger.height
+        assert [c['id'] for c in ledger.expire_contracts([contract['id']])] == [contract['id']]
+        assert ledger.height == height + 1
+        assert ledger.last_block['transactions'][0]['crop'].startswith("EXPIRED:")
+
+
+def test_ledger_record_prefixes_are_reserved():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        for crop in ("INTEGRITY_SEAL: Onion", "EXPIRED: Onion", "RELEASED: Onion"):
+            try:
+                ledger.seal_trade("FARMER_001", "BUYER_001", crop, 1, 1, order_id="ORD-X")
+                assert False, f"expected ValueError for {crop}"
+            except ValueError:
+                pass
+
+
+def test_snapshots_do_not_grow_with_orders():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir, segment_size=5, keep_tail=2)
+        for i in range(30):
+            ledger.seal_trade("FARMER_001", "BUYER_001", "Onion", 10, 2000 + i, order_id=f"ORD-{i}")
+        snapshot = ledger.write_snapshot()
+        assert 'order_index' not in snapshot
+        assert all(os.path.exists(path.replace('.jsonl.gz', '.index.json')) for _, _, path in ledger.archive.segments)
+
+        # Archived orders keep their idempotency and conflict checks across a restart,
+        # also for archives written before the sidecars existed
+        os.remove(ledger.archive.segments[0][2].replace('.jsonl.gz', '.index.json'))
+        reloaded = _ledger(tmp_dir, segment_size=5, keep_tail=2)
+        assert reloaded.seal_trade("FARMER_001", "BUYER_001", "Onion", 10, 2000, order_id="ORD-0")['duplicate']
+        _expect_conflict(reloaded.seal_trade, "FARMER_001", "BUYER_001", "Onion", 10, 1, order_id="ORD-0")
+        with open(reloaded.archive.segments[0][2].replace('.jsonl.gz', '.index.json')) as f:
+            assert "trade:order:ORD-0" in json.load(f)
+
+
+if __name__ == "__main__":
+    test_retry_returns_the_original_receipt()
+    test_reused_order_id_with_a_different_trade_is_rejected()
+    test_integrity_seal_only_reports_hashes_on_the_ledger()
+    test_client_keys_cannot_collide_with_internal_keys()
+    test_ledger_record_prefixes_are_reserved()
+    test_snapshots_do_not_grow_with_orders()
@@ -0,0 +1,99 @@
+import tempfile
+import threading
+
+from ledger_shards import ShardedLedger
+
+LEDGER_OPTIONS = {'consensus': 'poa', 'seal_key': 'test-seal-key'}
+
+
+def test_shard_count_is_bounded():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        shards = ShardedLedger(tmp_dir, shard_by='commodity', shard_keys=['Onion', 'Potato'],
+                               shard_buckets=4, **LEDGER_OPTIONS)
+        try:
+            assert shards.shard_for(crop=" onion ") == 'onion'
+            assert shards.shard_for(crop="Potato") == 'potato'
+            assert shards.shard_for() == ShardedLedger.PRIMARY
+
+            names = {shards.shard_for(crop=f"crop-{i}") for i in range(500)}
+            assert names <= {f"bucket-{n:02d}" for n in range(4)}
+            assert shards.shard_for(crop="Dragon Fruit") == shards.shard_for(crop="dragon_fruit")
+
+            futures = [
+                shards.submit(shards.shard_for(crop=f"crop-{i}"), "seal_trade",
+                              "FARMER_001", "BUYER_001", f"crop-{i}", 1, 100, f"ORD-{i}")
+                for i in range(60)
+            ]
+            for future in futures:
+                future.result()
+            # Primary plus at most the four buckets, however many distinct crops arrive
+            assert len(shards.shards) <= 5
+        finally:
+            shards.close()
+
+
+def test_unbucketed_keys_fall_back_to_the_primary():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        shards = ShardedLedger(tmp_dir, shard_by='region', shard_keys=['Gujarat'], shard_buckets=0,
+                               **LEDGER_OPTIONS)
+        try:
+            assert shards.shard_for(region="Gujarat") == 'gujarat'
+            assert shards.shard_for(region="Anywhere Else") == ShardedLedger.PRIMARY
+        finally:
+            shards.close()
+
+
+def test_idempotent_retries_do_not_trigger_anchors():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        shards = ShardedLedger(tmp_dir, anchor_interval=3, **LEDGER_OPTIONS)
+        for _ in range(6):
+            shards.submit(ShardedLedger.PRIMARY, "seal_trade",
+                          "FARMER_001", "BUYER_001", "Onion", 1, 100, "ORD-SAME").result()
+        # Closing joins the shard writers (which run the counting callbacks) before the anchor writer
+        shards.close()
+        assert shards.anchor_ledger.height == 1
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        shards = ShardedLedger(tmp_dir, anchor_interval=3, **LEDGER_OPTIONS)
+        for i in range(3):
+            shards.submit(ShardedLedger.PRIMARY, "seal_trade",
+                          "FARMER_001", "BUYER_001", "Onion", 1, 100, f"ORD-{i}").result()
+        shards.close()
+        assert shards.anchor_ledger.height == 2
+        assert shards.latest_anchors[ShardedLedger.PRIMARY]['height'] >= 2
+
+
+def test_anchors_verify_while_new_anchors_land():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        shards = ShardedLedger(tmp_dir, shard_by='commodity', shard_buckets=8, **LEDGER_OPTIONS)
+        errors = []
+        stop = threading.Event()
+
+        def verifier():
+            try:
+                while not stop.is_set():
+                    shards.verify_anchors()
+            except Exception as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=verifier)
+        thread.start()
+        try:
+            for i in range(40):
+                shards.submit(shards.shard_for(crop=f"crop-{i}"), "seal_trade",
+                              "FARMER_001", "BUYER_001", f"crop-{i}", 1, 100, f"ORD-{i}").result()
+                shards.anchor().result()
+        finally:
+            stop.set()
+            thread.join()
+        assert not errors, errors
+        report = shards.verify_all()
+        shards.close()
+        assert report['is_valid'] and report['anchors_valid']
+
+
+if __name__ == "__main__":
+    test_shard_count_is_bounded()
+    test_unbucketed_keys_fall_back_to_the_primary()
+    test_idempotent_retries_do_not_trigger_anchors()
+    test_anchors_verify_while_new_anchors_land()
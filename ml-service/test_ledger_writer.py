@@ -0,0 +1,144 @@
+import os
+import tempfile
+import threading
+import time
+
+from blockchain_engine import AgricultureBlockchain
+from ledger_writer import LedgerPersistError, LedgerWriter
+from merkle_tree import hash_transaction
+
+WRITERS = 300
+TRADES_PER_WRITER = 4
+
+
+def _make_ledger(tmp_dir):
+    ledger = AgricultureBlockchain(storage_path=os.path.join(tmp_dir, 'trade_ledger.json'))
+    writes = {'count': 0}
+    original_save = ledger._save_chain
+
+    def counting_save():
+        writes['count'] += 1
+        original_save()
+
+    ledger._save_chain = counting_save
+    return ledger, writes
+
+
+def test_concurrent_writers_ordering_and_throughput():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger, writes = _make_ledger(tmp_dir)
+        writer = LedgerWriter(ledger, max_pending=4096)
+        receipts = {}
+        errors = []
+        start_gate = threading.Barrier(WRITERS)
+
+        def trader(writer_id):
+            try:
+                start_gate.wait()
+                for seq in range(TRADES_PER_WRITER):
+                    receipt = writer.submit(
+                        ledger.seal_trade,
+                        f"FARMER_{writer_id:03d}", "BUYER_STRESS", "Onion", 10, 2000 + seq,
+                        order_id=f"ORD-{writer_id}-{seq}"
+                    ).result(timeout=120)
+                    receipts[(writer_id, seq)] = receipt
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=trader, args=(i,)) for i in range(WRITERS)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        writer.close()
+
+        total = WRITERS * TRADES_PER_WRITER
+        assert not errors, errors
+        assert len(receipts) == total
+
+        # Every trade lands exactly once, at the position its receipt claims
+        sealed = [tx['order_id'] for block in ledger.iter_blocks() for tx in block['transactions']]
+        assert len(sealed) == total and len(set(sealed)) == total
+        for receipt in receipts.values():
+            block = ledger.get_block(receipt['block']['index'])
+            assert hash_transaction(block['transactions'][receipt['tx_index']]) == receipt['tx_hash']
+
+        # Per-writer submissions keep their order on the chain
+        for writer_id in range(WRITERS):
+            positions = [
+                (receipts[(writer_id, seq)]['block']['index'], receipts[(writer_id, seq)]['tx_index'])
+                for seq in range(TRADES_PER_WRITER)
+            ]
+            assert positions == sorted(positions)
+
+        # Batching: far fewer blocks and file writes than trades
+        assert writes['count'] == writer.batches_written
+        assert ledger.height - 1 < total
+        assert ledger.verify_chain()
+
+        # Reload from disk to make sure the persisted ledger is complete
+        reloaded = AgricultureBlockchain(storage_path=ledger.storage_path)
+        assert reloaded.height == ledger.height
+
+        throughput = total / elapsed
+        print(f"\n{total} trades from {WRITERS} writers in {elapsed:.2f}s "
+              f"({throughput:.0f} trades/s, {writer.batches_written} batches)")
+        assert throughput > 50
+
+
+def test_submission_order_is_preserved():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger, _ = _make_ledger(tmp_dir)
+        writer = LedgerWriter(ledger, max_batch=16)
+
+        futures = [
+            writer.submit(ledger.seal_trade, "FARMER_001", "BUYER_001", "Potato", 5, 1000, order_id=f"ORD-{i}")
+            for i in range(100)
+        ]
+        positions = [(f.result()['block']['index'], f.result()['tx_index']) for f in futures]
+        writer.close()
+
+        assert positions == sorted(positions)
+        assert len(set(positions)) == len(positions)
+        assert ledger.verify_chain()
+
+
+def test_failed_write_reports_applied_mutations_and_is_retried():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger, _ = _make_ledger(tmp_dir)
+        writer = LedgerWriter(ledger)
+        original_save = ledger._save_chain
+        failures = {'left': 1}
+
+        def flaky_save():
+            if failures['left']:
+                failures['left'] -= 1
+                raise OSError("disk full")
+            original_save()
+
+        ledger._save_chain = flaky_save
+        try:
+            writer.submit(ledger.seal_trade, "FARMER_001", "BUYER_001", "Onion", 10, 2000, order_id="ORD-1").result()
+            assert False, "expected LedgerPersistError"
+        except LedgerPersistError as e:
+            # The trade was sealed in memory; its receipt is handed back, not a bare failure
+            assert e.result['block'] is not None
+            sealed_at = e.result['block']['index']
+
+        # A retry is idempotent and the next batch writes the earlier block too
+        retry = writer.submit(ledger.seal_trade, "FARMER_001", "BUYER_001", "Onion", 10, 2000, order_id="ORD-1").result()
+        writer.submit(ledger.seal_trade, "FARMER_002", "BUYER_001", "Onion", 5, 2100, order_id="ORD-2").result()
+        writer.close()
+        assert retry['duplicate'] and retry['block']['index'] == sealed_at
+
+        reloaded = AgricultureBlockchain(storage_path=ledger.storage_path)
+        assert reloaded.height == ledger.height
+        assert [tx['order_id'] for block in reloaded.iter_blocks() for tx in block['transactions']] == ["ORD-1", "ORD-2"]
+
+
+if __name__ == "__main__":
+    test_concurrent_writers_ordering_and_throughput()
+    test_submission_order_is_preserved()
+    test_failed_write_reports_applied_mutations_and_is_retried()
@@ -0,0 +1,102 @@
+import asyncio
+
+from app.load_shedding import Bulkhead, LoadSheddingMiddleware
+
+
+def test_full_queue_is_shed():
+    async def scenario():
+        bulkhead = Bulkhead("heavy", r"^/heavy$", max_concurrent=1, max_queue=1, max_wait=1.0)
+        assert await bulkhead.acquire() is None
+        queued = asyncio.ensure_future(bulkhead.acquire())
+        await asyncio.sleep(0)
+        assert bulkhead.waiting == 1
+        assert await bulkhead.acquire() == 'queue_full'
+
+        bulkhead.release(0.01)
+        assert await queued is None
+        assert bulkhead.stats()['shed'] == {'queue_full': 1, 'wait_timeout': 0, 'latency': 0}
+        assert bulkhead.stats()['peak_queue_depth'] == 1
+
+    asyncio.run(scenario())
+
+
+def test_queued_request_times_out():
+    async def scenario():
+        bulkhead = Bulkhead("heavy", r"^/heavy$", max_concurrent=1, max_queue=4, max_wait=0.05)
+        assert await bulkhead.acquire() is None
+        assert await bulkhead.acquire() == 'wait_timeout'
+        assert bulkhead.waiting == 0 and bulkhead.in_flight == 1
+
+    asyncio.run(scenario())
+
+
+def test_slow_saturated_group_refuses_to_queue():
+    async def scenario():
+        bulkhead = Bulkhead("heavy", r"^/heavy$", max_concurrent=1, max_queue=4, target_latency=0.5)
+        assert await bulkhead.acquire() is None
+        bulkhead.release(2.0)
+        # Slow but idle: still admitted
+        assert await bulkhead.acquire() is None
+        # Slow and saturated: shed at once instead of queueing
+        assert await bulkhead.acquire() == 'latency'
+        assert bulkhead.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_bulkheads_match_on_path_and_method():
+    bulkhead = Bulkhead("trust", r"^/api/buyer-trust/[^/]+$", methods=("POST",))
+    assert bulkhead.matches("POST", "/api/buyer-trust/B1")
+    assert not bulkhead.matches("GET", "/api/buyer-trust/B1")
+    assert not bulkhead.matches("POST", "/api/buyer-trust/B1/incidents")
+    assert Bulkhead("any", r"^/api/export$").matches("GET", "/api/export")
+
+
+async def _request(middleware, method, path):
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'headers': [], 'query_string': b''}
+    await middleware(scope, receive, send)
+    start = messages[0]
+    return start['status'], {k.decode(): v.decode() for k, v in start.get('headers', [])}
+
+
+def test_middleware_sheds_with_retry_after():
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def app(scope, receive, send):
+            if scope['path'] == '/heavy':
+                await gate.wait()
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b'ok'})
+
+        bulkhead = Bulkhead("heavy", r"^/heavy$", max_concurrent=1, max_queue=0, methods=("POST",))
+        middleware = LoadSheddingMiddleware(app, [bulkhead])
+        running = asyncio.ensure_future(_request(middleware, "POST", "/heavy"))
+        await asyncio.sleep(0.01)
+
+        status, headers = await _request(middleware, "POST", "/heavy")
+        assert status == 503 and int(headers['retry-after']) >= 1
+        # Other routes and the cheap method on the same path are not limited
+        assert (await _request(middleware, "GET", "/cheap"))[0] == 200
+        gate.set()
+        assert (await running)[0] == 200
+        assert (await _request(middleware, "GET", "/heavy"))[0] == 200
+        assert bulkhead.in_flight == 0 and bulkhead.admitted == 1
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_full_queue_is_shed()
+    test_queued_request_times_out()
+    test_slow_saturated_group_refuses_to_queue()
+    test_bulkheads_match_on_path_and_method()
+    test_middleware_sheds_with_retry_after()
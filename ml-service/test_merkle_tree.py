@@ -0,0 +1,97 @@
+import hashlib
+import os
+import tempfile
+
+from blockchain_engine import AgricultureBlockchain
+from merkle_tree import _hash_leaf, _hash_node, merkle_proof, merkle_root, verify_merkle_proof
+
+
+def _tx_hashes(count):
+    return [hashlib.sha256(f"tx-{i}".encode()).hexdigest() for i in range(count)]
+
+
+def test_every_leaf_proves_against_the_root():
+    for count in range(1, 18):
+        hashes = _tx_hashes(count)
+        root = merkle_root(hashes)
+        for index, tx_hash in enumerate(hashes):
+            proof = merkle_proof(hashes, index)
+            assert verify_merkle_proof(tx_hash, proof, root)
+            if count > 1:
+                assert not verify_merkle_proof(hashes[index - 1], proof, root)
+
+
+def test_duplicated_tail_changes_the_root():
+    # CVE-2012-2459: [a, b, c] and [a, b, c, c] must not share a root
+    hashes = _tx_hashes(3)
+    assert merkle_root(hashes) != merkle_root(hashes + hashes[-1:])
+    assert merkle_root(hashes, version=1) == merkle_root(hashes + hashes[-1:], version=1)
+
+
+def test_inner_node_does_not_verify_as_a_leaf():
+    hashes = _tx_hashes(4)
+    root = merkle_root(hashes)
+    proof = merkle_proof(hashes, 0)
+    # Climb one level and try to pass the inner node off as a transaction
+    inner = _hash_node(_hash_leaf(hashes[0]), proof[0]['hash'])
+    assert not verify_merkle_proof(inner, proof[1:], root)
+    assert not verify_merkle_proof(root, [], root)
+
+
+def test_single_leaf_and_empty_proofs():
+    hashes = _tx_hashes(1)
+    root = merkle_root(hashes)
+    assert root != hashes[0]
+    assert merkle_proof(hashes, 0) == []
+    assert verify_merkle_proof(hashes[0], [], root)
+    assert not verify_merkle_proof(hashes[0], [], hashes[0])
+
+
+def test_unknown_positions_are_rejected():
+    hashes = _tx_hashes(2)
+    root = merkle_root(hashes)
+    proof = merkle_proof(hashes, 0)
+    assert proof[0]['position'] == 'right'
+    assert verify_merkle_proof(hashes[0], proof, root)
+    for position in ('Right', 'up', '', None):
+        assert not verify_merkle_proof(hashes[0], [dict(proof[0], position=position)], root)
+    assert not verify_merkle_proof(hashes[0], [{'hash': proof[0]['hash']}], root)
+    assert not verify_merkle_proof(hashes[0], proof, root, version=3)
+
+
+def test_ledger_keeps_verifying_legacy_blocks():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = AgricultureBlockchain(storage_path=os.path.join(tmp_dir, 'trade_ledger.json'))
+        # A block sealed before versioned roots: legacy root and no version field
+        ledger.add_transaction("FARMER_001", "BUYER_001", "Onion", 10, 2000)
+        ledger.add_transaction("FARMER_002", "BUYER_001", "Onion", 12, 2100)
+        ledger.add_transaction("FARMER_003", "BUYER_001", "Onion", 14, 2200)
+        legacy = ledger.create_block(ledger.proof_of_work(ledger.last_block['proof']), ledger.hash(ledger.last_block))
+        hashes = [ledger.get_inclusion_proof(legacy['index'], i)[0]['tx_hash'] for i in range(3)]
+        del legacy['merkle_version']
+        legacy['merkle_root'] = merkle_root(hashes, version=1)
+
+        receipt = ledger.seal_trade("FARMER_004", "BUYER_002", "Potato", 5, 1100, order_id="ORD-1")
+        assert receipt['block']['merkle_version'] == 2
+        assert ledger.verify_chain()
+
+        for block_index in (legacy['index'], receipt['block']['index']):
+            proof, error = ledger.get_inclusion_proof(block_index, 0)
+            assert error is None
+            assert proof['merkle_version'] == AgricultureBlockchain.merkle_version(ledger.get_block(block_index))
+            assert AgricultureBlockchain.verify_inclusion_proof(
+                proof['tx_hash'], proof['proof'], proof['merkle_root'], proof['merkle_version']
+            )
+
+        # Tampering with a sealed transaction breaks the Merkle commitment
+        receipt['block']['transactions'][0]['price'] = "Rs.1"
+        assert not ledger.verify_chain()
+
+
+if __name__ == "__main__":
+    test_every_leaf_proves_against_the_root()
+    test_duplicated_tail_changes_the_root()
+    test_inner_node_does_not_verify_as_a_leaf()
+    test_single_leaf_and_empty_proofs()
+    test_unknown_positions_are_rejected()
+    test_ledger_keeps_verifying_legacy_blocks()
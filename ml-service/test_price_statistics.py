@@ -0,0 +1,80 @@
+import math
+import os
+import random
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from price_statistics import PriceStatisticsStore, SlidingWindowMedian
+
+
+def test_concurrent_updates_snapshot_safely():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_path = os.path.join(tmp_dir, 'price_stats.json')
+        store = PriceStatisticsStore(snapshot_path=snapshot_path, snapshot_interval=1)
+        errors = []
+        start_gate = threading.Barrier(8)
+
+        def feeder(n):
+            try:
+                start_gate.wait()
+                for i in range(200):
+                    store.update(f"Market-{n}", "Onion", "Red", 2000 + i)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=feeder, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not errors, errors
+        assert not os.path.exists(snapshot_path + '.tmp')
+
+        store.write_snapshot()
+        reloaded = PriceStatisticsStore(snapshot_path=snapshot_path)
+        assert len(reloaded.series) == 8
+        assert all(stats.count == 200 for stats in reloaded.series.values())
+
+
+def test_sliding_median_and_mad_match_numpy():
+    rng = random.Random(41)
+    for window in (1, 2, 3, 8, 61):
+        tracker = SlidingWindowMedian(window)
+        recent = []
+        for _ in range(600):
+            # Few distinct values so ties and equal neighbours around the median are common
+            value = rng.choice([rng.randint(1, 12) * 50.0, rng.uniform(500, 3000)])
+            tracker.add(value)
+            recent = (recent + [value])[-window:]
+            expected_median = float(np.median(recent))
+            expected_mad = float(np.median(np.abs(np.array(recent) - expected_median)))
+            assert math.isclose(tracker.median(), expected_median, abs_tol=1e-9)
+            assert math.isclose(tracker.mad(), expected_mad, abs_tol=1e-9)
+
+
+def test_non_finite_prices_are_dropped():
+    store = PriceStatisticsStore(robust_window=3)
+    for price in [2000, float('nan'), 2100, float('inf'), "nan", 2200, 2300, -float('inf'), 2400]:
+        store.update("Lasalgaon", "Onion", "Red", price)
+    stats = store.get("Lasalgaon", "Onion", "Red")
+    assert stats.count == 5 and stats.last_price == 2400.0
+    assert list(store.get_window("Lasalgaon", "Onion", "Red").values) == [2200.0, 2300.0, 2400.0]
+
+    df = pd.DataFrame({
+        'Market': ["Pune"] * 4, 'Commodity': ["Onion"] * 4, 'Variety': ["Red"] * 4,
+        'Modal Price': [1000.0, float('inf'), float('nan'), 1200.0],
+        'Arrival Date': pd.to_datetime(["2026-01-01", "2026-01-02", "2026-01-03", "2026-01-04"]),
+    })
+    assert store.ingest_market_data(df) == 2
+    pune = store.get("Pune", "Onion", "Red")
+    assert pune.count == 2 and pune.mean == 1100.0
+    assert store.get_window("Pune", "Onion", "Red").median() == 1100.0
+
+
+if __name__ == "__main__":
+    test_concurrent_updates_snapshot_safely()
+    test_sliding_median_and_mad_match_numpy()
+    test_non_finite_prices_are_dropped()
@@ -0,0 +1,117 @@
+import os
+import tempfile
+
+from blockchain_engine import AgricultureBlockchain
+from profit_aggregates import FarmerProfitAggregates, ProfitAggregateStore
+
+LEDGER_OPTIONS = {'consensus': 'poa', 'seal_key': 'test-seal-key'}
+
+
+def test_ledger_records_are_not_crops():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = AgricultureBlockchain(storage_path=os.path.join(tmp_dir, 'trade_ledger.json'), **LEDGER_OPTIONS)
+        aggregates = FarmerProfitAggregates()
+        aggregates.subscribe_to(ledger)
+
+        ledger.seal_trade("FARMER_001", "BUYER_001", "Onion", 10, 2000, order_id="ORD-1")
+        ledger.seal_transaction_integrity("FARMER_001", "BUYER_001", "Onion", 10, 2000, "ORD-1")
+        contract = ledger.initiate_smart_contract("FARMER_001", "BUYER_001", "Onion", 5, 1800)
+        ledger.expire_contracts([contract['id']])
+        # Integrity and lifecycle rows, as a replay or an older ledger would deliver them
+        records = [tx for block in ledger.iter_blocks() for tx in block['transactions']
+                   if str(tx.get('crop', '')).startswith(('INTEGRITY_SEAL:', 'EXPIRED:'))]
+        assert len(records) == 2
+        for record in records:
+            aggregates._on_trade(record)
+
+        crops = aggregates.generate_dashboard("FARMER_001")['crop_analytics']
+        assert 'INTEGRITY_SEAL: Onion' not in crops
+        assert list(crops) == ['Onion']
+        assert crops['Onion']['Quantity_Quintals'] == 10
+
+
+def _ledger(tmp_dir):
+    return AgricultureBlockchain(storage_path=os.path.join(tmp_dir, 'trade_ledger.json'), **LEDGER_OPTIONS)
+
+
+def _quantities(aggregates, farmer_id):
+    dashboard = aggregates.generate_dashboard(farmer_id)
+    if dashboard is None:
+        return {}
+    return {crop: values['Quantity_Quintals'] for crop, values in dashboard['crop_analytics'].items()}
+
+
+def test_backfill_replays_blocks_missed_while_down():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        store_path = os.path.join(tmp_dir, 'profit_aggregates.db')
+        live = FarmerProfitAggregates(store=ProfitAggregateStore(store_path))
+        live.subscribe_to(ledger)
+        ledger.seal_trade("FARMER_001", "BUYER_001", "Onion", 10, 2000, order_id="ORD-1")
+        ledger.seal_trade("FARMER_001", "BUYER_002", "Onion", 4, 2100)
+        live.save_heights({'main': ledger.height})
+
+        # Sealed by a process whose aggregates were not listening (e.g. before a crash)
+        ledger = _ledger(tmp_dir)
+        ledger.seal_trade("FARMER_001", "BUYER_003", "Potato", 7, 900, order_id="ORD-2")
+        released = ledger.initiate_smart_contract("FARMER_002", "BUYER_001", "Wheat", 20, 2400)
+        ledger.mark_as_dispatched(released['id'])
+        ledger.confirm_delivery(released['id'])
+        ledger.initiate_smart_contract("FARMER_002", "BUYER_001", "Cotton", 3, 6500)
+        ledger.seal_trade("FARMER_003", "BUYER_001", "Tomato", 2, 1400)
+
+        restarted = FarmerProfitAggregates(store=ProfitAggregateStore(store_path))
+        assert restarted.heights == {'main': live.heights['main']}
+        assert restarted.catch_up({'main': ledger}) == 3
+        assert _quantities(restarted, "FARMER_001") == {'Onion': 14, 'Potato': 7}
+        # Only the released escrow counts; the open one waits for its release event
+        assert _quantities(restarted, "FARMER_002") == {'Wheat': 20}
+        assert restarted.heights['main'] == ledger.height
+
+        # Replaying everything again (e.g. a stale height after a crash) adds nothing
+        restarted.heights['main'] = 0
+        assert restarted.catch_up({'main': ledger}) == 0
+        assert _quantities(FarmerProfitAggregates(store=ProfitAggregateStore(store_path)), "FARMER_001") == \
+            {'Onion': 14, 'Potato': 7}
+
+
+def test_live_events_and_replay_agree():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        live = FarmerProfitAggregates()
+        live.subscribe_to(ledger)
+        ledger.seal_trade("FARMER_001", "BUYER_001", "Onion", 10, 2000)
+        contract = ledger.initiate_smart_contract("FARMER_001", "BUYER_001", "Onion", 5, 1800)
+        ledger.mark_as_dispatched(contract['id'])
+        ledger.auto_release_contracts([contract['id']])
+        ledger.seal_trade("FARMER_001", "BUYER_002", "Potato", 3, 1000, order_id="ORD-9")
+
+        assert live.catch_up({'main': ledger}) == 0
+        replayed = FarmerProfitAggregates()
+        assert replayed.catch_up({'main': ledger}) == 3
+        assert replayed.generate_dashboard("FARMER_001") == live.generate_dashboard("FARMER_001")
+
+
+def test_reported_orders_are_added_once():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store_path = os.path.join(tmp_dir, 'profit_aggregates.db')
+        aggregates = FarmerProfitAggregates(store=ProfitAggregateStore(store_path))
+        report = [('2025-01-10', 'Onion', 50, 1500, "MANDI-1"), ('2025-02-15', 'Potato', 100, 1100, "MANDI-2"),
+                  ('2025-02-15', 'Potato', 100, 1100, "MANDI-2")]
+        assert aggregates.add_transactions("FARMER_001", report) == 2
+        # A retried report, also after a restart
+        assert aggregates.add_transactions("FARMER_001", report) == 0
+        reloaded = FarmerProfitAggregates(store=ProfitAggregateStore(store_path))
+        assert reloaded.add_transactions("FARMER_001", report + [('2025-03-01', 'Onion', 5, 1600, "MANDI-3")]) == 1
+        assert _quantities(reloaded, "FARMER_001") == {'Onion': 55, 'Potato': 100}
+
+        in_memory = FarmerProfitAggregates()
+        assert in_memory.add_transactions("FARMER_001", report) == 2
+        assert in_memory.add_transactions("FARMER_001", report) == 0
+
+
+if __name__ == "__main__":
+    test_ledger_records_are_not_crops()
+    test_backfill_replays_blocks_missed_while_down()
+    test_live_events_and_replay_agree()
+    test_reported_orders_are_added_once()
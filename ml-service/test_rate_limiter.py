@@ -0,0 +1,31 @@
+import os
+import tempfile
+
+from app.rate_limiter import InMemoryRateLimitBackend, RateLimiter, SQLiteRateLimitBackend
+
+
+def _check_limits(backend):
+    limiter = RateLimiter(backend=backend, requests_per_minute=3, caller_limit=5, eviction_interval=0)
+    assert all(limiter.check("10.0.0.1", "/predict")[0] for _ in range(3))
+    # Per-route limit reached, other routes still open
+    assert not limiter.check("10.0.0.1", "/predict")[0]
+    assert limiter.check("10.0.0.1", "/forecast")[0]
+    assert limiter.check("10.0.0.1", "/forecast")[0]
+    # Per-IP limit over all routes: spreading requests across routes does not lift it
+    allowed, retry_after = limiter.check("10.0.0.1", "/ledger")
+    assert not allowed and retry_after >= 1
+    assert limiter.check("10.0.0.2", "/ledger")[0]
+
+
+def test_caller_and_route_limits_in_memory():
+    _check_limits(InMemoryRateLimitBackend())
+
+
+def test_caller_and_route_limits_sqlite():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _check_limits(SQLiteRateLimitBackend(os.path.join(tmp_dir, 'rate_limits.db')))
+
+
+if __name__ == "__main__":
+    test_caller_and_route_limits_in_memory()
+    test_caller_and_route_limits_sqlite()
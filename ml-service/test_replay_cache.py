@@ -0,0 +1,29 @@
+import os
+import tempfile
+
+from app.replay_cache import ReplayCache, SQLiteReplayCache
+
+
+def _check_nonces(cache):
+    now = 1_000_000
+    assert cache.check_and_add("nonce-aaaaaaaaaaaa", now, now=now)
+    # Identical requests differ only by nonce; both are fresh
+    assert cache.check_and_add("nonce-bbbbbbbbbbbb", now, now=now)
+    assert not cache.check_and_add("nonce-aaaaaaaaaaaa", now, now=now)
+    # Buckets older than the window are dropped
+    assert cache.check_and_add("nonce-cccccccccccc", now + 400, now=now + 400)
+    assert len(cache) == 1
+
+
+def test_nonces_are_single_use_in_memory():
+    _check_nonces(ReplayCache(window_seconds=300))
+
+
+def test_nonces_are_single_use_sqlite():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _check_nonces(SQLiteReplayCache(os.path.join(tmp_dir, 'replay.db'), window_seconds=300))
+
+
+if __name__ == "__main__":
+    test_nonces_are_single_use_in_memory()
+    test_nonces_are_single_use_sqlite()
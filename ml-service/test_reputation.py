@@ -0,0 +1,45 @@
+import time
+
+from reputation import ReputationPropagator
+from trade_graph import TradeGraphIndex
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def test_lookups_never_solve_inline():
+    graph = TradeGraphIndex()
+    graph.add_trade("FARMER_1", "BUYER_1", 100)
+    reputation = ReputationPropagator(graph)
+    calls = []
+    original = reputation.refresh
+    reputation.refresh = lambda force=False: calls.append(force) or original(force)
+
+    assert reputation.reputation("BUYER_1") is None and reputation.top() == []
+    assert calls == []
+    reputation.refresh(force=True)
+    assert reputation.reputation("BUYER_1") is not None
+
+
+def test_background_thread_picks_up_new_trades():
+    graph = TradeGraphIndex()
+    graph.add_trade("FARMER_1", "BUYER_1", 100)
+    reputation = ReputationPropagator(graph, min_interval=0.05)
+    reputation.start()
+    try:
+        _wait_for(lambda: reputation.reputation("BUYER_1") is not None)
+        assert reputation.reputation("BUYER_2") is None
+        graph.add_trade("FARMER_1", "BUYER_2", 100)
+        # The previous solution is served until the background re-solve lands
+        _wait_for(lambda: reputation.reputation("BUYER_2") is not None)
+    finally:
+        reputation.close()
+
+
+if __name__ == "__main__":
+    test_lookups_never_solve_inline()
+    test_background_thread_picks_up_new_trades()
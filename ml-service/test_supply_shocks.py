@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from arrival_monitor import ArrivalChangePointDetector
+from gap_analyzer import DemandSupplyGapAnalyzer
+
+
+def _arrivals(market, start, days=14):
+    # Ten steady days, then arrivals quadruple
+    return [
+        {'Market': market, 'Commodity': 'Onion', 'Arrival Quantity': 100.0 if day < 10 else 400.0,
+         'Arrival Date': start + timedelta(days=day)}
+        for day in range(days)
+    ]
+
+
+def test_replay_only_delivers_shocks_inside_the_horizon():
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    df = pd.DataFrame(_arrivals('Old Mandi', today - timedelta(days=90))
+                      + _arrivals('New Mandi', today - timedelta(days=13)))
+    gap_engine = DemandSupplyGapAnalyzer(model_dir='missing-models')
+    monitor = ArrivalChangePointDetector()
+    for event_type in ArrivalChangePointDetector.EVENTS:
+        monitor.subscribe(event_type, gap_engine.on_supply_shock)
+
+    since = today - timedelta(days=DemandSupplyGapAnalyzer.SHOCK_HORIZON_DAYS)
+    events = monitor.replay(df, emit=True, emit_since=since)
+    assert {event['market'] for event in events} == {'Old Mandi', 'New Mandi'}
+    # The old change point still resets its series' regime, but is never pushed
+    assert ('old mandi', 'onion') not in gap_engine.supply_shocks
+    assert gap_engine.recent_supply_shock('New Mandi', 'Onion')['event'] == 'SUPPLY_SURGE'
+
+
+def test_undated_shock_is_stale():
+    gap_engine = DemandSupplyGapAnalyzer(model_dir='missing-models')
+    gap_engine.on_supply_shock({'market': 'Mandi', 'commodity': 'Onion', 'date': None, 'event': 'SUPPLY_DROP'})
+    assert gap_engine.recent_supply_shock('Mandi', 'Onion') is None
+    gap_engine.on_supply_shock({'market': 'Mandi', 'commodity': 'Onion', 'date': 'not a date', 'event': 'SUPPLY_DROP'})
+    assert gap_engine.recent_supply_shock('Mandi', 'Onion') is None
+
+
+if __name__ == "__main__":
+    test_replay_only_delivers_shocks_inside_the_horizon()
+    test_undated_shock_is_stale()
@@ -0,0 +1,80 @@
+import os
+import tempfile
+
+from blockchain_engine import AgricultureBlockchain
+from trade_graph import TradeGraphIndex
+
+LEDGER_OPTIONS = {'consensus': 'poa', 'seal_key': 'test-seal-key'}
+
+
+def _ledger(tmp_dir):
+    return AgricultureBlockchain(storage_path=os.path.join(tmp_dir, 'trade_ledger.json'), **LEDGER_OPTIONS)
+
+
+def test_each_order_counts_once():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        graph = TradeGraphIndex()
+        graph.subscribe_to(ledger)
+        ledger.seal_trade("FARMER_001", "BUYER_001", "Onion", 10, 2000, order_id="ORD-1")
+        ledger.seal_transaction_integrity("FARMER_001", "BUYER_001", "Onion", 10, 2000, "ORD-1")
+        contract = ledger.initiate_smart_contract("FARMER_001", "BUYER_001", "Potato", 5, 900)
+        ledger.mark_as_dispatched(contract['id'])
+        ledger.confirm_delivery(contract['id'])
+        # Contract rows wait for the next sealed block
+        ledger.seal_trade("FARMER_002", "BUYER_002", "Onion", 1, 100, order_id="ORD-2")
+        assert graph.pair("FARMER_001", "BUYER_001")['trades'] == 2
+
+        # Replaying the same history (integrity seal, contract row, lifecycle rows) adds nothing
+        assert graph.build_from_ledger(ledger) == 0
+        assert graph.pair("FARMER_001", "BUYER_001")['trades'] == 2
+
+        fresh = TradeGraphIndex()
+        assert fresh.build_from_ledger(ledger) == 3
+        assert fresh.pair("FARMER_001", "BUYER_001")['trades'] == 2
+        assert fresh.suspicion("FARMER_001") == graph.suspicion("FARMER_001")
+
+
+def test_restart_replays_only_blocks_above_the_snapshot():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = _ledger(tmp_dir)
+        snapshot_path = os.path.join(tmp_dir, 'trade_graph.npz')
+        for i in range(5):
+            ledger.seal_trade("FARMER_A", "BUYER_B", "Onion", 1, 100, order_id=f"ORD-{i}")
+            ledger.seal_trade("BUYER_B", "FARMER_A", "Onion", 1, 100, order_id=f"ORD-R{i}")
+        graph = TradeGraphIndex(snapshot_path=snapshot_path)
+        assert graph.catch_up({'main': ledger}) == 10
+        graph.write_snapshot()
+
+        ledger.seal_trade("FARMER_A", "BUYER_C", "Onion", 1, 100, order_id="ORD-NEW")
+        reloaded = TradeGraphIndex(snapshot_path=snapshot_path)
+        assert reloaded.heights == {'main': ledger.height - 1}
+        assert reloaded.catch_up({'main': ledger}) == 1
+        assert reloaded.pair("FARMER_A", "BUYER_B") == graph.pair("FARMER_A", "BUYER_B")
+        assert reloaded.suspicion("FARMER_A") == graph.suspicion("FARMER_A")
+        assert reloaded.pair("FARMER_A", "BUYER_C")['trades'] == 1
+
+        # Reverse trades are still found against restored edges
+        findings = reloaded.add_trade("BUYER_C", "FARMER_A", 100)
+        assert any(finding['pattern'] == 'SHORT_CYCLE' for finding in findings)
+
+
+def test_replaced_ledger_rebuilds_the_graph():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_path = os.path.join(tmp_dir, 'trade_graph.npz')
+        graph = TradeGraphIndex(snapshot_path=snapshot_path)
+        graph.heights = {'main': 50}
+        graph.add_trade("FARMER_OLD", "BUYER_OLD", 100)
+        graph.write_snapshot()
+
+        ledger = _ledger(tmp_dir)
+        ledger.seal_trade("FARMER_001", "BUYER_001", "Onion", 1, 100, order_id="ORD-1")
+        reloaded = TradeGraphIndex(snapshot_path=snapshot_path)
+        assert reloaded.catch_up({'main': ledger}) == 1
+        assert reloaded.suspicion("FARMER_OLD") is None
+
+
+if __name__ == "__main__":
+    test_each_order_counts_once()
+    test_restart_replays_only_blocks_above_the_snapshot()
+    test_replaced_ledger_rebuilds_the_graph()
@@ -0,0 +1,150 @@
+import os
+import random
+import tempfile
+
+import pandas as pd
+
+from blockchain_engine import AgricultureBlockchain
+from trust_engine import BuyerTrustEngine
+from trust_store import BuyerTrustStore
+
+LEDGER_OPTIONS = {'consensus': 'poa', 'seal_key': 'test-seal-key'}
+
+
+def _deals(engine, buyer_id):
+    history = engine.history(buyer_id)
+    return history['total_deals'], history['completed_deals']
+
+
+def test_each_order_is_one_deal():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = AgricultureBlockchain(storage_path=os.path.join(tmp_dir, 'trade_ledger.json'), **LEDGER_OPTIONS)
+        store_path = os.path.join(tmp_dir, 'buyer_trust.db')
+        engine = BuyerTrustEngine(store=BuyerTrustStore(store_path))
+        engine.subscribe_to(ledger)
+
+        ledger.seal_trade("FARMER_001", "BUYER_001", "Onion", 10, 2000, order_id="ORD-1")
+        ledger.seal_transaction_integrity("FARMER_001", "BUYER_001", "Onion", 10, 2000, "ORD-1")
+        # An integrity seal reported as a trade (older ledgers emitted one) is still no deal
+        engine._on_trade(dict(ledger.last_block['transactions'][0]))
+        assert _deals(engine, "BUYER_001") == (1, 1)
+
+        contract = ledger.initiate_smart_contract("FARMER_001", "BUYER_001", "Potato", 5, 900)
+        # The escrowed order also sealed as a trade under its contract id
+        ledger.seal_trade("FARMER_001", "BUYER_001", "Potato", 5, 900, order_id=contract['id'])
+        assert _deals(engine, "BUYER_001") == (1, 1)
+        ledger.mark_as_dispatched(contract['id'])
+        ledger.confirm_delivery(contract['id'])
+        assert _deals(engine, "BUYER_001") == (2, 2)
+
+        # Counted orders survive a restart
+        reloaded = BuyerTrustEngine(store=BuyerTrustStore(store_path))
+        reloaded._on_trade({'buyer_id': "BUYER_001", 'crop': "Onion", 'order_id': "ORD-1"})
+        reloaded._on_trade({'buyer_id': "BUYER_001", 'crop': "Potato", 'order_id': contract['id']})
+        assert _deals(reloaded, "BUYER_001") == (2, 2)
+
+
+def test_in_memory_engine_dedupes_orders():
+    engine = BuyerTrustEngine()
+    for _ in range(3):
+        engine._on_trade({'buyer_id': "BUYER_001", 'crop': "Onion", 'order_id': "ORD-1"})
+    engine._on_trade({'buyer_id': "BUYER_001", 'crop': "Onion", 'order_id': None})
+    assert _deals(engine, "BUYER_001") == (2, 2)
+
+
+def test_open_escrows_do_not_lower_the_score():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ledger = AgricultureBlockchain(storage_path=os.path.join(tmp_dir, 'trade_ledger.json'), **LEDGER_OPTIONS)
+        engine = BuyerTrustEngine()
+        engine.subscribe_to(ledger)
+
+        # A new buyer whose only order is an open escrow scores like a buyer with no deals
+        contract = ledger.initiate_smart_contract("FARMER_001", "BUYER_NEW", "Onion", 10, 2000)
+        assert _deals(engine, "BUYER_NEW") == (0, 0)
+        fresh = engine.calculate_buyer_score("BUYER_NEW", engine.history("BUYER_NEW"))
+        assert engine.score_buyer("BUYER_NEW")['trust_metrics']['score'] == fresh['trust_metrics']['score']
+        assert engine.score_buyer("BUYER_NEW")['breakdown']['performance'] == "50%"
+        ledger.mark_as_dispatched(contract['id'])
+        ledger.confirm_delivery(contract['id'])
+        assert _deals(engine, "BUYER_NEW") == (1, 1)
+        assert engine.score_buyer("BUYER_NEW")['breakdown']['performance'] == "100.0%"
+
+        # An established buyer opening several escrows keeps a 100% success rate
+        for i in range(10):
+            ledger.seal_trade("FARMER_002", "BUYER_OLD", "Potato", 5, 900, order_id=f"ORD-{i}")
+        before = engine.score_buyer("BUYER_OLD")['trust_metrics']['score']
+        contracts = [ledger.initiate_smart_contract("FARMER_002", "BUYER_OLD", "Potato", 5, 900) for _ in range(5)]
+        assert engine.score_buyer("BUYER_OLD")['trust_metrics']['score'] == before
+        # Expired escrows were never dispatched and are not held against the buyer either
+        ledger.expire_contracts([c['id'] for c in contracts[:2]])
+        ledger.mark_as_dispatched(contracts[2]['id'])
+        ledger.auto_release_contracts([contracts[2]['id']])
+        assert _deals(engine, "BUYER_OLD") == (11, 11)
+        assert engine.history("BUYER_OLD")['delayed_payments'] == 1
+
+
+def _random_histories(n, seed=46):
+    rng = random.Random(seed)
+    histories = []
+    for i in range(n):
+        total = rng.choice([0, 1, 2, rng.randint(3, 400)])
+        completed = rng.randint(0, total)
+        payments = [rng.randint(0, completed) for _ in range(3)] if rng.random() > 0.05 else [0, 0, 0]
+        histories.append({
+            'buyer_id': f"BUYER_{i:05d}", 'total_deals': total, 'completed_deals': completed,
+            'on_time_payments': payments[0], 'delayed_payments': payments[1], 'failed_payments': payments[2],
+            'disputes_raised_by_farmers': rng.choice([0, 0, 1, 2, rng.randint(3, 12)]),
+            'years_on_platform': rng.choice([0.0, rng.uniform(0, 6)]),
+        })
+    return histories
+
+
+def test_bulk_scores_match_single_scores():
+    engine = BuyerTrustEngine()
+    histories = _random_histories(3000)
+    result = engine.score_buyers_bulk(histories)
+    assert result['total'] == 3000 and sum(result['rank_counts'].values()) == 3000
+    for history, entry in zip(histories, result['buyers']):
+        single = engine.calculate_buyer_score(history['buyer_id'], history)
+        assert entry['buyer_id'] == history['buyer_id']
+        assert abs(entry['score'] - single['trust_metrics']['score']) < 1e-6, (history, entry)
+        assert entry['rank'] == single['trust_metrics']['rank']
+        assert entry['risk_level'] == single['trust_metrics']['risk_level']
+        assert entry['interpretation'] == single['interpretation']
+
+    # Columns and the API's disputes_count alias score the same
+    columns = pd.DataFrame(histories).rename(columns={'disputes_raised_by_farmers': 'disputes_count'})
+    assert engine.score_buyers_bulk(columns.to_dict('list'))['buyers'] == result['buyers']
+
+
+def test_top_and_bottom_selection():
+    engine = BuyerTrustEngine()
+    # Few distinct histories so many buyers tie on score
+    histories = _random_histories(400, seed=7)
+    for i, history in enumerate(histories):
+        if i % 3:
+            history.update({k: v for k, v in histories[i % 17].items() if k != 'buyer_id'})
+    raw = engine.score_columns(pd.DataFrame(histories))['score'].tolist()
+    by_score = sorted(range(len(histories)), key=lambda i: (-raw[i], i))
+    by_lowest = sorted(range(len(histories)), key=lambda i: (raw[i], i))
+
+    for k in (1, 25, 399, 400, 1000):
+        top = [entry['buyer_id'] for entry in engine.score_buyers_bulk(histories, top_k=k)['buyers']]
+        bottom = [entry['buyer_id'] for entry in engine.score_buyers_bulk(histories, top_k=k, lowest=True)['buyers']]
+        assert top == [histories[i]['buyer_id'] for i in by_score[:k]]
+        assert bottom == [histories[i]['buyer_id'] for i in by_lowest[:k]]
+
+    for bad in (0, -1, "2", 1.5, True):
+        try:
+            engine.score_buyers_bulk(histories, top_k=bad)
+        except ValueError:
+            continue
+        raise AssertionError(f"top_k={bad!r} was accepted")
+
+
+if __name__ == "__main__":
+    test_each_order_is_one_deal()
+    test_in_memory_engine_dedupes_orders()
+    test_open_escrows_do_not_lower_the_score()
+    test_bulk_scores_match_single_scores()
+    test_top_and_bottom_selection()
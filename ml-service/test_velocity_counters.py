@@ -0,0 +1,103 @@
+import os
+import tempfile
+
+import numpy as np
+
+from velocity_counters import VelocityCounters
+
+# Midnight, so minute/hour/day buckets all start together
+START = 86400.0 * 20000
+
+
+def test_window_counts_per_resolution():
+    counters = VelocityCounters()
+    for i in range(20):
+        counters.record("BUYER_001", 'deal', START + i * 60)
+    now = START + 19 * 60
+    deal = counters.counts("BUYER_001", now)['deal']
+    # The 15-bucket minute ring covers minutes 5..19
+    assert deal == {'minute': 15, 'hour': 20, 'day': 20, 'total': 20}
+    assert counters.counts("BUYER_001", now + 20 * 60)['deal']['minute'] == 0
+
+    counters.record("BUYER_001", 'failed_payment', START + 3600 * 5)
+    counters.record("BUYER_001", 'cancellation', START + 86400 * 2, count=3)
+    now = START + 86400 * 2
+    counts = counters.counts("BUYER_001", now)
+    assert counts['deal'] == {'minute': 0, 'hour': 0, 'day': 20, 'total': 20}
+    assert counts['failed_payment'] == {'minute': 0, 'hour': 0, 'day': 1, 'total': 1}
+    assert counts['cancellation']['minute'] == 3
+    assert counters.counts("BUYER_404", now) is None
+
+    # Eight days later only the lifetime totals remain
+    later = counters.counts("BUYER_001", START + 86400 * 10)
+    assert later['deal'] == {'minute': 0, 'hour': 0, 'day': 0, 'total': 20}
+
+
+def test_wrapped_buckets_are_cleared_on_the_next_write():
+    counters = VelocityCounters(minute_buckets=4, hour_buckets=2, day_buckets=2)
+    for minute in range(4):
+        counters.record("U1", 'deal', START + minute * 60)
+    row = counters._index["U1"]
+    assert counters._rings['minute'][row, 0].tolist() == [1, 1, 1, 1]
+
+    # Minute 6 wraps onto the slots of minutes 2 (now 6) and 3 is kept; 4 and 5 clear 0 and 1
+    counters.record("U1", 'failed_payment', START + 6 * 60)
+    assert counters._rings['minute'][row, 0].tolist() == [0, 0, 0, 1]
+    assert counters._rings['minute'][row, 2].tolist() == [0, 0, 1, 0]
+    assert counters.counts("U1", START + 6 * 60)['deal']['minute'] == 1
+
+    # A gap longer than the ring clears every bucket of every kind
+    counters.record("U1", 'cancellation', START + 30 * 60)
+    assert counters._rings['minute'][row].sum() == 1
+    # Late events older than the ring are counted in the total only
+    counters.record("U1", 'deal', START)
+    assert counters._rings['minute'][row].sum() == 1
+    assert counters.counts("U1", START + 30 * 60)['deal']['total'] == 5
+
+
+def test_short_buckets_saturate_and_arrays_grow():
+    counters = VelocityCounters(initial_capacity=2)
+    counters.record("BOT", 'deal', START, count=300)
+    counters.record("BOT", 'deal', START)
+    assert counters.counts("BOT", START)['deal'] == {'minute': 255, 'hour': 255, 'day': 301, 'total': 301}
+
+    for i in range(5):
+        counters.record(f"U{i}", 'deal', START)
+    assert len(counters) == 6 and counters.capacity >= 6
+    known, columns = counters.behavior_columns(["U4", "NOBODY", "BOT"], START)
+    assert known.tolist() == [True, False, True]
+    assert columns['total_deals'].tolist() == [1, 0, 301]
+    assert columns['burst_deals'].tolist() == [1, 0, 255]
+
+
+def test_snapshot_round_trip():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_path = os.path.join(tmp_dir, 'velocity_counters.npz')
+        counters = VelocityCounters(snapshot_path=snapshot_path)
+        for i in range(12):
+            counters.record(f"BUYER_{i % 3}", 'deal', START + i * 90)
+        counters.record("BUYER_1", 'failed_payment', START + 600)
+        counters.write_snapshot()
+        assert not os.path.exists(snapshot_path + '.tmp')
+
+        restored = VelocityCounters(snapshot_path=snapshot_path)
+        now = START + 1200
+        assert len(restored) == 3
+        for user_id in ("BUYER_0", "BUYER_1", "BUYER_2"):
+            assert restored.counts(user_id, now) == counters.counts(user_id, now)
+        # Recording keeps working on the restored arrays
+        restored.record("BUYER_1", 'deal', now)
+        assert restored.counts("BUYER_1", now)['deal']['total'] == 5
+
+        # A different ring layout keeps the lifetime totals only
+        resized = VelocityCounters(minute_buckets=5, snapshot_path=snapshot_path)
+        counts = resized.counts("BUYER_1", now)
+        assert counts['deal']['total'] == 4 and counts['deal']['day'] == 0
+        assert np.array_equal(resized._totals[:3], counters._totals[:3])
+
+
+if __name__ == "__main__":
+    test_window_counts_per_resolution()
+    test_wrapped_buckets_are_cleared_on_the_next_write()
+    test_short_buckets_saturate_and_arrays_grow()
+    test_snapshot_round_trip()
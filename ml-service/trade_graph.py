@@ -0,0 +1,377 @@
+import os
+import re
+import threading
+from array import array
+from collections import deque
+from time import time
+
+import numpy as np
+
+from blockchain_engine import AgricultureBlockchain
+
+
+class TradeGraphIndex:
+    """
+    Incrementally maintained directed trade graph (farmer -> buyer) for
+    wash-trading and collusion checks.
+
+    Users are interned to integer nodes; each node keeps dicts of out- and
+    in-neighbours mapping to an edge id, and edge counts, values and
+    timestamps live in flat typed arrays. Every new trade is checked
+    against its neighbourhood only, never by rescanning the ledger:
+
+    - SHORT_CYCLE: the trade closes a cycle of length 2 or 3
+      (B already sold to A, or B -> C -> A exists)
+    - DENSE_PAIR: the pair carries an outsized share of either side's trades
+    - RAPID_REVERSAL: the reverse trade happened within `rapid_window` seconds
+
+    The graph is snapshotted to .npz together with the ledger heights it
+    covers, so a restart only replays blocks sealed after the snapshot.
+    """
+
+    PATTERNS = ('SHORT_CYCLE', 'DENSE_PAIR', 'RAPID_REVERSAL')
+    # Escrow lifecycle rows repeat the opening trade (or refund it) and integrity seals
+    # re-record one; neither is a new trade
+    SKIPPED_PREFIXES = (AgricultureBlockchain.INTEGRITY_PREFIX,) + AgricultureBlockchain.LIFECYCLE_PREFIXES
+
+    def __init__(self, dense_pair_min_trades=10, dense_pair_share=0.6, rapid_window=3600,
+                 max_cycles_reported=10, recent_findings=5000, snapshot_path=None):
+        """
+        Args:
+            dense_pair_min_trades (int): Trades on a pair before density is judged
+            dense_pair_share (float): Share of a party's trades that makes a pair dense
+            rapid_window (float): Seconds within which a reverse trade counts as back-and-forth
+            max_cycles_reported (int): 3-cycles listed per trade (all are counted)
+            recent_findings (int): Findings kept in memory for querying
+            snapshot_path (str): .npz file the graph is persisted to
+        """
+        self.dense_pair_min_trades = dense_pair_min_trades
+        self.dense_pair_share = dense_pair_share
+        self.rapid_window = rapid_window
+        self.max_cycles_reported = max_cycles_reported
+        self.snapshot_path = snapshot_path
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=recent_findings)
+        self.version = 0  # bumped on every indexed trade, for consumers that cache derived results
+        self._clear()
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.load_snapshot()
+
+    def _clear(self):
+        self.heights = {}      # ledger name -> height already indexed
+        self._orders = set()   # order / contract ids already indexed, so each order counts once
+        self._node_index = {}  # user id -> node
+        self._nodes = []
+        self._out = []  # node -> {buyer node: edge}
+        self._in = []   # node -> {farmer node: edge}
+        self._sold = array('q')
+        self._bought = array('q')
+        self._pattern_counts = {pattern: array('q') for pattern in self.PATTERNS}
+
+        self._edge_src = array('q')
+        self._edge_dst = array('q')
+        self._edge_count = array('q')
+        self._edge_value = array('d')
+        self._edge_first = array('d')
+        self._edge_last = array('d')
+
+    def __len__(self):
+        return len(self._nodes)
+
+    @property
+    def edge_count(self):
+        return len(self._edge_count)
+
+    def _node(self, user_id):
+        node = self._node_index.get(user_id)
+        if node is None:
+            node = self._node_index[user_id] = len(self._nodes)
+            self._nodes.append(user_id)
+            self._out.append({})
+            self._in.append({})
+            self._sold.append(0)
+            self._bought.append(0)
+            for counts in self._pattern_counts.values():
+                counts.append(0)
+        return node
+
+    def _edge(self, u, v, timestamp):
+        edge = self._out[u].get(v)
+        if edge is None:
+            edge = self._out[u][v] = self._in[v][u] = len(self._edge_count)
+            self._edge_src.append(u)
+            self._edge_dst.append(v)
+            self._edge_count.append(0)
+            self._edge_value.append(0.0)
+            self._edge_first.append(timestamp)
+            self._edge_last.append(timestamp)
+        return edge
+
+    def add_trade(self, farmer_id, buyer_id, value=0.0, timestamp=None):
+        """
+        Adds one sealed trade and returns the findings it triggers
+        (dicts with 'pattern', 'users' and pattern details).
+        """
+        timestamp = time() if timestamp is None else float(timestamp)
+        farmer_id, buyer_id = str(farmer_id), str(buyer_id)
+        if farmer_id == buyer_id:
+            return []
+        with self._lock:
+            u, v = self._node(farmer_id), self._node(buyer_id)
+            edge = self._edge(u, v, timestamp)
+            self._edge_count[edge] += 1
+            self._edge_value[edge] += float(value)
+            self._edge_first[edge] = min(self._edge_first[edge], timestamp)
+            self._edge_last[edge] = max(self._edge_last[edge], timestamp)
+            self._sold[u] += 1
+            self._bought[v] += 1
+            self.version += 1
+
+            findings = []
+            reverse = self._out[v].get(u)
+            if reverse is not None:
+                # v already sold to u: u -> v -> u
+                findings.append({
+                    'pattern': 'SHORT_CYCLE', 'users': [farmer_id, buyer_id],
+                    'repetitions': min(self._edge_count[edge], self._edge_count[reverse])
+                })
+                if abs(timestamp - self._edge_last[reverse]) <= self.rapid_window:
+                    findings.append({
+                        'pattern': 'RAPID_REVERSAL', 'users': [farmer_id, buyer_id],
+                        'seconds_apart': round(abs(timestamp - self._edge_last[reverse]), 1)
+                    })
+
+            # u -> v -> w -> u: buyers of v that also sold to u; scan the smaller side
+            v_out, u_in = self._out[v], self._in[u]
+            smaller, larger = (v_out, u_in) if len(v_out) <= len(u_in) else (u_in, v_out)
+            cycles = 0
+            for w in smaller:
+                if w in larger and w != u and w != v:
+                    cycles += 1
+                    if cycles <= self.max_cycles_reported:
+                        findings.append({
+                            'pattern': 'SHORT_CYCLE', 'users': [farmer_id, buyer_id, self._nodes[w]],
+                            'repetitions': min(self._edge_count[edge], self._edge_count[v_out[w]],
+                                               self._edge_count[u_in[w]])
+                        })
+
+            count = self._edge_count[edge]
+            if count >= self.dense_pair_min_trades:
+                share = max(count / self._sold[u], count / self._bought[v])
+                if share >= self.dense_pair_share:
+                    findings.append({
+                        'pattern': 'DENSE_PAIR', 'users': [farmer_id, buyer_id],
+                        'trades': count, 'share': round(share, 3), 'value': round(self._edge_value[edge], 2)
+                    })
+
+            for finding in findings:
+                for user_id in finding['users']:
+                    self._pattern_counts[finding['pattern']][self._node_index[user_id]] += 1
+                finding['timestamp'] = timestamp
+                self._recent.append(finding)
+        return findings
+
+    # --- QUERIES ---
+
+    def pair(self, farmer_id, buyer_id):
+        """Edge statistics for farmer -> buyer, or None if they never traded."""
+        with self._lock:
+            u, v = self._node_index.get(str(farmer_id)), self._node_index.get(str(buyer_id))
+            edge = self._out[u].get(v) if u is not None and v is not None else None
+            if edge is None:
+                return None
+            return {
+                'trades': self._edge_count[edge],
+                'value': self._edge_value[edge],
+                'first_trade': self._edge_first[edge],
+                'last_trade': self._edge_last[edge]
+            }
+
+    def suspicion(self, user_id):
+        """{pattern: findings involving the user}, or None for an unknown user."""
+        with self._lock:
+            node = self._node_index.get(str(user_id))
+            if node is None:
+                return None
+            return {pattern: counts[node] for pattern, counts in self._pattern_counts.items()}
+
+    def suspicion_columns(self, user_ids):
+        """suspicion() for many users at once: {pattern: int array}, zero for unknown users."""
+        with self._lock:
+            nodes = np.fromiter(
+                (self._node_index.get(str(user_id), -1) for user_id in user_ids), dtype=np.int64, count=len(user_ids)
+            )
+            known = nodes >= 0
+            columns = {}
+            for pattern, counts in self._pattern_counts.items():
+                values = np.frombuffer(counts, dtype=np.int64) if len(counts) else np.zeros(1, dtype=np.int64)
+                columns[pattern] = np.where(known, values[np.where(known, nodes, 0)], 0)
+        return columns
+
+    def edge_arrays(self):
+        """
+        Consistent snapshot of the graph as arrays: (user ids by node,
+        farmer nodes, buyer nodes, trade counts), one entry per pair.
+        """
+        with self._lock:
+            return (
+                list(self._nodes),
+                np.array(self._edge_src, dtype=np.int64),
+                np.array(self._edge_dst, dtype=np.int64),
+                np.array(self._edge_count, dtype=np.int64),
+            )
+
+    def recent_findings(self, user_id=None, pattern=None, limit=100):
+        """Newest-first findings, optionally for one user or pattern."""
+        with self._lock:
+            records = list(self._recent)
+        matches = []
+        for finding in reversed(records):
+            if user_id is not None and str(user_id) not in finding['users']:
+                continue
+            if pattern is not None and finding['pattern'] != pattern:
+                continue
+            matches.append(finding)
+            if len(matches) >= limit:
+                break
+        return matches
+
+    # --- LEDGER FEED ---
+
+    @staticmethod
+    def _trade_value(record):
+        price = record.get('price')
+        if isinstance(price, str):
+            match = re.search(r'\d+(?:\.\d+)?', price.replace(',', ''))
+            price = float(match.group()) if match else 0.0
+        return float(price or 0.0)
+
+    @classmethod
+    def is_trade(cls, record):
+        # Anchors and other sealed records carry no parties
+        return bool(record.get('farmer_id') and record.get('buyer_id')) \
+            and not str(record.get('crop', '')).startswith(cls.SKIPPED_PREFIXES)
+
+    @staticmethod
+    def order_key(record):
+        # Ledger rows carry the order id; an escrow contract's id is also the order id of its opening row
+        return record.get('order_id') or record.get('id')
+
+    def add_record(self, record):
+        """
+        Adds a ledger transaction or escrow contract; lifecycle, integrity and
+        non-trade rows are skipped, as is an order that was already indexed.
+        """
+        if not self.is_trade(record):
+            return []
+        order = self.order_key(record)
+        if order is not None:
+            with self._lock:
+                if order in self._orders:
+                    return []
+                self._orders.add(order)
+        return self.add_trade(
+            record['farmer_id'], record['buyer_id'], self._trade_value(record),
+            record.get('timestamp') or record.get('created_at')
+        )
+
+    def build_from_ledger(self, ledger, name='main'):
+        """
+        Indexes a ledger's sealed history above the height already covered for
+        `name`. Returns trades indexed.
+        """
+        indexed_before = self.version
+        for block in ledger.iter_blocks(start=self.heights.get(name, 0) + 1):
+            for record in block['transactions']:
+                self.add_record(record)
+        self.heights[name] = max(self.heights.get(name, 0), ledger.height)
+        return self.version - indexed_before
+
+    def catch_up(self, ledgers):
+        """
+        Brings the graph up to date with {name: ledger} at startup, replaying
+        only blocks above the snapshot. A ledger now shorter than its snapshot
+        height was replaced, so the graph is rebuilt from scratch.
+        """
+        if any(ledger.height < self.heights.get(name, 0) for name, ledger in ledgers.items()):
+            with self._lock:
+                self._clear()
+        return sum(self.build_from_ledger(ledger, name) for name, ledger in ledgers.items())
+
+    def subscribe_to(self, ledger):
+        """Keeps the graph current from an AgricultureBlockchain or ShardedLedger."""
+        ledger.subscribe('trade_sealed', self.add_record)
+        ledger.subscribe('contract_initiated', self.add_record)
+
+    # --- SNAPSHOT ---
+
+    def write_snapshot(self, heights=None):
+        """
+        Persists the graph. Pass {name: ledger height} when the ledgers have
+        moved on since catch_up(); only take it while no trades are being
+        sealed (startup, shutdown), so the heights match the indexed trades.
+        """
+        with self._lock:
+            if heights is not None:
+                self.heights = dict(heights)
+            arrays = {
+                'nodes': np.array(self._nodes, dtype=str),
+                'orders': np.array(sorted(self._orders), dtype=str),
+                'height_names': np.array(list(self.heights), dtype=str),
+                'height_values': np.array(list(self.heights.values()), dtype=np.int64),
+                'sold': np.array(self._sold, dtype=np.int64),
+                'bought': np.array(self._bought, dtype=np.int64),
+            }
+            for pattern, counts in self._pattern_counts.items():
+                arrays[f'pattern_{pattern}'] = np.array(counts, dtype=np.int64)
+            for name in ('src', 'dst', 'count'):
+                arrays[f'edge_{name}'] = np.array(getattr(self, f'_edge_{name}'), dtype=np.int64)
+            for name in ('value', 'first', 'last'):
+                arrays[f'edge_{name}'] = np.array(getattr(self, f'_edge_{name}'), dtype=float)
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self.snapshot_path)
+
+    def load_snapshot(self):
+        try:
+            with np.load(self.snapshot_path) as snapshot:
+                arrays = {name: snapshot[name] for name in snapshot.files}
+        except (OSError, ValueError):
+            return False
+        with self._lock:
+            self._clear()
+            for user_id in arrays['nodes'].tolist():
+                self._node(user_id)
+            self._sold = array('q', arrays['sold'].tolist())
+            self._bought = array('q', arrays['bought'].tolist())
+            for pattern in self.PATTERNS:
+                self._pattern_counts[pattern] = array('q', arrays[f'pattern_{pattern}'].tolist())
+            for name, typecode in (('src', 'q'), ('dst', 'q'), ('count', 'q'),
+                                   ('value', 'd'), ('first', 'd'), ('last', 'd')):
+                setattr(self, f'_edge_{name}', array(typecode, arrays[f'edge_{name}'].tolist()))
+            for edge, (u, v) in enumerate(zip(self._edge_src, self._edge_dst)):
+                self._out[u][v] = self._in[v][u] = edge
+            self._orders = set(arrays['orders'].tolist())
+            self.heights = dict(zip(arrays['height_names'].tolist(), arrays['height_values'].tolist()))
+        return True
+
+
+if __name__ == "__main__":
+    graph = TradeGraphIndex(dense_pair_min_trades=5)
+    now = time()
+
+    # Two accounts trading the same lot back and forth, and a three-party ring
+    for i in range(3):
+        graph.add_trade("FARMER_A", "BUYER_B", 2000, now + i * 600)
+        for finding in graph.add_trade("BUYER_B", "FARMER_A", 2000, now + i * 600 + 120):
+            print(finding)
+    graph.add_trade("F1", "F2", 1500, now)
+    graph.add_trade("F2", "F3", 1500, now)
+    print(graph.add_trade("F3", "F1", 1500, now))
+
+    # A buyer that only ever trades with one farmer
+    for i in range(5):
+        findings = graph.add_trade("FARMER_X", "BUYER_Y", 900, now + i * 86400)
+    print(findings)
+    print("Suspicion FARMER_A:", graph.suspicion("FARMER_A"))
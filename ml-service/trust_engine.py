@@ -1,6 +1,13 @@
 
 import json
+import threading
 from datetime import datetime
+from time import time
+
+import numpy as np
+import pandas as pd
+
+from blockchain_engine import AgricultureBlockchain
 
 class BuyerTrustEngine:
     """
@@ -16,9 +23,31 @@ class BuyerTrustEngine:
         'market_longevity': 0.10         # Trust established over time
     }
 
-    def __init__(self):
-        # In a real system, this would be a database connection.
-        self.buyer_profiles = {}
+    # Materialized aggregates kept per buyer, in BuyerTrustStore.COLUMNS order
+    AGGREGATE_FIELDS = (
+        'total_deals', 'completed_deals', 'on_time_payments', 'delayed_payments',
+        'failed_payments', 'disputes_raised_by_farmers', 'first_seen'
+    )
+    INCIDENTS = {'failed_payment': 'failed_payments', 'dispute': 'disputes_raised_by_farmers'}
+    # Integrity seals re-record an existing order and lifecycle rows track an escrow; neither is a deal
+    SKIPPED_PREFIXES = (AgricultureBlockchain.INTEGRITY_PREFIX,) + AgricultureBlockchain.LIFECYCLE_PREFIXES
+
+    def __init__(self, store=None, on_time_window=48 * 3600):
+        """
+        Args:
+            store (BuyerTrustStore): Persistence for the per-buyer aggregates (None keeps them in memory)
+            on_time_window (float): Seconds after dispatch within which a confirmed release counts as on time
+        """
+        self.store = store
+        self.on_time_window = on_time_window
+        self._lock = threading.Lock()
+        self._field_index = {field: i for i, field in enumerate(self.AGGREGATE_FIELDS)}
+        # buyer id -> aggregate values (AGGREGATE_FIELDS order), restored from the store
+        self.buyer_profiles = store.load_all() if store is not None else {}
+        # buyer id -> (day computed, calculate_buyer_score result); dropped on every update
+        self._score_cache = {}
+        # Orders already counted as a deal, when there is no store to remember them
+        self._counted_orders = set()
 
     def calculate_buyer_score(self, buyer_id, history):
         """
@@ -96,6 +125,249 @@ class BuyerTrustEngine:
             }
         }
 
+    # --- MATERIALIZED AGGREGATES ---
+
+    def _apply(self, buyer_id, changes, timestamp=None, order_id=None):
+        """
+        Adds `changes` ({field: delta}) to a buyer's aggregates, persists them and drops the cached score.
+        With `order_id`, the changes are applied only the first time that order is seen.
+        """
+        buyer_id = str(buyer_id)
+        timestamp = time() if timestamp is None else float(timestamp)
+        index = self._field_index
+        with self._lock:
+            if order_id is not None:
+                order_id = str(order_id)
+                counted = self.store.has_order(order_id) if self.store is not None else order_id in self._counted_orders
+                if counted:
+                    return
+                if self.store is None:
+                    self._counted_orders.add(order_id)
+            values = self.buyer_profiles.get(buyer_id)
+            if values is None:
+                values = self.buyer_profiles[buyer_id] = [0] * (len(self.AGGREGATE_FIELDS) - 1) + [timestamp]
+            for field, delta in changes.items():
+                values[index[field]] = max(0, values[index[field]] + delta)
+            values[-1] = min(values[-1], timestamp)
+            self._score_cache.pop(buyer_id, None)
+            if self.store is not None:
+                self.store.save(buyer_id, values, order_id)
+
+    def _history(self, buyer_id, now):
+        values = self.buyer_profiles.get(buyer_id)
+        if values is None:
+            return None
+        history = dict(zip(self.AGGREGATE_FIELDS[:-1], values[:-1]))
+        history['years_on_platform'] = max(0.0, now - values[-1]) / (365.25 * 86400)
+        return history
+
+    def history(self, buyer_id, now=None):
+        """The calculate_buyer_score history for a buyer from its aggregates, or None if never seen."""
+        with self._lock:
+            return self._history(str(buyer_id), time() if now is None else now)
+
+    def score_buyer(self, buyer_id, now=None):
+        """
+        calculate_buyer_score from the materialized aggregates, or None for
+        an unknown buyer. Scores are cached until the buyer's next update
+        (or the next day, as platform longevity keeps growing).
+        """
+        buyer_id = str(buyer_id)
+        now = time() if now is None else now
+        day = int(now // 86400)
+        cached = self._score_cache.get(buyer_id)
+        if cached is not None and cached[0] == day:
+            return cached[1]
+        # Computed under the lock so a concurrent update cannot be overwritten by a stale score
+        with self._lock:
+            history = self._history(buyer_id, now)
+            if history is None:
+                return None
+            result = self.calculate_buyer_score(buyer_id, history)
+            self._score_cache[buyer_id] = (day, result)
+        return result
+
+    def aggregate_scores(self, now=None):
+        """(buyer ids, unrounded scores) for every buyer with aggregates, scored in one vectorized pass."""
+        now = time() if now is None else now
+        with self._lock:
+            ids = list(self.buyer_profiles)
+            values = np.array(list(self.buyer_profiles.values()), dtype=float)
+        values = values.reshape(len(ids), len(self.AGGREGATE_FIELDS))
+        histories = dict(zip(self.AGGREGATE_FIELDS[:-1], values[:, :-1].T))
+        histories['years_on_platform'] = np.maximum(0.0, now - values[:, -1]) / (365.25 * 86400)
+        return ids, self.score_columns(histories)['score']
+
+    def record_incident(self, buyer_id, kind, timestamp=None):
+        """Counts a failed payment or a farmer-raised dispute, which the ledger does not record."""
+        if kind not in self.INCIDENTS:
+            raise ValueError(f"Unknown trust incident: {kind}")
+        self._apply(buyer_id, {self.INCIDENTS[kind]: 1}, timestamp)
+
+    def subscribe_to(self, ledger):
+        """
+        Keeps the aggregates current from an AgricultureBlockchain or
+        ShardedLedger. A direct sealed trade is a completed deal. An escrow
+        contract only counts once it resolves: a release is a completed deal
+        paid on time if the buyer confirmed within `on_time_window` of
+        dispatch, an auto-release one paid late. Open escrows stay out of the
+        success rate, and expired ones were never dispatched, so neither is
+        held against the buyer. Each order (order id, or contract id for
+        escrow) opens one deal only, however many events report it.
+        """
+        ledger.subscribe('trade_sealed', self._on_trade)
+        ledger.subscribe('contract_initiated', self._on_contract_initiated)
+        ledger.subscribe('contract_released', self._on_contract_released)
+        ledger.subscribe('contract_auto_released', self._on_contract_auto_released)
+
+    def _on_trade(self, record):
+        if str(record.get('crop', '')).startswith(self.SKIPPED_PREFIXES):
+            return
+        self._apply(record['buyer_id'], {'total_deals': 1, 'completed_deals': 1}, record.get('timestamp'),
+                    order_id=record.get('order_id'))
+
+    def _on_contract_initiated(self, contract):
+        # Registers the buyer and claims the order (so a trade sealed under the contract id
+        # is not a second deal); the deal itself is counted when the escrow resolves
+        self._apply(contract['buyer_id'], {}, contract.get('created_at'), order_id=contract.get('id'))
+
+    def _on_contract_released(self, contract):
+        dispatched_at = contract.get('dispatched_at') or contract['created_at']
+        on_time = (contract['released_at'] or time()) - dispatched_at <= self.on_time_window
+        self._apply(contract['buyer_id'], {
+            'total_deals': 1, 'completed_deals': 1, 'on_time_payments' if on_time else 'delayed_payments': 1
+        }, contract.get('created_at'))
+
+    def _on_contract_auto_released(self, contract):
+        self._apply(contract['buyer_id'], {'total_deals': 1, 'completed_deals': 1, 'delayed_payments': 1},
+                    contract.get('created_at'))
+
+    # --- BULK SCORING ---
+
+    HISTORY_FIELDS = (
+        'total_deals', 'completed_deals', 'on_time_payments', 'delayed_payments',
+        'failed_payments', 'disputes_raised_by_farmers', 'years_on_platform'
+    )
+    # Rank bands in calculate_buyer_score order: (min score, rank, risk, interpretation)
+    RANKS = (
+        (85, "HIGHLY TRUSTED", "Low", "Reliable buyer with excellent payment history and zero disputes."),
+        (60, "MODERATELY TRUSTED", "Medium", "Consistent buyer with occasional logistics/payment delays."),
+        (float('-inf'), "LOW TRUST", "High",
+         "High frequency of payment failures or farmer disputes. Proceed with caution."),
+    )
+
+    def score_columns(self, histories):
+        """
+        calculate_buyer_score for N buyers at once. `histories` maps each
+        HISTORY_FIELDS name to an array-like of length N.
+
+        Returns float arrays for the four factor scores and the weighted
+        total (unrounded), plus `rank_code`, an index into RANKS. Every step
+        repeats the scalar arithmetic in the same order, so scores and ranks
+        are identical to the per-buyer call.
+        """
+        h = {field: np.asarray(histories[field], dtype=float) for field in self.HISTORY_FIELDS}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            success_rate = np.where(h['total_deals'] > 0, h['completed_deals'] / h['total_deals'] * 100, 50.0)
+            total_payments = h['on_time_payments'] + h['delayed_payments'] + h['failed_payments']
+            payment_score = np.where(
+                total_payments > 0,
+                ((h['on_time_payments'] * 1.0) + (h['delayed_payments'] * 0.4) - (h['failed_payments'] * 2.0))
+                / total_payments * 100,
+                50.0
+            )
+        payment_score = np.clip(payment_score, 0, 100)
+        dispute_score = np.maximum(0, 100 - h['disputes_raised_by_farmers'] * 15)
+        longevity_score = np.minimum(100, (h['years_on_platform'] / 3.0) * 100)
+
+        final_score = (
+            (success_rate * self.WEIGHTS['transaction_success_rate']) +
+            (payment_score * self.WEIGHTS['payment_punctuality']) +
+            (dispute_score * self.WEIGHTS['dispute_impact']) +
+            (longevity_score * self.WEIGHTS['market_longevity'])
+        )
+        rank_code = np.full(len(final_score), len(self.RANKS) - 1, dtype=np.int8)
+        for code in range(len(self.RANKS) - 2, -1, -1):
+            rank_code[final_score >= self.RANKS[code][0]] = code
+        return {
+            'success_rate': success_rate,
+            'payment_score': payment_score,
+            'dispute_score': dispute_score,
+            'longevity_score': longevity_score,
+            'score': final_score,
+            'rank_code': rank_code,
+        }
+
+    @staticmethod
+    def _select(score, k, lowest=False):
+        """
+        Indices of the k best (or worst) scores, best first, ties kept in
+        input order. O(N) selection with argpartition; only the k chosen
+        rows are sorted.
+        """
+        n = len(score)
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if k >= n:
+            chosen = np.arange(n)
+        else:
+            key = score if lowest else -score
+            boundary = key[np.argpartition(key, k - 1)[k - 1]]
+            ahead = np.flatnonzero(key < boundary)
+            tied = np.flatnonzero(key == boundary)[:k - len(ahead)]
+            chosen = np.concatenate([ahead, tied])
+        order = np.lexsort((chosen, score[chosen] if lowest else -score[chosen]))
+        return chosen[order]
+
+    def score_buyers_bulk(self, buyers, top_k=None, lowest=False):
+        """
+        Scores and ranks many buyers in one vectorized pass.
+
+        Args:
+            buyers: List of records or dict of columns with `buyer_id` and
+                the HISTORY_FIELDS (`disputes_count` is accepted for
+                `disputes_raised_by_farmers`, as in the API schema)
+            top_k (int): Return only the k (>= 1) highest scores (lowest with
+                `lowest`); None returns every buyer in input order
+            lowest (bool): Select the bottom-k instead of the top-k
+        """
+        # bool is an int subclass: top_k=True must not silently mean 1
+        if top_k is not None and (isinstance(top_k, bool) or not isinstance(top_k, (int, np.integer)) or top_k < 1):
+            raise ValueError(f"top_k must be a positive integer, got {top_k!r}")
+        df = pd.DataFrame(buyers)
+        if 'disputes_raised_by_farmers' not in df and 'disputes_count' in df:
+            df = df.rename(columns={'disputes_count': 'disputes_raised_by_farmers'})
+        missing = [field for field in ('buyer_id',) + self.HISTORY_FIELDS if field not in df]
+        if missing and len(df):
+            raise KeyError(f"Missing buyer history fields: {', '.join(missing)}")
+        if not len(df):
+            return {'total': 0, 'rank_counts': {rank: 0 for _, rank, _, _ in self.RANKS}, 'buyers': []}
+
+        scores = self.score_columns(df)
+        rank_counts = np.bincount(scores['rank_code'], minlength=len(self.RANKS))
+        if top_k is None:
+            rows = np.arange(len(df))
+        else:
+            rows = self._select(scores['score'], int(top_k), lowest)
+
+        ids = df['buyer_id'].to_numpy()[rows]
+        ranked = []
+        for buyer_id, score, code in zip(ids.tolist(), scores['score'][rows].tolist(),
+                                         scores['rank_code'][rows].tolist()):
+            _, rank, risk, desc = self.RANKS[code]
+            ranked.append({
+                "buyer_id": str(buyer_id),
+                "score": round(score, 1),
+                "rank": rank,
+                "risk_level": risk,
+                "interpretation": desc
+            })
+        return {
+            'total': len(df),
+            'rank_counts': {rank: int(count) for (_, rank, _, _), count in zip(self.RANKS, rank_counts)},
+            'buyers': ranked
+        }
+
 # --- DEMONSTRATION ---
 
 if __name__ == "__main__":
@@ -144,3 +416,19 @@ if __name__ == "__main__":
 
     print_trust_report(res_a)
     print_trust_report(res_b)
+
+    # Bid ordering across the whole buyer base
+    market = {field: [corporate_buyer[field], new_buyer[field]] for field in engine.HISTORY_FIELDS}
+    market['buyer_id'] = ["BUYER_CORPORATE_EXPRESS", "BUYER_LOCAL_TRADER_01"]
+    for entry in engine.score_buyers_bulk(market, top_k=2)['buyers']:
+        print(f"{entry['buyer_id']:<28} {entry['score']:>5} {entry['rank']}")
+
+    # Aggregates maintained from escrow events: no history payload on lookup
+    started = time() - 2 * 365 * 86400
+    for i in range(12):
+        contract = {'buyer_id': "BUYER_WHOLESALE_09", 'created_at': started + i * 86400}
+        engine._on_contract_initiated(contract)
+        engine._on_contract_released(dict(contract, dispatched_at=contract['created_at'],
+                                          released_at=contract['created_at'] + (3600 if i % 4 else 5 * 86400)))
+    engine.record_incident("BUYER_WHOLESALE_09", 'dispute')
+    print_trust_report(engine.score_buyer("BUYER_WHOLESALE_09"))
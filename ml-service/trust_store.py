@@ -0,0 +1,72 @@
+import sqlite3
+import threading
+
+
+class BuyerTrustStore:
+    """
+    SQLite-backed persistence for the materialized per-buyer trust
+    aggregates. One narrow integer row per buyer (WITHOUT ROWID, keyed by
+    buyer id), written through on every update; WAL mode keeps trust
+    lookups from blocking the ledger writer that applies the updates.
+    """
+
+    COLUMNS = (
+        'total_deals', 'completed_deals', 'on_time_payments', 'delayed_payments',
+        'failed_payments', 'disputes_raised_by_farmers', 'first_seen'
+    )
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS buyer_trust (
+            buyer_id TEXT PRIMARY KEY,
+            total_deals INTEGER NOT NULL,
+            completed_deals INTEGER NOT NULL,
+            on_time_payments INTEGER NOT NULL,
+            delayed_payments INTEGER NOT NULL,
+            failed_payments INTEGER NOT NULL,
+            disputes_raised_by_farmers INTEGER NOT NULL,
+            first_seen REAL NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS counted_orders (
+            order_id TEXT PRIMARY KEY
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, db_path='models/buyer_trust.db'):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript(self.SCHEMA)
+        conn.commit()
+
+    def _connection(self):
+        # One connection per thread: WAL lets readers run alongside the writer
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def load_all(self):
+        """{buyer_id: [aggregate values in COLUMNS order]} for every stored buyer."""
+        rows = self._connection().execute(f"SELECT buyer_id, {', '.join(self.COLUMNS)} FROM buyer_trust")
+        return {row[0]: list(row[1:]) for row in rows}
+
+    def has_order(self, order_id):
+        """True once a deal for `order_id` has been counted."""
+        return self._connection().execute(
+            'SELECT 1 FROM counted_orders WHERE order_id = ?', (order_id,)
+        ).fetchone() is not None
+
+    def save(self, buyer_id, values, order_id=None):
+        """Writes a buyer's aggregates, and marks `order_id` counted in the same transaction."""
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO buyer_trust (buyer_id, {', '.join(self.COLUMNS)}) "
+                f"VALUES (?, {', '.join('?' for _ in self.COLUMNS)})",
+                (buyer_id, *values)
+            )
+            if order_id is not None:
+                conn.execute('INSERT OR IGNORE INTO counted_orders (order_id) VALUES (?)', (order_id,))
@@ -0,0 +1,261 @@
+import os
+import threading
+from time import time
+
+import numpy as np
+
+
+class VelocityCounters:
+    """
+    Server-side per-user event counters for burst and bot detection.
+
+    Every user is interned to one row of preallocated NumPy arrays holding,
+    per event kind, three ring buffers of time buckets (minutes, hours,
+    days) plus a lifetime total. Recording an event touches a fixed number
+    of cells: buckets left behind by a wrapped ring are cleared lazily on
+    the user's next write. At the default ring sizes a user costs under
+    200 bytes of counters, and reads over many users are array gathers.
+    """
+
+    KINDS = ('deal', 'cancellation', 'failed_payment')
+
+    def __init__(self, minute_buckets=15, hour_buckets=24, day_buckets=7,
+                 initial_capacity=1024, snapshot_path=None):
+        """
+        Args:
+            minute_buckets (int): One-minute buckets kept (burst window)
+            hour_buckets (int): One-hour buckets kept
+            day_buckets (int): One-day buckets kept (deal frequency window)
+            initial_capacity (int): Users preallocated; arrays double when full
+            snapshot_path (str): .npz file the counters are persisted to
+        """
+        # name -> (bucket width in seconds, buckets, dtype); short buckets saturate at 255
+        self.layout = {
+            'minute': (60, minute_buckets, np.uint8),
+            'hour': (3600, hour_buckets, np.uint8),
+            'day': (86400, day_buckets, np.uint16),
+        }
+        # (name, width, buckets, saturation ceiling, one zeroed user row) for the record path
+        self._record_layout = [
+            (name, width, size, int(np.iinfo(dtype).max), np.zeros(len(self.KINDS) * size, dtype=dtype).data)
+            for name, (width, size, dtype) in self.layout.items()
+        ]
+        self.snapshot_path = snapshot_path
+        self._kind_index = {kind: i for i, kind in enumerate(self.KINDS)}
+        self._lock = threading.Lock()
+        self._allocate(max(1, initial_capacity))
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.load_snapshot()
+
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self._index = {}  # user id -> row
+        self._ids = []
+        self._totals = np.zeros((capacity, len(self.KINDS)), dtype=np.uint32)
+        self._rings = {
+            name: np.zeros((capacity, len(self.KINDS), size), dtype=dtype)
+            for name, (_, size, dtype) in self.layout.items()
+        }
+        # Bucket epoch (now // width) of each user's latest write per resolution
+        self._epochs = {name: np.zeros(capacity, dtype=np.int32) for name in self.layout}
+        self._bind_views()
+
+    def _bind_views(self):
+        # Flat memoryviews over the same buffers: per-cell access from Python is
+        # several times cheaper than NumPy scalar indexing on the record path
+        self._total_cells = self._totals.reshape(-1).data
+        self._ring_cells = {name: ring.reshape(-1).data for name, ring in self._rings.items()}
+        self._epoch_cells = {name: epochs.data for name, epochs in self._epochs.items()}
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, user_id):
+        return str(user_id) in self._index
+
+    def _grow(self):
+        def doubled(array):
+            grown = np.zeros((self.capacity * 2,) + array.shape[1:], dtype=array.dtype)
+            grown[:self.capacity] = array
+            return grown
+
+        self._totals = doubled(self._totals)
+        self._rings = {name: doubled(ring) for name, ring in self._rings.items()}
+        self._epochs = {name: doubled(epochs) for name, epochs in self._epochs.items()}
+        self.capacity *= 2
+        self._bind_views()
+
+    def _row(self, user_id):
+        row = self._index.get(user_id)
+        if row is None:
+            row = len(self._ids)
+            if row == self.capacity:
+                self._grow()
+            self._index[user_id] = row
+            self._ids.append(user_id)
+        return row
+
+    def record(self, user_id, kind, now=None, count=1):
+        """Counts `count` events of `kind` for a user at time `now`."""
+        if kind not in self._kind_index:
+            raise ValueError(f"Unknown event kind: {kind}")
+        k = self._kind_index[kind]
+        now = time() if now is None else now
+        n_kinds = len(self.KINDS)
+        with self._lock:
+            row = self._row(str(user_id))
+            self._total_cells[row * n_kinds + k] += count
+            for name, width, size, ceiling, zeroed in self._record_layout:
+                cells, epochs = self._ring_cells[name], self._epoch_cells[name]
+                base = row * n_kinds * size
+                epoch = int(now // width)
+                last = epochs[row]
+                if epoch > last:
+                    # Zero the buckets the ring has wrapped onto since the last write
+                    if epoch - last >= size:
+                        cells[base:base + len(zeroed)] = zeroed
+                    else:
+                        stale, first = epoch - last, (last + 1) % size
+                        head = min(stale, size - first)
+                        for ring_start in range(base, base + n_kinds * size, size):
+                            cells[ring_start + first:ring_start + first + head] = zeroed[:head]
+                            cells[ring_start:ring_start + stale - head] = zeroed[:stale - head]
+                    epochs[row] = epoch
+                elif epoch <= last - size:
+                    continue  # Late event older than this ring covers
+                cell = base + k * size + epoch % size
+                cells[cell] = min(cells[cell] + count, ceiling)
+
+    def _window_counts(self, rows, name, now):
+        """Per-kind event counts over the whole ring of one resolution."""
+        width, size, _ = self.layout[name]
+        last = self._epochs[name][rows][:, None].astype(np.int64)
+        # Epoch each slot currently holds, given the row's latest write
+        slot_epochs = last - (last - np.arange(size)) % size
+        live = slot_epochs > int(now // width) - size
+        return (self._rings[name][rows] * live[:, None, :]).sum(axis=2, dtype=np.int64)
+
+    def counts(self, user_id, now=None):
+        """
+        {kind: {'minute', 'hour', 'day', 'total'}} for one user, where each
+        resolution counts events over its whole ring (e.g. the last 15
+        minutes), or None for a user never seen.
+        """
+        now = time() if now is None else now
+        with self._lock:
+            row = self._index.get(str(user_id))
+            if row is None:
+                return None
+            rows = np.array([row])
+            windows = {name: self._window_counts(rows, name, now)[0] for name in self.layout}
+            totals = self._totals[row]
+        return {
+            kind: dict({name: int(windows[name][k]) for name in self.layout}, total=int(totals[k]))
+            for kind, k in self._kind_index.items()
+        }
+
+    def behavior_columns(self, user_ids, now=None):
+        """
+        Server-side analyze_user_behavior fields for many users at once.
+
+        Returns (known, columns): a mask of users with counters, and arrays
+        for total_deals, cancelled_deals, failed_payments,
+        recent_deal_frequency (deals per day over the day ring) and
+        burst_deals (deals over the minute ring), zero for unknown users.
+        """
+        now = time() if now is None else now
+        deal, cancellation, failed = (self._kind_index[k] for k in self.KINDS)
+        with self._lock:
+            rows = np.fromiter(
+                (self._index.get(str(user_id), -1) for user_id in user_ids), dtype=np.int64, count=len(user_ids)
+            )
+            known = rows >= 0
+            rows = np.where(known, rows, 0)
+            totals = self._totals[rows].astype(np.int64) * known[:, None]
+            minute = self._window_counts(rows, 'minute', now) * known[:, None]
+            day = self._window_counts(rows, 'day', now) * known[:, None]
+        return known, {
+            'total_deals': totals[:, deal],
+            'cancelled_deals': totals[:, cancellation],
+            'failed_payments': totals[:, failed],
+            'recent_deal_frequency': day[:, deal] / self.layout['day'][1],
+            'burst_deals': minute[:, deal],
+        }
+
+    def behavior(self, user_id, now=None):
+        """behavior_columns for one user as a dict, or None if never seen."""
+        known, columns = self.behavior_columns([user_id], now)
+        if not known[0]:
+            return None
+        return {field: values[0].item() for field, values in columns.items()}
+
+    # --- LEDGER EVENTS ---
+
+    def subscribe_to(self, ledger):
+        """
+        Feeds the counters from an AgricultureBlockchain or ShardedLedger:
+        sealed trades and new escrow contracts count as a deal for both
+        parties, an expired contract as a cancellation by the farmer.
+        Failed payments are off-ledger and recorded by the caller.
+        """
+        ledger.subscribe('trade_sealed', self._on_deal)
+        ledger.subscribe('contract_initiated', self._on_deal)
+        ledger.subscribe('contract_expired', self._on_expired)
+
+    def _on_deal(self, record):
+        now = time()
+        self.record(record['farmer_id'], 'deal', now)
+        self.record(record['buyer_id'], 'deal', now)
+
+    def _on_expired(self, contract):
+        self.record(contract['farmer_id'], 'cancellation')
+
+    # --- SNAPSHOT ---
+
+    def write_snapshot(self):
+        with self._lock:
+            n = len(self._ids)
+            arrays = {'ids': np.array(self._ids, dtype=str), 'totals': self._totals[:n]}
+            for name in self.layout:
+                arrays[f'ring_{name}'] = self._rings[name][:n]
+                arrays[f'epoch_{name}'] = self._epochs[name][:n]
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def load_snapshot(self):
+        try:
+            with np.load(self.snapshot_path) as snapshot:
+                arrays = {name: snapshot[name] for name in snapshot.files}
+        except (OSError, ValueError):
+            return False
+        # Ring sizes changed since the snapshot: keep totals, restart the windows
+        same_layout = all(
+            arrays[f'ring_{name}'].shape[2:] == (size,) for name, (_, size, _) in self.layout.items()
+        )
+        ids = arrays['ids'].tolist()
+        with self._lock:
+            self._allocate(max(1024, 2 * len(ids)))
+            self._ids = ids
+            self._index = {user_id: row for row, user_id in enumerate(ids)}
+            self._totals[:len(ids)] = arrays['totals']
+            if same_layout:
+                for name in self.layout:
+                    self._rings[name][:len(ids)] = arrays[f'ring_{name}']
+                    self._epochs[name][:len(ids)] = arrays[f'epoch_{name}']
+        return True
+
+
+if __name__ == "__main__":
+    counters = VelocityCounters()
+    start = time()
+    # A bot opening 40 deals in ten minutes, and a regular buyer
+    for i in range(40):
+        counters.record("BUYER_BOT", 'deal', start + i * 15)
+    counters.record("BUYER_01", 'deal', start)
+    counters.record("BUYER_01", 'cancellation', start)
+    now = start + 600
+    print("Bot:", counters.behavior("BUYER_BOT", now))
+    print("Regular:", counters.counts("BUYER_01", now))
+    print("Bot an hour later:", counters.behavior("BUYER_BOT", now + 3600))